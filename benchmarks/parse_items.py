@@ -0,0 +1,101 @@
+"""
+Benchmark of parsing API items into models: the compiled template fast path vs. filling in the whole template with
+`fill_from` and checking it with `find_none_paths`, over the recorded fixtures of the fake API server.
+
+Usage: `python -m benchmarks.parse_items`
+"""
+
+import json
+from datetime import datetime
+from timeit import timeit
+
+from isodate import parse_duration
+
+from src.models import Comment, Video
+from src.youtube import OfficialYouTubeService, fill_from, find_none_paths
+from src.youtube.fake_server import FIXTURES_DIR
+
+REPEATS = 200
+
+
+def _template_video(youtube: OfficialYouTubeService, data: dict) -> Video:
+    """
+    Parse a video the way `_video_from_data` did before the fast path.
+    """
+    data = fill_from(data, OfficialYouTubeService.VIDEO_TEMPLATE)
+    if find_none_paths(data):
+        raise OfficialYouTubeService.VideoParseError(data, [])
+    video_id = youtube._video_id(data["id"])
+    return Video(
+        id=str(video_id),
+        title=str(data["snippet"]["title"]),
+        description=str(data["snippet"]["description"]),
+        url=f"https://www.youtube.com/watch?v={video_id}",
+        thumbnail_url=str(data["snippet"]["thumbnails"]["medium"]["url"]),
+        channel_id=str(data["snippet"]["channelId"]),
+        channel_name=str(data["snippet"]["channelTitle"]),
+        views=int(data["statistics"]["viewCount"]),
+        likes=int(data["statistics"]["likeCount"]),
+        favorites=int(data["statistics"]["favoriteCount"]),
+        comments=int(data["statistics"]["commentCount"]),
+        is_livestream=bool("liveStreamingDetails" in data),
+        contains_synthetic_media=data["status"]["containsSyntheticMedia"],
+        label=data["label"],
+        duration_seconds=int(parse_duration(data["contentDetails"]["duration"]).total_seconds()),
+        published_at=datetime.fromisoformat(data["snippet"]["publishedAt"].replace("Z", "+00:00")),
+        origin=youtube.origin.value,
+    )
+
+
+def _template_comment(data: dict, video: Video) -> Comment:
+    """
+    Parse a comment the way `_comment_from_data` did before the fast path.
+    """
+    data = fill_from(data, OfficialYouTubeService.COMMENT_TEMPLATE)
+    if find_none_paths(data):
+        raise OfficialYouTubeService.CommentParseError(data, [])
+    parent_id = data["snippet"]["parentId"]
+    is_reply = parent_id != OfficialYouTubeService.NO_PARENT
+    return Comment(
+        id=str(data["id"]),
+        text=str(data["snippet"]["textOriginal"]),
+        video=video,
+        author_channel_id=str(data["snippet"]["authorChannelId"]["value"]),
+        author_display_name=str(data["snippet"]["authorDisplayName"]),
+        likes=int(data["snippet"]["likeCount"]),
+        is_reply=is_reply,
+        parent_comment_id=parent_id if is_reply else None,
+        published_at=datetime.fromisoformat(data["snippet"]["publishedAt"].replace("Z", "+00:00")),
+    )
+
+
+def _report(name: str, template_seconds: float, fast_seconds: float, num_items: int):
+    print(f"{name} ({num_items} items):")
+    print(f"  fill_from + find_none_paths: {num_items / template_seconds:10.0f} items/s")
+    print(f"  CompiledTemplate:            {num_items / fast_seconds:10.0f} items/s")
+    print(f"  Speedup:                     {template_seconds / fast_seconds:10.1f}x")
+
+
+def main() -> None:
+    youtube = OfficialYouTubeService("benchmark", origin=Video.Origin.APP)
+
+    # A videos.list page is up to 50 items
+    with open(FIXTURES_DIR / "videos.json", encoding="utf-8") as f:
+        videos = json.load(f)
+    videos = (videos * (50 // len(videos) + 1))[:50]
+    template_seconds = timeit(lambda: [_template_video(youtube, x) for x in videos], number=REPEATS)
+    fast_seconds = timeit(lambda: [youtube._video_from_data(x) for x in videos], number=REPEATS)
+    _report("Videos", template_seconds, fast_seconds, REPEATS * len(videos))
+
+    with open(FIXTURES_DIR / "comment_threads.json", encoding="utf-8") as f:
+        threads = [thread for video_threads in json.load(f).values() for thread in video_threads]
+    comments = [thread["snippet"]["topLevelComment"] for thread in threads]
+    comments += [reply for thread in threads for reply in thread.get("replies", {}).get("comments", [])]
+    video = Video(id="benchmark")
+    template_seconds = timeit(lambda: [_template_comment(x, video) for x in comments], number=REPEATS)
+    fast_seconds = timeit(lambda: [youtube._comment_from_data(x, video) for x in comments], number=REPEATS)
+    _report("Comments", template_seconds, fast_seconds, REPEATS * len(comments))
+
+
+if __name__ == "__main__":
+    main()
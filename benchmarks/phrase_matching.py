@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of GENERIC_PRAISE and AI_KEYWORDS scanning: per-phrase substring checks vs. `PhraseMatcher`.
+
+Usage: `python -m benchmarks.phrase_matching`
+"""
+
+from random import Random
+from timeit import timeit
+
+from src.lists import AI_KEYWORDS, GENERIC_PRAISE
+from src.matching import PhraseMatcher
+
+COMMENTS_PER_VIDEO = 100
+VIDEOS = 20
+REPEATS = 5
+
+WORDS = "this song is so good i love the vibe here great beat honestly ai music sounds like a real band".split()
+
+
+def _comment(rng: Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(3, 25))]
+    if rng.random() < 0.3:
+        words.insert(rng.randint(0, len(words)), rng.choice(GENERIC_PRAISE))
+    return " ".join(words)
+
+
+def _substring_counts(videos: list[list[str]]) -> list[int]:
+    counts = []
+    for comments in videos:
+        count = 0
+        for comment in comments:
+            for generic_praise in GENERIC_PRAISE:
+                if generic_praise in comment:
+                    count += 1
+        counts.append(count)
+    return counts
+
+
+def _matcher_counts(matcher: PhraseMatcher, videos: list[list[str]]) -> list[int]:
+    return [sum(matcher.count(comment) for comment in comments) for comments in videos]
+
+
+def main() -> None:
+    rng = Random(42)
+    videos = [[_comment(rng) for _ in range(COMMENTS_PER_VIDEO)] for _ in range(VIDEOS)]
+
+    build_seconds = timeit(lambda: PhraseMatcher(GENERIC_PRAISE), number=1)
+    matcher = PhraseMatcher(GENERIC_PRAISE)
+    assert _substring_counts(videos) == _matcher_counts(matcher, videos), "Counts differ!"
+
+    substring_seconds = timeit(lambda: _substring_counts(videos), number=REPEATS) / (REPEATS * VIDEOS)
+    matcher_seconds = timeit(lambda: _matcher_counts(matcher, videos), number=REPEATS) / (REPEATS * VIDEOS)
+    print(f"GENERIC_PRAISE ({len(GENERIC_PRAISE)} phrases), {COMMENTS_PER_VIDEO} comments per video:")
+    print(f"  Building the matcher:  {build_seconds * 1000:8.3f} ms (once per process)")
+    print(f"  Substring checks:      {substring_seconds * 1000:8.3f} ms per video")
+    print(f"  PhraseMatcher:         {matcher_seconds * 1000:8.3f} ms per video")
+    print(f"  Speedup:               {substring_seconds / matcher_seconds:8.1f}x")
+
+    descriptions = [" ".join(comments[:10]) + " " + rng.choice(AI_KEYWORDS) for comments in videos]
+    keyword_matcher = PhraseMatcher(AI_KEYWORDS)
+    substring_seconds = timeit(
+        lambda: [sum(keyword in d for keyword in AI_KEYWORDS) for d in descriptions], number=REPEATS
+    ) / (REPEATS * VIDEOS)
+    matcher_seconds = timeit(lambda: [keyword_matcher.count(d) for d in descriptions], number=REPEATS) / (
+        REPEATS * VIDEOS
+    )
+    print(f"AI_KEYWORDS ({len(AI_KEYWORDS)} phrases), one description per video:")
+    print(f"  Substring checks:      {substring_seconds * 1000:8.3f} ms per video")
+    print(f"  PhraseMatcher:         {matcher_seconds * 1000:8.3f} ms per video")
+    print(f"  Speedup:               {substring_seconds / matcher_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark of the YouTube half of a `/search`: each page of search results with its videos' details, and then every
+video's comments fetched at once, as the app does. The sync service with a pool of worker threads is compared with
+the async service on one event loop, both against the fake API server with a fixed latency per request.
+
+Usage: `python -m benchmarks.search_pipeline`
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+# Don't cache responses or throttle requests, so that only the fake server's latency is measured, and keep the units
+# spent against the fake server in memory rather than charging them to the real keys' usage
+os.environ["YOUTUBE_HTTP_CACHE"] = ""
+os.environ["YOUTUBE_KEY_USAGE"] = ""
+os.environ["YOUTUBE_QUOTA_RATE"] = "1000000"
+os.environ["YOUTUBE_QUOTA_BURST"] = "1000000"
+os.environ["YOUTUBE_DAILY_QUOTA"] = "1000000"
+
+from src.models import Video  # noqa: E402
+from src.youtube import OfficialYouTubeService  # noqa: E402
+from src.youtube.async_service import AsyncOfficialYouTubeService  # noqa: E402
+from src.youtube.fake_server import FakeYouTubeServer  # noqa: E402
+
+LATENCY = 0.05
+# Every video in the fixture corpus matches the empty query
+QUERY = ""
+PAGE_SIZE = 5
+PAGES = 2
+WORKERS = 8
+
+
+def _sync_search(server: FakeYouTubeServer) -> int:
+    youtube = OfficialYouTubeService("benchmark", origin=Video.Origin.APP, root_url=server.root_url)
+
+    def comments(video: Video) -> int:
+        try:
+            return len(list(youtube.iter_comments(str(video.id), max_comments=100)))
+        except Exception:
+            return 0
+
+    num_comments = 0
+    page_token = None
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        for _ in range(PAGES):
+            response = youtube.videos(QUERY, max_results=PAGE_SIZE, page_token=page_token)
+            num_comments += sum(pool.map(comments, response.videos))
+            page_token = response.next_page_token
+    return num_comments
+
+
+async def _async_search(server: FakeYouTubeServer) -> int:
+    num_comments = 0
+    page_token = None
+    async with AsyncOfficialYouTubeService("benchmark", Video.Origin.APP, base_url=server.base_url) as youtube:
+        for _ in range(PAGES):
+            response = await youtube.videos(QUERY, max_results=PAGE_SIZE, page_token=page_token)
+            results = await asyncio.gather(
+                *[youtube.get_comments(str(video.id), max_results=100) for video in response.videos],
+                return_exceptions=True,
+            )
+            num_comments += sum(len(x) for x in results if isinstance(x, list))
+            page_token = response.next_page_token
+    return num_comments
+
+
+def main() -> None:
+    with FakeYouTubeServer(latency=LATENCY) as server:
+        for name, search in [
+            (f"Sync service, {WORKERS} threads", lambda: _sync_search(server)),
+            ("Async service", lambda: asyncio.run(_async_search(server))),
+        ]:
+            num_requests = len(server.requests)
+            start = perf_counter()
+            num_comments = search()
+            seconds = perf_counter() - start
+            print(
+                f"{name + ':':28} {seconds:6.3f}s for {PAGES} pages, {len(server.requests) - num_requests} requests,"
+                f" {num_comments} comments ({LATENCY * 1000:.0f} ms per request)"
+            )
+
+
+if __name__ == "__main__":
+    main()
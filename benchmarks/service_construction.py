@@ -0,0 +1,43 @@
+"""
+Benchmark of `OfficialYouTubeService` construction: building the googleapiclient resource every time (as the
+scraper scripts and app worker threads used to), vs. the resource built once per process.
+
+Usage: `python -m benchmarks.service_construction`
+"""
+
+from timeit import timeit
+
+from googleapiclient.discovery import build
+
+from src.models import Video
+from src.youtube import OfficialYouTubeService
+
+REPEATS = 50
+
+
+def main() -> None:
+    rebuild_seconds = (
+        timeit(lambda: build("youtube", "v3", developerKey="benchmark", static_discovery=True), number=REPEATS)
+        / REPEATS
+    )
+    first_seconds = timeit(lambda: OfficialYouTubeService("benchmark", origin=Video.Origin.APP), number=1)
+    cached_seconds = (
+        timeit(lambda: OfficialYouTubeService("benchmark", origin=Video.Origin.APP), number=REPEATS) / REPEATS
+    )
+    print(f"Building the resource from the bundled discovery document: {rebuild_seconds * 1000:8.3f} ms per service")
+    print(f"OfficialYouTubeService, first in the process:              {first_seconds * 1000:8.3f} ms")
+    print(f"OfficialYouTubeService, after the first:                   {cached_seconds * 1000:8.3f} ms per service")
+    print(f"Speedup:                                                   {rebuild_seconds / cached_seconds:8.1f}x")
+
+    try:
+        # What construction costs when the discovery document is fetched over the network (googleapiclient < 2.0)
+        fetch_seconds = timeit(
+            lambda: build("youtube", "v3", developerKey="benchmark", static_discovery=False), number=1
+        )
+        print(f"Building the resource from a fetched discovery document:   {fetch_seconds * 1000:8.3f} ms")
+    except Exception as e:
+        print(f"Could not fetch the discovery document ({type(e).__name__}), skipped.")
+
+
+if __name__ == "__main__":
+    main()
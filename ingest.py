@@ -0,0 +1,18 @@
+"""
+Bulk load newline-delimited JSON dumps of videos or comments into the database, e.g. for a training backfill.
+
+Usage: `python ingest.py video videos.ndjson [more.ndjson ...]` (or `comment` for comments)
+"""
+
+import sys
+
+from src.ingest import MODELS, ingest, read_ndjson
+from src.models.migrations import migrate
+
+if len(sys.argv) < 3 or sys.argv[1] not in MODELS:
+    sys.exit(__doc__)
+
+migrate()
+table, paths = sys.argv[1], sys.argv[2:]
+stats = ingest(MODELS[table], (read_ndjson(path) for path in paths))
+print(f"Loaded {stats.rows} {table} rows ({stats.merged} merged), {stats.rows_per_second:.0f} rows/s.")
@@ -1,10 +1,15 @@
 from logging import getLogger
+from typing import Iterator, List
 
+from src.ingest import ingest
 from src.models import Comment, Video
+from src.models.migrations import migrate
 from src.youtube import OfficialYouTubeService
 
 logger = getLogger()
 
+migrate()
+
 videos = Video.select().where(
     (Video.duration_seconds > 60) & (Video.comments >= 50) & (Video.origin == Video.Origin.SCRAPED.value)
 )
@@ -30,11 +35,25 @@ logger.info(
 )
 
 youtube = OfficialYouTubeService.build_from_env(origin=Video.Origin.SCRAPED)
-for video in need_scraping:
-    comments = youtube.get_comments(video_id=video.id, max_results=100)
-    print(f"Fetched {len(comments)} comments for video {video.id}.")
-    for comment in comments:
-        if Comment.filter(id=comment.id).select().count() == 0:
-            comment.save(force_insert=True)
-        else:
-            comment.save()
+
+
+def pull_comments() -> Iterator[List[Comment]]:
+    """
+    Each video's comments, until the quota runs out.
+    """
+    for video in need_scraping:
+        try:
+            comments = youtube.get_comments(video_id=video.id, max_results=100)
+        except OfficialYouTubeService.QuotaExhausted as e:
+            logger.error(f"Stopping, {e}")
+            return
+        except Exception as e:
+            logger.error(f"Skipping video {video.id}, could not fetch its comments.", exc_info=e)
+            continue
+        print(f"Fetched {len(comments)} comments for video {video.id}.")
+        yield comments
+
+
+# Committed every few videos, so that stopping the scrape only loses the comments of the last few
+stats = ingest(Comment, pull_comments(), commit_every=1_000)
+print(f"Saved {stats.rows} comments, {stats.rows_per_second:.0f} rows/s.")
@@ -1,6 +1,11 @@
 from src.models import Video
+from src.models.migrations import migrate
 from src.youtube import OfficialYouTubeService
 
+migrate()
+
+youtube = OfficialYouTubeService.build_from_env(origin=Video.Origin.SCRAPED)
+
 # Scrape videos
 for channel_id in [
     "UCLdqZBVvWa174TnYyLC-IAg",
@@ -14,16 +19,12 @@ for channel_id in [
     "UCr5v6l4EIKiImmJU-COJ0Sg",
     "UCFEXvJaxLUGJaCVxOGx8amw",
 ]:
-    youtube = OfficialYouTubeService.build_from_env(origin=Video.Origin.SCRAPED)
     try:
         videos = youtube.get_channel_videos(channel_id=channel_id, max_videos=100)
         print(f"Collected {len(videos)} videos from channel {channel_id}.")
         for video in videos:
             video.label = Video.Label.HUMAN.value  # type: ignore
-            if Video.filter(id=video.id).select().count() == 0:
-                video.save(force_insert=True)
-            else:
-                video.save()
+        Video.upsert_many(videos)
     except OfficialYouTubeService.ChannelNotFound:
         print(f"Channel not found: {channel_id}.")
         continue
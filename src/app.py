@@ -1,14 +1,23 @@
 import json
 import logging
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict
 from datetime import datetime, timezone
+from threading import Lock
+from typing import Optional
 
 from dotenv import load_dotenv
-from flask import Flask, Response, jsonify, render_template, request
+from flask import Flask, Response, jsonify, render_template, request, stream_with_context
+from playhouse.pool import MaxConnectionsExceeded
 
-from src.models import Comment, Video
-from src.predictions import predict
+from src.embeddings import COMMENT_MODEL, Sentence
+from src.models import Comment, Video, db
+from src.models.migrations import migrate
+from src.predictions import PREDICTION_TTL, cached_score, predict_many
 from src.youtube import OfficialYouTubeService
+from src.youtube.quota import KeyPool, QuotaScheduler
+from src.youtube.retry import RetryPolicy
 
 load_dotenv()
 
@@ -24,8 +33,75 @@ app.config["MAX_VIDEOS_SEARCH_RESULTS"] = 5
 app.config["EXCLUDE_VIDEOS_UNDER_N_COMMENTS"] = 50
 app.config["MAX_COMMENTS_TO_ASSESS_PER_VIDEO"] = 100
 app.config["PRE_AI_CUTOFF_DATE"] = datetime(2022, 5, 1, tzinfo=timezone.utc)
-
-youtube = OfficialYouTubeService.build_from_env(origin=Video.Origin.APP)
+# Number of videos per page whose comments are fetched at the same time
+app.config["MAX_VIDEO_WORKERS"] = 8
+# How long a stored prediction is served before the video's comments are downloaded and it is re-scored
+app.config["PREDICTION_CACHE_TTL"] = PREDICTION_TTL
+
+# Built by `startup`, so that importing the app doesn't need API keys
+youtube: Optional[OfficialYouTubeService] = None
+
+_startup_lock = Lock()
+_started = False
+
+
+def startup() -> None:
+    """
+    Build the YouTube service, bring the database up to date and load the comment model, once per process. Called
+    before serving (and by the first request otherwise), so that importing the app has no side effects.
+    """
+    global youtube, _started
+    with _startup_lock:
+        if _started:
+            return
+        if youtube is None:
+            youtube = OfficialYouTubeService.build_from_env(origin=Video.Origin.APP)
+        with db.connection_context():
+            migrate()
+        # Load the comment model before the first search instead of during it
+        Sentence.warm_up(COMMENT_MODEL)
+        _started = True
+
+
+def _fetch_comments(video: Video) -> Optional[Video]:
+    """
+    Download and save a video's comments, unless its stored prediction is still valid. Runs on a worker thread.
+    Returns None if the comments couldn't be fetched, since scoring the video without them would mislabel it.
+    """
+    try:
+        with db.connection_context():
+            if cached_score(video, app.config["PREDICTION_CACHE_TTL"]) is None:
+                try:
+                    comments = youtube.get_comments(  # type: ignore
+                        video_id=str(video.id), max_results=app.config["MAX_COMMENTS_TO_ASSESS_PER_VIDEO"]
+                    )
+                except Exception as e:
+                    logging.error(f"Skipping video {video.id}, could not fetch its comments.", exc_info=e)
+                    return None
+                Comment.upsert_many(comments)
+    except MaxConnectionsExceeded as e:
+        # Every pooled connection is busy with other searches. Only this video is skipped, not the whole stream.
+        logging.error(f"Skipping video {video.id}, no database connection was free.", exc_info=e)
+        return None
+    return video
+
+
+@app.before_request
+def _connect():
+    """
+    Take a database connection from the pool for the request.
+    """
+    startup()
+    db.connect(reuse_if_open=True)
+
+
+@app.teardown_request
+def _close(exc):
+    """
+    Return the request's database connection to the pool. Streamed responses keep it until they are done.
+    """
+    if not db.is_closed():
+        db.close()
 
 
 @app.route("/")
@@ -53,78 +129,78 @@ def search():
             # Send initial status
             yield f"data: {json.dumps({'type': 'status', 'message': 'Searching...'})}\n\n"
 
-            # Keep fetching until we have enough videos (for initial load) or fetched one page (for pagination)
-            while True:
-                videos_response = youtube.videos(
-                    query,
-                    max_results=app.config["MAX_VIDEOS_SEARCH_RESULTS"],
-                    page_token=current_page_token,
-                )
-                pages_fetched += 1
-
-                human_videos = []
-                videos = [x for x in videos_response.videos if x.comments >= 50 and x.duration_seconds > 60]
-                for video in videos:
-
-                    # Save video
-                    if Video.filter(id=video.id).select().count() == 0:
-                        video.save(force_insert=True)
-                    else:
-                        video.save()
-
-                    # Download and save video comments
-                    comments = youtube.get_comments(video_id=str(video.id), max_results=100)
-                    for comment in comments:
-                        if Comment.filter(id=comment.id).select().count() == 0:
-                            comment.save(force_insert=True)
-                        else:
-                            comment.save()
-
-                    # Predict human or ai
-                    if predict(video, threshold=0.95) == Video.Label.HUMAN:
-                        human_videos.append(video)
-                        video.label = Video.Label.HUMAN.value  # type: ignore
-                    else:
-                        video.label = Video.Label.AI.value  # type: ignore
-
-                    # Save video again (to save the human/ai label)
-                    if Video.filter(id=video.id).select().count() == 0:
-                        video.save(force_insert=True)
-                    else:
-                        video.save()
-
-                for video in human_videos:
-                    count += 1
-                    video_data = {
-                        "video_id": video.id,
-                        "title": video.title,
-                        "url": video.url,
-                        "thumbnail": video.thumbnail_url,
-                        "channel": video.channel_name,
-                        "channel_id": video.channel_id,
-                    }
-                    yield f"data: {json.dumps({'type': 'video', 'data': video_data})}\n\n"
-
-                    # Send status update with count
-                    plural = "s" if count != 1 else ""
-                    status_msg = f"Found {count} video{plural}..."
-                    yield f"data: {json.dumps({'type': 'status', 'message': status_msg})}\n\n"
-
-                # Stop conditions:
-                # 1. For pagination requests: always stop after one page
-                # 2. For initial load: stop if we have enough videos, no more pages, or hit safety limit
-                if not is_initial_load:
-                    break
-                if count >= min_videos_for_initial_load:
-                    break
-                if videos_response.next_page_token is None:
-                    break
-                if pages_fetched >= max_pages_to_fetch:
-                    logging.warning(f"Reached max pages ({max_pages_to_fetch}) while searching for videos")
-                    break
-
-                # Continue to next page
-                current_page_token = videos_response.next_page_token
+            with ThreadPoolExecutor(max_workers=app.config["MAX_VIDEO_WORKERS"]) as pool:
+
+                # Keep fetching until we have enough videos (for initial load) or fetched one page (for pagination)
+                while True:
+                    try:
+                        videos_response = youtube.videos(  # type: ignore
+                            query,
+                            max_results=app.config["MAX_VIDEOS_SEARCH_RESULTS"],
+                            page_token=current_page_token,
+                        )
+                    except OfficialYouTubeService.QuotaExhausted as e:
+                        # Keep what was found so far, the client can ask for this page again later
+                        if pages_fetched == 0:
+                            raise e
+                        logging.warning(f"Stopped searching after {pages_fetched} pages: {e}")
+                        break
+                    pages_fetched += 1
+
+                    videos = [x for x in videos_response.videos if x.comments >= 50 and x.duration_seconds > 60]
+
+                    # Save the whole page of videos before their comments are fetched
+                    Video.upsert_many(videos)
+                    pending = {pool.submit(_fetch_comments, video) for video in videos}
+
+                    # Classify whichever videos have their comments ready, and stream them fastest first
+                    while pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        ready = [video for video in (future.result() for future in done) if video is not None]
+                        if not ready:
+                            continue
+                        labels = predict_many(ready, threshold=0.95, max_age=app.config["PREDICTION_CACHE_TTL"])
+                        for video, label in zip(ready, labels):
+                            video.label = label.value  # type: ignore
+
+                        # Save the human/ai labels
+                        Video.upsert_many(ready, update=[Video.label])
+
+                        for video in ready:
+                            if video.label != Video.Label.HUMAN.value:
+                                continue
+
+                            count += 1
+                            video_data = {
+                                "video_id": video.id,
+                                "title": video.title,
+                                "url": video.url,
+                                "thumbnail": video.thumbnail_url,
+                                "channel": video.channel_name,
+                                "channel_id": video.channel_id,
+                            }
+                            yield f"data: {json.dumps({'type': 'video', 'data': video_data})}\n\n"
+
+                            # Send status update with count
+                            plural = "s" if count != 1 else ""
+                            status_msg = f"Found {count} video{plural}..."
+                            yield f"data: {json.dumps({'type': 'status', 'message': status_msg})}\n\n"
+
+                    # Stop conditions:
+                    # 1. For pagination requests: always stop after one page
+                    # 2. For initial load: stop if we have enough videos, no more pages, or hit safety limit
+                    if not is_initial_load:
+                        break
+                    if count >= min_videos_for_initial_load:
+                        break
+                    if videos_response.next_page_token is None:
+                        break
+                    if pages_fetched >= max_pages_to_fetch:
+                        logging.warning(f"Reached max pages ({max_pages_to_fetch}) while searching for videos")
+                        break
+
+                    # Continue to next page
+                    current_page_token = videos_response.next_page_token
 
             yield f"data: {json.dumps({'type': 'done', 'count': count, 'nextPageToken': videos_response.next_page_token})}\n\n"
 
@@ -132,8 +208,27 @@ def search():
             logging.error(f"Error during search!", exc_info=e)
             yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
 
-    return Response(generate(), mimetype="text/event-stream")
+    return Response(stream_with_context(generate()), mimetype="text/event-stream")
+
+
+@app.route("/quota", methods=["GET"])
+def quota():
+    """
+    How much of today's YouTube API quota is left, in total and for each API key.
+    """
+    snapshot = QuotaScheduler.default().snapshot()
+    keys = [asdict(usage) for usage in KeyPool.default().snapshot()]
+    return jsonify(asdict(snapshot) | {"day": snapshot.day.isoformat(), "keys": keys})
+
+
+@app.route("/retries", methods=["GET"])
+def retries():
+    """
+    How many YouTube API requests failed, by reason: retried, given up on after every attempt, or not retryable.
+    """
+    return jsonify(RetryPolicy.default().snapshot())
 
 
 if __name__ == "__main__":
+    startup()
     app.run(debug=True)
@@ -1,28 +1,267 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from fcntl import LOCK_EX, LOCK_UN, flock
+from hashlib import sha1
+from itertools import chain
 from logging import getLogger
+from pathlib import Path
+from threading import Lock
 from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from numpy import float32
+from numpy import array, float32, memmap, stack
 from numpy.typing import NDArray
 from sentence_transformers import SentenceTransformer
 
 from src.models import Video
+from src.settings import EMBEDDING_CACHE_DIR
 
 logger = getLogger(__name__)
 
 
+# Sentence transformer used for comments, and the larger one used for video titles and descriptions.
+COMMENT_MODEL = "paraphrase-MiniLM-L3-v2"
+TEXT_MODEL = "all-mpnet-base-v2"
+# Length of each model's vectors, known without loading it
+MODEL_DIMENSIONS = {COMMENT_MODEL: 384, TEXT_MODEL: 768}
+
+
 class Sentence:
     """
-    A singleton instance of a sentence transformer
+    A registry of sentence transformers with one loaded instance per model name. `Sentence(model_name=...)` returns
+    that model, loading it on first use. Only the `MAX_RESIDENT_MODELS` most recently used models stay loaded.
     """
 
-    def __new__(cls, *args, model_name="paraphrase-MiniLM-L3-v2", **kwargs):
-        if not hasattr(cls, "_instance"):
+    MAX_RESIDENT_MODELS = 2
+
+    @dataclass
+    class LoadStats:
+        seconds: float
+        # Size of the model's parameters and buffers
+        bytes: int
+
+    _models: "OrderedDict[str, SentenceTransformer]" = OrderedDict()
+    _stats: Dict[str, LoadStats] = {}
+    _lock = Lock()
+
+    def __new__(cls, *args, model_name=COMMENT_MODEL, **kwargs) -> SentenceTransformer:  # type: ignore
+        with cls._lock:
+            if model_name in cls._models:
+                cls._models.move_to_end(model_name)
+                return cls._models[model_name]
+
             logger.info(f"Initializing sentence transformer {model_name}...")
             start = perf_counter()
-            cls._instance = SentenceTransformer(model_name)
+            model = SentenceTransformer(model_name)
             end = perf_counter()
-            logger.info(f"Finished initializing {model_name} after {end - start:.6f} seconds.")
-        return cls._instance
+            size = sum(x.numel() * x.element_size() for x in chain(model.parameters(), model.buffers()))
+            cls._stats[model_name] = cls.LoadStats(seconds=end - start, bytes=size)
+            logger.info(f"Finished initializing {model_name} after {end - start:.6f} seconds ({size / 2**20:.1f} MiB).")
+
+            cls._models[model_name] = model
+            while len(cls._models) > cls.MAX_RESIDENT_MODELS:
+                evicted, _ = cls._models.popitem(last=False)
+                logger.info(f"Unloaded least recently used sentence transformer {evicted}.")
+            return model
+
+    @classmethod
+    def warm_up(cls, *model_names: str) -> Dict[str, LoadStats]:
+        """
+        Load models ahead of their first use, e.g. at process start.
+        """
+        for model_name in model_names:
+            cls(model_name=model_name)
+        return {x: cls._stats[x] for x in model_names}
+
+    @classmethod
+    def stats(cls) -> Dict[str, LoadStats]:
+        """
+        Load time and memory of every model loaded by this process (including ones that have since been unloaded).
+        """
+        with cls._lock:
+            return dict(cls._stats)
+
+
+class EmbeddingStore:
+    """
+    Persistent embeddings for one model, addressed by the SHA-1 of their text. Vectors are appended to a float32
+    file that is read through a memory map, and their text hashes to an index file in the same order. Several
+    processes may share a store: appends hold an exclusive `flock`, and first pick up the rows that other processes
+    appended since, so that row numbers always match the file offsets.
+    """
+
+    DIGEST_SIZE = 20
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = directory / "vectors.f32"
+        self._index_path = directory / "index.sha1"
+        self._dim_path = directory / "dim"
+        self._lock_path = directory / "lock"
+
+        self.dim: Optional[int] = None
+        self._rows: Dict[bytes, int] = {}
+        # Rows in the files, which is more than len(self._rows) if a text was appended twice
+        self._num_rows = 0
+        self._vectors: Optional[memmap] = None
+        with self._locked():
+            self._sync()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(self._lock_path, "a") as file:
+            flock(file, LOCK_EX)
+            try:
+                yield
+            finally:
+                flock(file, LOCK_UN)
+
+    def _sync(self) -> None:
+        """
+        Read the index rows appended since this process last looked. Must hold the lock.
+        """
+        if self.dim is None and self._dim_path.exists():
+            self.dim = int(self._dim_path.read_text())
+        if self.dim is None or not self._index_path.exists() or not self._vectors_path.exists():
+            return
+
+        # A row only counts once both its vector and its digest were written. Anything past that was left by an
+        # interrupted write, and is cut off so that new rows line up again.
+        num_rows = min(
+            self._index_path.stat().st_size // self.DIGEST_SIZE,
+            self._vectors_path.stat().st_size // (4 * self.dim),
+        )
+        with open(self._index_path, "r+b") as file:
+            file.seek(self._num_rows * self.DIGEST_SIZE)
+            index = file.read((num_rows - self._num_rows) * self.DIGEST_SIZE)
+            file.truncate(num_rows * self.DIGEST_SIZE)
+        with open(self._vectors_path, "r+b") as file:
+            file.truncate(num_rows * 4 * self.dim)
+
+        for row in range(self._num_rows, num_rows):
+            offset = (row - self._num_rows) * self.DIGEST_SIZE
+            self._rows.setdefault(index[offset : offset + self.DIGEST_SIZE], row)
+        self._num_rows = num_rows
+
+    def get(self, digest: bytes) -> Optional[NDArray[float32]]:
+        row = self._rows.get(digest)
+        if row is None:
+            return None
+        if self._vectors is None or row >= len(self._vectors):
+            shape = (self._num_rows, self.dim)
+            self._vectors = memmap(self._vectors_path, dtype=float32, mode="r", shape=shape)  # type: ignore
+        return array(self._vectors[row])
+
+    def put(self, items: List[Tuple[bytes, NDArray[float32]]]) -> None:
+        with self._locked():
+            self._sync()
+            items = [(digest, vector) for digest, vector in items if digest not in self._rows]
+            if len(items) == 0:
+                return
+            if self.dim is None:
+                self.dim = len(items[0][1])
+                self._dim_path.write_text(str(self.dim))
+
+            with open(self._vectors_path, "ab") as file:
+                for _, vector in items:
+                    file.write(vector.astype(float32).tobytes())
+            with open(self._index_path, "ab") as file:
+                for digest, _ in items:
+                    self._rows.setdefault(digest, self._num_rows)
+                    self._num_rows += 1
+                    file.write(digest)
+
+
+class EmbeddingCache:
+    """
+    Sentence transformer embeddings keyed by (model name, text hash), with an in-memory LRU in front of an
+    `EmbeddingStore` per model. The transformer only runs on texts that aren't in either.
+    """
+
+    MAX_MEMORY_ENTRIES = 50_000
+
+    _default: Optional["EmbeddingCache"] = None
+    _default_lock = Lock()
+
+    def __init__(self, directory: Optional[str], max_memory_entries: int = MAX_MEMORY_ENTRIES):
+        self.directory = Path(directory) if directory else None
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[Tuple[str, bytes], NDArray[float32]]" = OrderedDict()
+        self._stores: Dict[str, EmbeddingStore] = {}
+        self._lock = Lock()
+
+    @classmethod
+    def default(cls) -> "EmbeddingCache":
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls(EMBEDDING_CACHE_DIR)
+            return cls._default
+
+    def _store(self, model_name: str) -> Optional[EmbeddingStore]:
+        if self.directory is None:
+            return None
+        if model_name not in self._stores:
+            self._stores[model_name] = EmbeddingStore(self.directory / model_name.replace("/", "__"))
+        return self._stores[model_name]
+
+    def _remember(self, key: Tuple[str, bytes], vector: NDArray[float32]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def encode(self, texts: List[str], model_name: str, **kwargs) -> NDArray[float32]:
+        """
+        Embeddings of `texts` as a (len(texts), dim) array. Keyword arguments are passed on to the transformer.
+        """
+        if len(texts) == 0:
+            return array([], dtype=float32)
+
+        digests = [sha1(text.encode("utf-8")).digest() for text in texts]
+        found: Dict[bytes, NDArray[float32]] = {}
+        missing: Dict[bytes, str] = {}
+        with self._lock:
+            store = self._store(model_name)
+            for digest, text in zip(digests, texts):
+                key = (model_name, digest)
+                if digest in found or digest in missing:
+                    continue
+                vector = self._memory.get(key)
+                if vector is None and store is not None:
+                    vector = store.get(digest)
+                if vector is None:
+                    missing[digest] = text
+                else:
+                    self._remember(key, vector)
+                    found[digest] = vector
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if len(missing) > 0:
+            vectors = Sentence(model_name=model_name).encode(list(missing.values()), **kwargs)  # type: ignore
+            encoded = list(zip(missing.keys(), vectors))
+            with self._lock:
+                if store is not None:
+                    store.put(encoded)
+                for digest, vector in encoded:
+                    self._remember((model_name, digest), vector)
+                    found[digest] = vector
+
+        return stack([found[digest] for digest in digests])
+
+
+def encode(texts: List[str], model_name: str = COMMENT_MODEL, **kwargs) -> NDArray[float32]:
+    """
+    Embed texts with a sentence transformer, going through the process-wide embedding cache.
+    """
+    return EmbeddingCache.default().encode(texts, model_name, **kwargs)
 
 
 class VideoDescriptionEmbedding:
@@ -31,9 +270,7 @@ class VideoDescriptionEmbedding:
         self.video = video
 
     def get(self) -> NDArray[float32]:
-        transformer = Sentence(model_name="all-mpnet-base-v2")
-        embeddings = transformer.encode([self.video.description], show_progress_bar=False)  # type: ignore
-        return embeddings[0]
+        return encode([str(self.video.description)], TEXT_MODEL, show_progress_bar=False)[0]
 
 
 class VideoTitleEmbedding:
@@ -42,6 +279,4 @@ class VideoTitleEmbedding:
         self.video = video
 
     def get(self) -> NDArray[float32]:
-        transformer = Sentence(model_name="all-mpnet-base-v2")
-        embeddings = transformer.encode([self.video.title], show_progress_bar=False)  # type: ignore
-        return embeddings[0]
+        return encode([str(self.video.title)], TEXT_MODEL, show_progress_bar=False)[0]
@@ -1,20 +1,28 @@
-from dataclasses import dataclass
-from json import dumps
+from dataclasses import dataclass, field
 from re import findall, sub
-from typing import List
+from typing import Dict, List, Optional, Set, Tuple
 
 from emoji import demojize, emoji_list
-from numpy import mean, ndarray, std, triu_indices_from
-from sklearn.metrics.pairwise import cosine_similarity
+from numpy import float32, float64, mean, nan, ndarray, sqrt, std, triu
+from numpy.linalg import norm
 from textstat import textstat
 
-from src.embeddings import Sentence
+from src.embeddings import COMMENT_MODEL, encode
 from src.lists import AI_KEYWORDS, GENERIC_PRAISE
+from src.matching import PhraseMatcher
 from src.models import Comment, Video
 
 # Regex string that matches URLs.
 URL_REGEX = r"https?://\S+|www\.\S+"
 
+# Phrase lists compiled once, so each text is scanned for all of their phrases in a single pass.
+GENERIC_PRAISE_MATCHER = PhraseMatcher(GENERIC_PRAISE)
+AI_KEYWORDS_MATCHER = PhraseMatcher(AI_KEYWORDS)
+
+# Largest block of the comment similarity matrix held in memory at once. Videos with few enough comments
+# get the whole matrix in one matmul, and bigger ones are processed a few rows at a time.
+SIMILARITY_MEMORY_CAP_BYTES = 64 * 1024 * 1024
+
 
 @dataclass
 class VideoFeatures:
@@ -38,9 +46,6 @@ class VideoFeatures:
         mean_similarity: float
         similarity_std: float
 
-        # Serialized string of all comment embeddings
-        embeddings: str
-
     @dataclass
     class Description:
         len: int
@@ -63,6 +68,106 @@ def _clean_comment(text: str) -> str:
     return text
 
 
+@dataclass
+class _CommentStatistics:
+    """
+    Single-pass accumulator for the text statistics of a video's comments.
+    """
+
+    num_comments: int = 0
+    total_len: int = 0
+    total_words: int = 0
+    num_short: int = 0
+    num_duplicates: int = 0
+    num_emojis: int = 0
+    num_generic_praise: int = 0
+    cleaned_texts: Set[str] = field(default_factory=set)
+    unique_words: Set[str] = field(default_factory=set)
+
+    def add(self, dirty: str) -> None:
+        cleaned = _clean_comment(dirty)
+        words = dirty.split()
+        self.num_comments += 1
+
+        # Length before cleaning (since I want emojis to count as 1 character)
+        self.total_len += len(dirty)
+
+        # Duplicates after cleaning (since I want to exclude leading and trailing whitespace from duplicates)
+        if cleaned in self.cleaned_texts:
+            self.num_duplicates += 1
+        else:
+            self.cleaned_texts.add(cleaned)
+
+        # Num short before cleaning (since I want emojis to count as one character)
+        if len(words) <= 6:
+            self.num_short += 1
+
+        # Words and emojis across all comments (no emoji spans the whitespace between two comments)
+        self.total_words += len(words)
+        self.unique_words.update(words)
+        self.num_emojis += len(emoji_list(dirty))
+
+        self.num_generic_praise += GENERIC_PRAISE_MATCHER.count(dirty)
+
+    @property
+    def average_len(self) -> int:
+        return int(self.total_len / self.num_comments)
+
+    @property
+    def percent_short(self) -> float:
+        return self.num_short / self.num_comments
+
+    @property
+    def percent_duplicate(self) -> float:
+        return self.num_duplicates / self.num_comments
+
+    @property
+    def emoji_density(self) -> float:
+        return self.num_emojis / self.total_words
+
+    @property
+    def percent_unique_words(self) -> float:
+        return len(self.unique_words) / self.total_words
+
+    @property
+    def generic_praise_ratio(self) -> float:
+        return self.num_generic_praise / self.num_comments
+
+
+def _similarity_statistics(
+    embeddings: ndarray, memory_cap_bytes: int = SIMILARITY_MEMORY_CAP_BYTES
+) -> Tuple[float, float]:
+    """
+    Mean and standard deviation of the pairwise cosine similarities between comment embeddings (each pair
+    counted once), without ever holding more than `memory_cap_bytes` of the similarity matrix in memory.
+    """
+    n = len(embeddings)
+    num_pairs = n * (n - 1) // 2
+    if num_pairs == 0:
+        return nan, nan
+
+    normalized = embeddings.astype(float32)
+    norms = norm(normalized, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    normalized /= norms
+
+    # Each block holds some rows of the upper triangle, including the diagonal, which triu() then zeroes out
+    # along with the lower triangle so that only distinct pairs add to the sums. The sums are taken in float64,
+    # so every entry of a block costs a float32 product, its triu() copy and a float64 copy.
+    bytes_per_entry = 4 + 4 + 8
+    rows_per_block = max(1, min(n, memory_cap_bytes // (n * bytes_per_entry)))
+    total = 0.0
+    total_squares = 0.0
+    for start in range(0, n, rows_per_block):
+        block = triu(normalized[start : start + rows_per_block] @ normalized[start:].T, k=1).astype(float64).ravel()
+        total += float(block.sum())
+        total_squares += float(block @ block)
+
+    mean_similarity = total / num_pairs
+    variance = max(total_squares / num_pairs - mean_similarity**2, 0.0)
+    return mean_similarity, float(sqrt(variance))
+
+
 def _average_seconds_between_channel_uploads(self, video: Video) -> int:
     channel_videos = Video.select().where(Video.channel_id == video.channel_id)
     datetimes = [x.published_at for x in channel_videos]
@@ -70,21 +175,40 @@ def _average_seconds_between_channel_uploads(self, video: Video) -> int:
     return 0
 
 
-def extract_videos(videos: List[Video]) -> List[VideoFeatures]:
+def comments_by_video(videos: List[Video]) -> Dict[str, List[Comment]]:
+    """
+    The comments of every video, loaded with a single query.
+    """
+    comments: Dict[str, List[Comment]] = {str(video.id): [] for video in videos}
+    for comment in Comment.select().where(Comment.video.in_(list(comments))):
+        comments[str(comment.video_id)].append(comment)  # type: ignore
+    return comments
+
+
+def extract_videos(videos: List[Video], comments: Optional[Dict[str, List[Comment]]] = None) -> List[VideoFeatures]:
+    """
+    Features of many videos, embedding the comments of all of them in one batch. Comments are loaded with
+    `comments_by_video` unless they are given.
+    """
+    if comments is None:
+        comments = comments_by_video(videos)
+
+    texts = [str(comment.text) for video in videos for comment in comments[str(video.id)]]
+    embeddings = encode(texts, COMMENT_MODEL, batch_size=64, show_progress_bar=False)
+
     features_list = []
+    offset = 0
     for video in videos:
-        comments = Comment.select().where(Comment.video == video.id)
-        features = extract(video, comments)
+        video_comments = comments[str(video.id)]
+        features = extract(video, video_comments, embeddings[offset : offset + len(video_comments)])
         features_list.append(features)
+        offset += len(video_comments)
     return features_list
 
 
-def extract(video: Video, comments: list[Comment]) -> VideoFeatures:
+def extract(video: Video, comments: list[Comment], embeddings: Optional[ndarray] = None) -> VideoFeatures:
 
-    num_ai_keywords = 0
-    for ai_keyword in AI_KEYWORDS:
-        if ai_keyword in video.description:
-            num_ai_keywords += 1
+    num_ai_keywords = AI_KEYWORDS_MATCHER.count(str(video.description))
 
     readability = textstat.flesch_reading_ease(str(video.description))
     urls = findall(URL_REGEX, str(video.description))
@@ -97,78 +221,29 @@ def extract(video: Video, comments: list[Comment]) -> VideoFeatures:
         contains_ai_keywords=bool(num_ai_keywords > 0),
     )
 
-    unique_words = set()
-    dirty_comment_blob = ""
-    cleaned_comment_texts = []
     num_comments = len(comments)
-    num_duplicates = 0
-    comment_lens = []
-    num_short = 0
-    num_generic_praise = 0
-    embeddings = Sentence().encode([x.text for x in comments], batch_size=64, show_progress_bar=False)  # type: ignore
+    if embeddings is None:
+        embeddings = encode([str(x.text) for x in comments], COMMENT_MODEL, batch_size=64, show_progress_bar=False)
 
     if num_comments != 0:
+        stats = _CommentStatistics()
         for comment in comments:
-            dirty = str(comment.text)
-            cleaned = _clean_comment(dirty)
+            stats.add(str(comment.text))
 
-            # Length before cleaning (since I want emojis to count as 1 character)
-            comment_lens.append(len(dirty))
-
-            # Duplicates after cleaning (since I want to exclude leading and trailing whitespace from duplicates)
-            if cleaned in cleaned_comment_texts:
-                num_duplicates += 1
-
-            # Num short before cleaning (since I want emojis to count as one character)
-            num_words = len(dirty.split())
-            if num_words <= 6:
-                num_short += 1
-
-            # Append to cleaned comments list
-            cleaned_comment_texts.append(cleaned)
-
-            # Append to dirty comments blob
-            dirty_comment_blob += f" {dirty}"
-
-            # Append to unique words
-            for word in dirty.split():
-                unique_words.add(word)
-
-            # Append to generic praise
-            for generic_praise in GENERIC_PRAISE:
-                if generic_praise in dirty:
-                    num_generic_praise += 1
-
-        total_words = len(dirty_comment_blob.split())
-        average_len = int(sum(comment_lens) / num_comments)
-        emoji_density = len(emoji_list(dirty_comment_blob)) / total_words
-        generic_praise_ratio = num_generic_praise / num_comments
-
-        sim = cosine_similarity(embeddings)
-        upper = sim[triu_indices_from(sim, k=1)]
-
-        mean_similarity = upper.mean()
-        std_similarity = upper.std()
+        mean_similarity, similarity_std = _similarity_statistics(embeddings)
         comment_variance_score = mean(std(embeddings, axis=0))
-        similarity_matrix = cosine_similarity(embeddings)
-        N = similarity_matrix.shape[0]
-        percent_unique_words = len(unique_words) / total_words
-
-        sims = similarity_matrix[triu_indices_from(similarity_matrix, k=1)]
-        similarity_std = float(std(sims))
 
         comments_features = VideoFeatures.Comments(
-            average_len=average_len,
-            percent_short=num_short / num_comments,
-            percent_duplicate=num_duplicates / num_comments,
-            emoji_density=emoji_density,
-            percent_unique_words=percent_unique_words,
-            generic_praise_ratio=generic_praise_ratio,
-            std=float(std_similarity),
+            average_len=stats.average_len,
+            percent_short=stats.percent_short,
+            percent_duplicate=stats.percent_duplicate,
+            emoji_density=stats.emoji_density,
+            percent_unique_words=stats.percent_unique_words,
+            generic_praise_ratio=stats.generic_praise_ratio,
+            std=similarity_std,
             variance=float(comment_variance_score),
-            mean_similarity=float(mean_similarity),
+            mean_similarity=mean_similarity,
             similarity_std=similarity_std,
-            embeddings=dumps(embeddings.tolist()),
         )
     else:
         comments_features = VideoFeatures.Comments(
@@ -182,7 +257,6 @@ def extract(video: Video, comments: list[Comment]) -> VideoFeatures:
             variance=0,
             mean_similarity=0,
             similarity_std=0,
-            embeddings=embeddings,
         )
 
     return VideoFeatures(description=desc_features, comments=comments_features, embeddings=embeddings)
@@ -0,0 +1,237 @@
+"""
+Materialized video features. Each video's features are extracted once per version of the feature schema and stored
+in `VideoFeature`, and are only extracted again once the video's set of comments changes. Scoring and training read
+them from there instead of extracting them from the raw comments every time. Comment embeddings are stored the same
+way in `CommentEmbedding`, so each comment is only embedded once per model.
+"""
+
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime
+from hashlib import sha1, sha256
+from logging import getLogger
+from typing import Dict, Iterable, List, Optional
+
+from numpy import array, float32, float64, frombuffer, ndarray
+from peewee import JOIN, chunked, fn
+
+from src.embeddings import COMMENT_MODEL, MODEL_DIMENSIONS, encode
+from src.feature_extraction import VideoFeatures, comments_by_video, extract
+from src.models import Comment, CommentEmbedding, Video, VideoFeature
+
+logger = getLogger(__name__)
+
+# Bump whenever `extract` changes what it computes, so that the stored features are extracted again
+SCHEMA_VERSION = 1
+
+# Stale videos are extracted this many at a time, to bound the comments and embeddings held in memory at once
+REFRESH_BATCH_SIZE = 500
+
+# The scalar features, in the order they are stored and fed to the model
+FEATURE_NAMES = [x.name for x in fields(VideoFeatures.Description)] + [x.name for x in fields(VideoFeatures.Comments)]
+
+
+def comments_fingerprint(comment_ids: Iterable[str]) -> str:
+    """
+    Order-independent SHA-256 of a set of comment IDs.
+    """
+    return sha256("\n".join(sorted(str(x) for x in comment_ids)).encode()).hexdigest()
+
+
+def inputs_fingerprint(video: Video, comment_ids: Iterable[str]) -> str:
+    """
+    SHA-256 of everything a video's features are extracted from: its title, its description and its set of comments.
+    """
+    text = "\n".join([str(video.title), str(video.description), comments_fingerprint(comment_ids)])
+    return sha256(text.encode()).hexdigest()
+
+
+def comment_ids_by_video(videos: List[Video]) -> Dict[str, List[str]]:
+    """
+    The comment IDs of every video, loaded with a single query that only reads the (video, id) index.
+    """
+    comment_ids: Dict[str, List[str]] = {str(video.id): [] for video in videos}
+    query = Comment.select(Comment.video, Comment.id).where(Comment.video.in_(list(comment_ids))).tuples()
+    for video_id, comment_id in query:
+        comment_ids[str(video_id)].append(str(comment_id))
+    return comment_ids
+
+
+@dataclass
+class CommentEmbeddings:
+    """
+    The stored comment embeddings of many videos, as one contiguous (num_comments, dim) float32 array.
+    """
+
+    vectors: ndarray
+    comment_ids: List[str]
+    # Each video's rows of `vectors` and `comment_ids`
+    rows: Dict[str, slice]
+
+    def of(self, video_id: str) -> ndarray:
+        return self.vectors[self.rows[video_id]]
+
+
+def store_comment_embeddings(videos: List[Video], model_name: str = COMMENT_MODEL) -> int:
+    """
+    Embed the comments of the videos that have no stored embedding by `model_name` (or whose text changed since),
+    and store them with one bulk `COPY`. Returns the number of comments that were embedded.
+    """
+    query = (
+        Comment.select(Comment.id, Comment.text, CommentEmbedding.text_sha1)
+        .join(
+            CommentEmbedding,
+            JOIN.LEFT_OUTER,
+            on=(CommentEmbedding.comment == Comment.id) & (CommentEmbedding.model_name == model_name),
+        )
+        .where(Comment.video.in_([str(video.id) for video in videos]))
+        .tuples()
+    )
+    missing = []
+    for comment_id, text, stored_sha1 in query:
+        text_sha1 = sha1(str(text).encode("utf-8")).hexdigest()
+        if stored_sha1 != text_sha1:
+            missing.append((str(comment_id), str(text), text_sha1))
+    if len(missing) == 0:
+        return 0
+
+    logger.debug(f"Embedding {len(missing)} comments with {model_name}.")
+    vectors = encode([text for _, text, _ in missing], model_name, batch_size=64, show_progress_bar=False)
+    CommentEmbedding.copy_upsert_many(
+        {
+            "comment": comment_id,
+            "model_name": model_name,
+            "text_sha1": text_sha1,
+            "vector": array(vector, dtype=float32).tobytes(),
+        }
+        for (comment_id, _, text_sha1), vector in zip(missing, vectors)
+    )
+    return len(missing)
+
+
+def _dimension(model_name: str) -> int:
+    """
+    The length of `model_name`'s vectors: that of any stored one, or else its known width, without loading the model.
+    Unknown models with nothing stored get a width of 0.
+    """
+    size = (
+        CommentEmbedding.select(fn.octet_length(CommentEmbedding.vector))
+        .where(CommentEmbedding.model_name == model_name)
+        .limit(1)
+        .scalar()
+    )
+    if size is not None:
+        return size // float32().itemsize
+    return MODEL_DIMENSIONS.get(model_name, 0)
+
+
+def comment_embeddings(videos: List[Video], model_name: str = COMMENT_MODEL) -> CommentEmbeddings:
+    """
+    The stored comment embeddings of the videos, loaded with a single query. The vectors are concatenated as bytes
+    and viewed as one array, so nothing is parsed per row. Comments without a stored embedding are left out.
+    """
+    by_video: Dict[str, List[tuple]] = {str(video.id): [] for video in videos}
+    query = (
+        CommentEmbedding.select(Comment.video, CommentEmbedding.comment, CommentEmbedding.vector)
+        .join(Comment, on=(CommentEmbedding.comment == Comment.id))
+        .where(Comment.video.in_(list(by_video)) & (CommentEmbedding.model_name == model_name))
+        .tuples()
+    )
+    for video_id, comment_id, vector in query:
+        by_video[str(video_id)].append((str(comment_id), vector))
+
+    comment_ids: List[str] = []
+    buffers = []
+    rows: Dict[str, slice] = {}
+    for video_id, stored in by_video.items():
+        rows[video_id] = slice(len(comment_ids), len(comment_ids) + len(stored))
+        comment_ids.extend(comment_id for comment_id, _ in stored)
+        buffers.extend(vector for _, vector in stored)
+
+    vectors = frombuffer(b"".join(buffers), dtype=float32)
+    vectors = vectors.reshape(len(comment_ids), -1) if comment_ids else vectors.reshape(0, _dimension(model_name))
+    return CommentEmbeddings(vectors=vectors, comment_ids=comment_ids, rows=rows)
+
+
+def feature_row(features: VideoFeatures) -> List[float]:
+    row = asdict(features.description) | asdict(features.comments)
+    return [float(row[name]) for name in FEATURE_NAMES]
+
+
+def embedding(stored: VideoFeature) -> Optional[ndarray]:
+    """
+    The stored mean comment embedding of a video.
+    """
+    return None if stored.embedding is None else frombuffer(stored.embedding, dtype=float32)
+
+
+def refresh(videos: List[Video], comment_ids: Optional[Dict[str, List[str]]] = None) -> Dict[str, VideoFeature]:
+    """
+    The stored features of every video, by video ID. Features that are missing, or that were extracted from another
+    title, description or set of comments or by another schema version, are extracted from the stored comment
+    embeddings (embedding any comments that have none first) and stored, `REFRESH_BATCH_SIZE` videos at a time.
+    Comment IDs are loaded with `comment_ids_by_video` unless they are given.
+    """
+    features: Dict[str, VideoFeature] = {}
+    for batch in chunked(videos, REFRESH_BATCH_SIZE):
+        features |= _refresh_batch(batch, comment_ids)
+    return features
+
+
+def _refresh_batch(videos: List[Video], comment_ids: Optional[Dict[str, List[str]]]) -> Dict[str, VideoFeature]:
+    if comment_ids is None:
+        comment_ids = comment_ids_by_video(videos)
+
+    stored = {
+        str(x.video_id): x  # type: ignore
+        for x in VideoFeature.select().where(
+            VideoFeature.video.in_([str(video.id) for video in videos])
+            & (VideoFeature.schema_version == SCHEMA_VERSION)
+        )
+    }
+    stale = [
+        video
+        for video in videos
+        if str(video.id) not in stored
+        or stored[str(video.id)].inputs_fingerprint != inputs_fingerprint(video, comment_ids[str(video.id)])
+    ]
+
+    if len(stale) > 0:
+        logger.debug(f"Extracting the features of {len(stale)} of {len(videos)} videos.")
+        store_comment_embeddings(stale)
+        comments = comments_by_video(stale)
+        embeddings = comment_embeddings(stale)
+        now = datetime.now()
+        refreshed = []
+        for video in stale:
+            video_id = str(video.id)
+            # In the order of the stored embeddings, leaving out any comment that was added since they were stored
+            order = {x: i for i, x in enumerate(embeddings.comment_ids[embeddings.rows[video_id]])}
+            video_comments = sorted(
+                (x for x in comments[video_id] if str(x.id) in order), key=lambda x: order[str(x.id)]
+            )
+            features = extract(video, video_comments, embeddings.of(video_id))
+            refreshed.append(
+                VideoFeature(
+                    video=video.id,
+                    schema_version=SCHEMA_VERSION,
+                    # Of the comments the features were extracted from, in case some were added since
+                    inputs_fingerprint=inputs_fingerprint(video, (x.id for x in video_comments)),
+                    features=feature_row(features),
+                    embedding=(
+                        array(features.embeddings, dtype=float32).mean(axis=0).tobytes() if video_comments else None
+                    ),
+                    computed_at=now,
+                )
+            )
+        VideoFeature.upsert_many(refreshed)
+        stored |= {str(x.video_id): x for x in refreshed}  # type: ignore
+
+    return {str(video.id): stored[str(video.id)] for video in videos}
+
+
+def feature_matrix(videos: List[Video], comment_ids: Optional[Dict[str, List[str]]] = None) -> ndarray:
+    """
+    A (len(videos), len(FEATURE_NAMES)) matrix of the videos' features, refreshing any that are stale.
+    """
+    features = refresh(videos, comment_ids)
+    return array([features[str(video.id)].features for video in videos], dtype=float64).reshape(-1, len(FEATURE_NAMES))
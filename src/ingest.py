@@ -0,0 +1,101 @@
+"""
+Bulk loading of scraped videos and comments into the database with `BaseModel.copy_upsert_many`. Rows come in
+batches, from live API pulls or from newline-delimited JSON dumps (one row per line, by field name).
+"""
+
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from logging import getLogger
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Type, Union
+
+from peewee import Field
+
+from src.models import BaseModel, Comment, Video
+
+logger = getLogger(__name__)
+
+# The models that can be loaded, by table name
+MODELS: Dict[str, Type[BaseModel]] = {"video": Video, "comment": Comment}
+
+
+@dataclass
+class IngestStats:
+    table: str
+    # Rows streamed to the database, and rows inserted or updated (less if some rows were duplicates)
+    rows: int
+    merged: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def read_ndjson(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_ndjson(instances: Iterable[BaseModel], path: str) -> int:
+    """
+    Dump model instances for `read_ndjson`, returning how many were written.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for instance in instances:
+            row = {field.name: instance.__data__.get(field.name) for field in instance._meta.sorted_fields}
+            f.write(json.dumps(row, default=lambda x: x.isoformat() if isinstance(x, datetime) else str(x)) + "\n")
+            count += 1
+    return count
+
+
+def ingest(
+    model: Type[BaseModel],
+    batches: Iterable[Iterable[Union[BaseModel, dict]]],
+    update: Optional[Sequence[Field]] = None,
+    batch_size: int = 10_000,
+    commit_every: Optional[int] = None,
+) -> IngestStats:
+    """
+    Insert or update every row of `batches` with one `COPY` per `batch_size` rows. Batches are consumed lazily, so a
+    generator of API pulls streams into the database as it goes. By default everything is merged once at the end,
+    in one transaction, which suits dumps. With `commit_every`, whole batches are merged and committed as soon as at
+    least that many rows are pending, so that a long pull keeps what it loaded if it stops halfway and doesn't hold
+    a transaction open for its whole run.
+    """
+    rows = 0
+    merged = 0
+    start = perf_counter()
+
+    if commit_every is None:
+
+        def counted() -> Iterator[Union[BaseModel, dict]]:
+            nonlocal rows
+            for batch in batches:
+                for row in batch:
+                    rows += 1
+                    yield row
+
+        merged = model.copy_upsert_many(counted(), update=update, batch_size=batch_size)
+    else:
+        pending: List[Union[BaseModel, dict]] = []
+        for batch in batches:
+            pending.extend(batch)
+            if len(pending) >= commit_every:
+                merged += model.copy_upsert_many(pending, update=update, batch_size=batch_size)
+                rows += len(pending)
+                pending = []
+        if len(pending) > 0:
+            merged += model.copy_upsert_many(pending, update=update, batch_size=batch_size)
+            rows += len(pending)
+
+    stats = IngestStats(model._meta.table_name, rows, merged, perf_counter() - start)
+    logger.info(
+        f"Loaded {stats.rows} {stats.table} rows ({stats.merged} merged) in {stats.seconds:.2f}s, "
+        f"{stats.rows_per_second:.0f} rows/s."
+    )
+    return stats
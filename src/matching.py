@@ -0,0 +1,76 @@
+"""
+Multi-phrase substring matching for the explicitly defined phrase lists in `src.lists`.
+"""
+
+from collections import deque
+from typing import Dict, List, Sequence, Set, Tuple
+
+
+class PhraseMatcher:
+    """
+    An Aho-Corasick automaton built once from a list of phrases, which finds every phrase contained in a text
+    in a single pass over it. Matching is case-sensitive and phrases may overlap, exactly like `phrase in text`.
+    """
+
+    def __init__(self, phrases: Sequence[str]):
+        self.phrases = list(phrases)
+
+        # Trie of the phrases. State 0 is the root, and each state's outputs are the indices of the phrases
+        # ending there (duplicate phrases keep separate indices, so they are each counted).
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for index, phrase in enumerate(self.phrases):
+            state = 0
+            for char in phrase:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(index)
+
+        # Failure links, in breadth-first order so that every shorter suffix is linked before it is needed.
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                outputs[next_state].extend(outputs[fail[next_state]])
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs: List[Tuple[int, ...]] = [tuple(x) for x in outputs]
+
+    def find(self, text: str) -> Set[int]:
+        """
+        Indices of every phrase contained in `text`.
+        """
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+
+        # Empty phrases are contained in every text
+        matched = set(outputs[0])
+        state = 0
+        for char in text:
+            next_state = goto[state].get(char)
+            while next_state is None and state:
+                state = fail[state]
+                next_state = goto[state].get(char)
+            state = next_state or 0
+            if outputs[state]:
+                matched.update(outputs[state])
+        return matched
+
+    def count(self, text: str) -> int:
+        """
+        The number of phrases contained in `text`. Same as `sum(phrase in text for phrase in phrases)`.
+        """
+        return len(self.find(text))
@@ -1,13 +1,20 @@
+from datetime import datetime, timezone
+from io import StringIO
 from logging import getLogger
 from sys import modules
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
-from peewee import Model, PostgresqlDatabase
+from peewee import BlobField, CompositeKey, Field, Model, chunked
+from playhouse.pool import PooledPostgresqlDatabase
 
 from src.settings import (
     POSTGRES_DB,
     POSTGRES_HOST,
+    POSTGRES_MAX_CONNECTIONS,
     POSTGRES_PASSWORD,
+    POSTGRES_POOL_TIMEOUT,
     POSTGRES_PORT,
+    POSTGRES_STALE_TIMEOUT,
     POSTGRES_USER,
     TEST_POSTGRES_DB,
     TEST_POSTGRES_HOST,
@@ -17,45 +24,57 @@ from src.settings import (
 )
 
 """
-Database initialization code for Peewee models.
+Database initialization code for Peewee models. Nothing connects to the database on import: connections are taken
+from a pool when a query first needs one, and should be returned with `db.close()` (or `db.connection_context()`)
+when a thread is done with them. The schema is brought up to date by `migrations.migrate()`.
 """
 
 logger = getLogger(__name__)
 
 
-def _test_db() -> PostgresqlDatabase:
-    return PostgresqlDatabase(
+def _pool_options() -> dict:
+    return {
+        "max_connections": POSTGRES_MAX_CONNECTIONS,
+        "stale_timeout": POSTGRES_STALE_TIMEOUT,
+        "timeout": POSTGRES_POOL_TIMEOUT,
+    }
+
+
+def _test_db() -> PooledPostgresqlDatabase:
+    return PooledPostgresqlDatabase(
         database=TEST_POSTGRES_DB,
         user=TEST_POSTGRES_USER,
         password=TEST_POSTGRES_PASSWORD,
         host=TEST_POSTGRES_HOST,
         port=TEST_POSTGRES_PORT,
+        **_pool_options(),
     )
 
 
-def _db() -> PostgresqlDatabase:
-    return PostgresqlDatabase(
+def _db() -> PooledPostgresqlDatabase:
+    return PooledPostgresqlDatabase(
         database=POSTGRES_DB,
         user=POSTGRES_USER,
         password=POSTGRES_PASSWORD,
         host=POSTGRES_HOST,
         port=POSTGRES_PORT,
+        **_pool_options(),
     )
 
 
-def get_db() -> PostgresqlDatabase:
+def get_db() -> PooledPostgresqlDatabase:
     return _test_db() if "pytest" in modules else _db()
 
 
 def reset_test_database() -> None:
     from src.models import APP_MODELS
+    from src.models.migrations import migrate
 
     logger.debug("Resetting the test database...")
-    db = _test_db()
     try:
-        db.connect()
-        db.drop_tables(APP_MODELS)
-        db.create_tables(APP_MODELS)
+        with db.connection_context():
+            db.drop_tables(APP_MODELS)
+            migrate()
         logger.info("Successfully connected to the database: {}!".format(db.database))
     except Exception as e:
         logger.error("Failed to connect to the database: {}!".format(db.database), exc_info=e)
@@ -68,23 +87,134 @@ class BaseModel(Model):
     class Meta:
         database = db
 
+    @classmethod
+    def _key_fields(cls) -> List[Field]:
+        """
+        The fields of the primary key, which may be a `CompositeKey`.
+        """
+        key = cls._meta.primary_key
+        if isinstance(key, CompositeKey):
+            return [cls._meta.fields[name] for name in key.field_names]
+        return [key]
+
+    @classmethod
+    def upsert_many(
+        cls,
+        instances: Iterable["BaseModel"],
+        update: Optional[Sequence[Field]] = None,
+        batch_size: int = 1000,
+    ) -> None:
+        """
+        Insert or update many model instances with one `INSERT ... ON CONFLICT DO UPDATE` statement per batch.
+        Only the fields in `update` are overwritten for rows that already exist (defaults to every non-key field).
+        If a key is given more than once the last row wins, since Postgres refuses to update a row twice in one
+        statement.
+        """
+        fields = cls._meta.sorted_fields
+        keys = cls._key_fields()
+        rows_by_key: Dict[Tuple[Any, ...], dict] = {}
+        for instance in instances:
+            row = {field.name: instance.__data__.get(field.name) for field in fields}
+            rows_by_key[tuple(row[key.name] for key in keys)] = row
+        rows = list(rows_by_key.values())
+        if len(rows) == 0:
+            return
+
+        if update is None:
+            update = [field for field in fields if all(field is not key for key in cls._key_fields())]
+
+        with cls._meta.database.atomic():
+            for batch in chunked(rows, batch_size):
+                query = cls.insert_many(batch)
+                if len(update) > 0:
+                    query = query.on_conflict(conflict_target=cls._key_fields(), preserve=list(update))
+                else:
+                    query = query.on_conflict_ignore()
+                query.execute()
+
+    @staticmethod
+    def _copy_text(value: Any) -> str:
+        """
+        A value in the text format of `COPY`.
+        """
+        if value is None:
+            return "\\N"
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            # bytea in hex format
+            text = "\\x" + bytes(value).hex()
+        elif isinstance(value, datetime):
+            # The timestamp columns are without time zone, and Postgres drops an offset rather than applying it
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            text = value.isoformat()
+        else:
+            text = str(value)
+        return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+    @classmethod
+    def copy_upsert_many(
+        cls,
+        rows: Iterable[Union["BaseModel", dict]],
+        update: Optional[Sequence[Field]] = None,
+        batch_size: int = 10_000,
+    ) -> int:
+        """
+        Insert or update any number of model instances (or dicts by field name) by streaming them into a temporary
+        staging table with `COPY FROM STDIN`, and then merging that into the table with one `INSERT ... SELECT ... ON
+        CONFLICT DO UPDATE`. It makes one round trip per `batch_size` rows instead of per row or per statement, which
+        is what bulk loads need. Like `upsert_many`, only the fields in `update` are overwritten for rows that already
+        exist, and if a key is given more than once the last row wins. Returns the number of rows merged.
+        """
+        fields = cls._meta.sorted_fields
+        if update is None:
+            update = [field for field in fields if all(field is not key for key in cls._key_fields())]
+        table = cls._meta.table_name
+        columns = ", ".join(f'"{field.column_name}"' for field in fields)
+        key = ", ".join(f'"{field.column_name}"' for field in cls._key_fields())
+        staging = f"{table}_staging"
+
+        def line(row: Union["BaseModel", dict]) -> str:
+            data = row.__data__ if isinstance(row, BaseModel) else row
+            values = (data.get(field.name) for field in fields)
+            # Blobs are written as they are, since db_value() wraps them for parameter binding
+            return "\t".join(
+                cls._copy_text(x if x is None or isinstance(field, BlobField) else field.db_value(x))
+                for field, x in zip(fields, values)
+            )
+
+        database = cls._meta.database
+        with database.atomic():
+            cursor = database.cursor()
+            cursor.execute(f'DROP TABLE IF EXISTS "{staging}"')
+            cursor.execute(f'CREATE TEMPORARY TABLE "{staging}" (LIKE "{table}" INCLUDING DEFAULTS) ON COMMIT DROP')
+            # Numbers the rows in the order they were copied, so that the last of any duplicates wins
+            cursor.execute(f'ALTER TABLE "{staging}" ADD COLUMN "_row" BIGSERIAL')
+            for batch in chunked(rows, batch_size):
+                buffer = StringIO("".join(line(row) + "\n" for row in batch))
+                cursor.copy_expert(f'COPY "{staging}" ({columns}) FROM STDIN', buffer)
+
+            if len(update) > 0:
+                assignments = ", ".join(f'"{x.column_name}" = EXCLUDED."{x.column_name}"' for x in update)
+                conflict = f"DO UPDATE SET {assignments}"
+            else:
+                conflict = "DO NOTHING"
+            cursor.execute(
+                f'INSERT INTO "{table}" ({columns}) '
+                f'SELECT DISTINCT ON ({key}) {columns} FROM "{staging}" ORDER BY {key}, "_row" DESC '
+                f"ON CONFLICT ({key}) {conflict}"
+            )
+            return cursor.rowcount
+
 
 from src.models.channel import Channel
 from src.models.video import Video
 
 if True:
-    # Must be imported after Video, since Comment has a FK pointing to Video
+    # Must be imported after Video, since these have a FK pointing to Video (or to Comment, which points to Video)
     from src.models.comment import Comment
+    from src.models.comment_embedding import CommentEmbedding
+    from src.models.prediction import Prediction
+    from src.models.video_feature import VideoFeature
 
 # For creating tables (and destroying them in tests)
-APP_MODELS = [Video, Comment, Channel]
-
-
-try:
-    # Initialize a database connection on module-load
-    logger.info("Connecting to database...")
-    db.connect()
-    db.create_tables(APP_MODELS)
-    logger.info("Successfully connected to the database: {}!".format(db.database))
-except Exception as e:
-    logger.error("Failed to connect to the database: {}!".format(db.database), exc_info=e)
+APP_MODELS = [Video, Comment, Channel, Prediction, VideoFeature, CommentEmbedding]
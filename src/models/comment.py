@@ -13,10 +13,17 @@ from . import BaseModel, Video
 class Comment(BaseModel):
     id = CharField(max_length=255, primary_key=True)
     text = TextField()
-    video = ForeignKeyField(model=Video)
+    # Indexed together with the ID below, instead of on its own
+    video = ForeignKeyField(model=Video, index=False)
     author_channel_id = CharField(max_length=255)
     author_display_name = CharField(max_length=255)
     likes = IntegerField()
     is_reply = BooleanField()
     parent_comment_id = CharField(max_length=255, null=True)
     published_at = DateTimeField()
+
+    class Meta:
+        indexes = (
+            # A video's comments, or only their IDs without reading the table (for prediction fingerprints)
+            (("video", "id"), False),
+        )
@@ -0,0 +1,20 @@
+from peewee import BlobField, CharField, CompositeKey, ForeignKeyField
+
+from . import BaseModel, Comment
+
+
+class CommentEmbedding(BaseModel):
+    """
+    The sentence transformer embedding of a comment's text, by one model. Vectors are stored as raw float32 bytes, so
+    that many can be read into one numpy array without parsing (see `src.feature_store.comment_embeddings`).
+    """
+
+    # Indexed by the primary key, which starts with it
+    comment = ForeignKeyField(model=Comment, index=False)
+    model_name = CharField(max_length=255)
+    # SHA-1 of the text that was embedded, in case the comment was edited since
+    text_sha1 = CharField(max_length=40)
+    vector = BlobField()
+
+    class Meta:
+        primary_key = CompositeKey("comment", "model_name")
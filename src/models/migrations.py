@@ -0,0 +1,63 @@
+"""
+Schema migrations for databases that were created by older versions of the models.
+"""
+
+from datetime import datetime, timezone
+from logging import getLogger
+from typing import Callable, List, Tuple
+
+from peewee import CharField, DateTimeField
+
+from . import APP_MODELS, BaseModel, db
+
+logger = getLogger(__name__)
+
+
+class SchemaMigration(BaseModel):
+    """
+    A migration that has been applied to the database.
+    """
+
+    name = CharField(primary_key=True, max_length=255)
+    applied_at = DateTimeField()
+
+
+def _drop_comment_video_index() -> None:
+    # Comments used to be indexed by video on its own, which the (video, id) index covers now
+    db.execute_sql('DROP INDEX IF EXISTS "comment_video_id"')
+
+
+def _rename_fingerprint_columns() -> None:
+    # Features and predictions are fingerprinted by the video's title and description as well as its comments. Tables
+    # created since then already have the new column. Old predictions were fingerprinted by their comments alone, and
+    # so they won't match and get scored again.
+    for table in ["videofeature", "prediction"]:
+        if "comments_fingerprint" in {x.name for x in db.get_columns(table)}:
+            db.execute_sql(f'ALTER TABLE "{table}" RENAME COLUMN "comments_fingerprint" TO "inputs_fingerprint"')
+
+
+# Every migration, in the order they must be applied. Never rename or reorder them, only append.
+MIGRATIONS: List[Tuple[str, Callable[[], None]]] = [
+    ("0001_drop_comment_video_index", _drop_comment_video_index),
+    ("0002_rename_fingerprint_columns", _rename_fingerprint_columns),
+]
+
+
+def migrate() -> List[str]:
+    """
+    Bring the database up to date: create any missing table or index of the models, then apply the migrations
+    that haven't been applied yet. Returns the names of the migrations that were applied.
+    """
+    applied = []
+    with db.atomic():
+        # Only creates what doesn't exist yet (CREATE ... IF NOT EXISTS), so new indexes reach existing tables too
+        db.create_tables(APP_MODELS + [SchemaMigration])
+        done = {x.name for x in SchemaMigration.select(SchemaMigration.name)}
+        for name, migration in MIGRATIONS:
+            if name in done:
+                continue
+            logger.info(f"Applying migration {name}...")
+            migration()
+            SchemaMigration.create(name=name, applied_at=datetime.now(timezone.utc))
+            applied.append(name)
+    return applied
@@ -0,0 +1,19 @@
+from peewee import CharField, DateTimeField, FloatField, ForeignKeyField
+
+from . import BaseModel, Video
+
+
+class Prediction(BaseModel):
+    """
+    The last humanity score computed for a video. It is only valid for the model file, and the title, description
+    and set of comments it was computed from.
+    """
+
+    video = ForeignKeyField(model=Video, primary_key=True)
+    # SHA-256 of the LightGBM model file
+    model_hash = CharField(max_length=64)
+    # SHA-256 of the title, description and sorted comment IDs the features were extracted from (see
+    # `src.feature_store.inputs_fingerprint`)
+    inputs_fingerprint = CharField(max_length=64)
+    score = FloatField()
+    created_at = DateTimeField()
@@ -35,3 +35,11 @@ class Video(BaseModel):
     origin = CharField(max_length=255)
     duration_seconds = IntegerField()
     published_at = DateTimeField()
+
+    class Meta:
+        indexes = (
+            # Training and comment scraping select long, commented, scraped videos, and count them by label
+            (("origin", "label", "duration_seconds", "comments"), False),
+            # A channel's uploads, in order
+            (("channel_id", "published_at"), False),
+        )
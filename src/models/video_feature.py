@@ -0,0 +1,26 @@
+from peewee import BlobField, CharField, CompositeKey, DateTimeField, DoubleField, ForeignKeyField, IntegerField
+from playhouse.postgres_ext import ArrayField
+
+from . import BaseModel, Video
+
+
+class VideoFeature(BaseModel):
+    """
+    A video's features, as computed by one version of the feature schema (see `src.feature_store`). They are only
+    valid for the title, description and set of comments they were computed from.
+    """
+
+    # Indexed by the primary key, which starts with it
+    video = ForeignKeyField(model=Video, index=False)
+    schema_version = IntegerField()
+    # SHA-256 of the title, description and sorted comment IDs the features were extracted from (see
+    # `src.feature_store.inputs_fingerprint`)
+    inputs_fingerprint = CharField(max_length=64)
+    # The scalar features, in the order of the schema's feature names
+    features = ArrayField(DoubleField)
+    # Mean of the comment embeddings as float32 bytes, or None if the video has no comments
+    embedding = BlobField(null=True)
+    computed_at = DateTimeField()
+
+    class Meta:
+        primary_key = CompositeKey("video", "schema_version")
@@ -1,17 +1,22 @@
 import json
-from dataclasses import asdict
+from datetime import datetime, timedelta
+from functools import cache
+from hashlib import sha256
 from logging import WARNING, getLogger
 from time import perf_counter
+from typing import List, Optional
 
 from lightgbm import Booster
-from pandas import DataFrame
 from peewee import fn
 
-from src.feature_extraction import extract
-from src.models import Comment, Video
+from src.feature_store import FEATURE_NAMES, comment_ids_by_video, feature_matrix, inputs_fingerprint
+from src.models import Comment, Prediction, Video
 
 logger = getLogger(__name__)
 
+# How long a stored prediction is trusted before the video is re-scored, even if nothing else changed.
+PREDICTION_TTL = timedelta(days=7)
+
 
 class _VideoLabeler:
 
@@ -27,29 +32,112 @@ class _VideoLabeler:
         return cls._instance
 
 
-def predict(video, threshold=0.7) -> Video.Label:
+@cache
+def model_hash() -> str:
+    """
+    SHA-256 of the model file, so stored predictions are invalidated whenever the model is retrained.
+    """
+    with open(_VideoLabeler.MODEL_PATH, "rb") as file:
+        return sha256(file.read()).hexdigest()
+
+
+def _is_valid(prediction: Prediction, fingerprint: str, max_age: timedelta) -> bool:
+    return (
+        prediction.model_hash == model_hash()
+        and prediction.inputs_fingerprint == fingerprint
+        and prediction.created_at >= datetime.now() - max_age
+    )
+
+
+def cached_score(video: Video, max_age: timedelta = PREDICTION_TTL) -> Optional[float]:
+    """
+    The stored humanity score for a video, or None if there is none, or it was computed by a different model,
+    from a different title, description or set of comments, or more than `max_age` ago.
+    """
+    prediction = Prediction.get_or_none(Prediction.video == video.id)
+    if prediction is None:
+        return None
+    comment_ids = [x.id for x in Comment.select(Comment.id).where(Comment.video == video.id)]
+    if not _is_valid(prediction, inputs_fingerprint(video, comment_ids), max_age):
+        return None
+    return float(prediction.score)  # type: ignore
+
+
+def scores(videos: List[Video], max_age: timedelta = PREDICTION_TTL) -> List[float]:
+    """
+    Humanity scores in [0, 1] for many videos. Stored predictions are used while they are still valid, and the rest
+    of the videos are scored together: their stored features are read (extracting those that are stale) and fed to
+    one model call.
+    """
+    if len(videos) == 0:
+        return []
+
+    comment_ids = comment_ids_by_video(videos)
+    fingerprints = {str(video.id): inputs_fingerprint(video, comment_ids[str(video.id)]) for video in videos}
+    predictions = {
+        str(x.video_id): x for x in Prediction.select().where(Prediction.video.in_(list(fingerprints)))  # type: ignore
+    }
+
+    humanities = {}
+    stale = []
+    for video in videos:
+        prediction = predictions.get(str(video.id))
+        if prediction is not None and _is_valid(prediction, fingerprints[str(video.id)], max_age):
+            logger.debug(f"Using stored humanity score of {prediction.score:0.2f} for video {video.id}.")
+            humanities[str(video.id)] = float(prediction.score)  # type: ignore
+        else:
+            stale.append(video)
+
+    if len(stale) > 0:
+        features = feature_matrix(stale, comment_ids)
+        pred_categories = _VideoLabeler().predict(features)
+        now = datetime.now()
+        new_predictions = []
+        for video, row, humanity in zip(stale, features, pred_categories):  # type: ignore
+            humanities[str(video.id)] = float(humanity)
+            logger.debug(
+                f"Video {video.id} {video.title} by {video.channel_name} has humanity score of {humanity:0.2f}."
+            )
+            logger.debug(json.dumps(dict(zip(FEATURE_NAMES, row.tolist())), indent=2))
+            new_predictions.append(
+                Prediction(
+                    video=video.id,
+                    model_hash=model_hash(),
+                    inputs_fingerprint=fingerprints[str(video.id)],
+                    score=float(humanity),
+                    created_at=now,
+                )
+            )
+        Prediction.upsert_many(new_predictions)
+
+    return [humanities[str(video.id)] for video in videos]
+
+
+def score(video: Video, max_age: timedelta = PREDICTION_TTL) -> float:
+    """
+    Humanity score for a video in [0, 1], served from the stored prediction when it is still valid.
+    """
+    return scores([video], max_age)[0]
+
+
+def label_from_score(humanity: float, threshold=0.7) -> Video.Label:
+    if humanity >= threshold:
+        return Video.Label.HUMAN
+    return Video.Label.AI
 
-    comments = Comment.select().where(Comment.video == video.id)
-    features = extract(video, comments)
-    video_data = asdict(features.description) | asdict(features.comments)
-    pred_category = _VideoLabeler().predict(DataFrame([video_data]))
 
-    logger.debug(f"Video {video.id} {video.title} by {video.channel_name} has humanity score of {pred_category[0]:0.2f}.")  # type: ignore
-    logger.debug(json.dumps(video_data, indent=2))
+def predict_many(videos: List[Video], threshold=0.7, max_age: timedelta = PREDICTION_TTL) -> List[Video.Label]:
+    return [label_from_score(x, threshold) for x in scores(videos, max_age)]
 
-    if float(pred_category[0]) >= threshold:  # type: ignore
-        return Video.Label.HUMAN
-    return Video.Label.AI
 
+def predict(video, threshold=0.7, max_age: timedelta = PREDICTION_TTL) -> Video.Label:
+    return predict_many([video], threshold, max_age)[0]
 
-if __name__ == "__main__":
 
-    def predict_dummy(video, threshold=0.7) -> dict:
+if __name__ == "__main__":
 
-        comments = Comment.select().where(Comment.video == video.id)
-        features = extract(video, comments)
-        video_data = asdict(features.description) | asdict(features.comments)
-        return video_data
+    def feature_dicts(videos: List[Video]) -> List[dict]:
+        return [dict(zip(FEATURE_NAMES, row)) for row in feature_matrix(videos).tolist()]
 
     logger.setLevel(WARNING)
     videos = [
@@ -60,7 +148,7 @@ if __name__ == "__main__":
         # .where(Video.id == "X0X12AD7nK4")
         .order_by(fn.Random()).limit(50)
     ]
-    videos = [predict_dummy(x) for x in videos]
+    videos = feature_dicts(videos)
     avg = {k: sum(d[k] for d in videos) / len(videos) for k in videos[0]}
     print("Average APP feature-list:")
     print(avg)
@@ -73,7 +161,7 @@ if __name__ == "__main__":
         # .where(Video.id == "X0X12AD7nK4")
         .order_by(fn.Random()).limit(50)
     ]
-    videos = [predict_dummy(x) for x in videos]
+    videos = feature_dicts(videos)
     avg = {k: sum(d[k] for d in videos) / len(videos) for k in videos[0]}
     print("Average SCRAPED feature-list:")
     print(avg)
@@ -25,3 +25,33 @@ TEST_POSTGRES_USER = environ["TEST_POSTGRES_USER"]
 TEST_POSTGRES_PASSWORD = environ["TEST_POSTGRES_PASSWORD"]
 TEST_POSTGRES_PORT = environ["TEST_POSTGRES_PORT"]
 TEST_POSTGRES_HOST = environ["TEST_POSTGRES_HOST"]
+
+# Most database connections open at once, seconds before an idle connection is closed instead of reused, and seconds
+# to wait for a connection when they're all in use
+POSTGRES_MAX_CONNECTIONS = int(environ.get("POSTGRES_MAX_CONNECTIONS", 20))
+POSTGRES_STALE_TIMEOUT = float(environ.get("POSTGRES_STALE_TIMEOUT", 300))
+POSTGRES_POOL_TIMEOUT = float(environ.get("POSTGRES_POOL_TIMEOUT", 10))
+
+# Directory of the on-disk embedding cache (set to an empty string to only cache embeddings in memory)
+EMBEDDING_CACHE_DIR = environ.get("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+
+# SQLite file of cached YouTube API responses (set to an empty string to only cache them in memory)
+YOUTUBE_HTTP_CACHE = environ.get("YOUTUBE_HTTP_CACHE", ".cache/youtube.sqlite3")
+
+# YouTube API keys to spread requests across, comma separated (falls back to the single YOUTUBE_API_KEY)
+YOUTUBE_API_KEYS = [
+    x.strip() for x in environ.get("YOUTUBE_API_KEYS", environ.get("YOUTUBE_API_KEY", "")).split(",") if x.strip()
+]
+# SQLite file of the quota used per day by each API key and each priority, shared by the app and the scrapers (set to
+# an empty string to only track it in memory, per process)
+YOUTUBE_KEY_USAGE = environ.get("YOUTUBE_KEY_USAGE", ".cache/youtube_keys.sqlite3")
+
+# YouTube API quota units per day of each key, and how many of them only the app's own searches may spend
+YOUTUBE_DAILY_QUOTA = int(environ.get("YOUTUBE_DAILY_QUOTA", 10_000))
+YOUTUBE_INTERACTIVE_RESERVE = int(environ.get("YOUTUBE_INTERACTIVE_RESERVE", 2_000))
+# Rate limit of YouTube API requests, in quota units per second, and the most units that can be spent at once
+YOUTUBE_QUOTA_RATE = float(environ.get("YOUTUBE_QUOTA_RATE", 50))
+YOUTUBE_QUOTA_BURST = float(environ.get("YOUTUBE_QUOTA_BURST", 500))
+
+# Root URL of the YouTube Data API, e.g. a local `src.youtube.fake_server` (empty for Google's own)
+YOUTUBE_API_ROOT_URL = environ.get("YOUTUBE_API_ROOT_URL", "")
@@ -3,6 +3,7 @@ from datetime import datetime
 from pytest import fixture
 
 from src.models import reset_test_database
+from src.youtube.quota import KeyPool, QuotaScheduler
 
 
 @fixture(autouse=True)
@@ -19,6 +20,16 @@ def use_db(request):
         yield
 
 
+@fixture(autouse=True)
+def quota_in_memory(monkeypatch):
+    """
+    Keeps the API quota used by tests in memory, instead of charging it to the usage file shared by real processes.
+    """
+    monkeypatch.setattr("src.youtube.quota.YOUTUBE_KEY_USAGE", "")
+    monkeypatch.setattr(QuotaScheduler, "_default", None)
+    monkeypatch.setattr(KeyPool, "_default", None)
+
+
 VIDEO_DATA = {
     "id": "VVV5UmJNTTJLQ2l2WVFIblZpOHk4QUF3LncyZzRVV2NHcllR",
     "snippet": {
@@ -0,0 +1,23 @@
+import subprocess
+import sys
+from os import environ
+
+from playhouse.pool import PooledPostgresqlDatabase
+
+from src.models import db
+from src.settings import POSTGRES_MAX_CONNECTIONS, POSTGRES_STALE_TIMEOUT
+
+
+def test_db_is_pooled():
+    assert isinstance(db, PooledPostgresqlDatabase)
+    assert db._max_connections == POSTGRES_MAX_CONNECTIONS
+    assert db._stale_timeout == POSTGRES_STALE_TIMEOUT
+
+
+def test_importing_the_models_does_not_connect():
+    # An address that drops every packet, so that connecting would hang until the timeout
+    env = environ | {"POSTGRES_HOST": "10.255.255.1", "TEST_POSTGRES_HOST": "10.255.255.1", "PGCONNECT_TIMEOUT": "30"}
+    script = "import src.models, src.models.migrations; print(src.models.db.is_closed())"
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, timeout=10)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "True"
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+
+from pytest import fixture, mark
+
+from src.models import Comment, Video, db
+from src.models.migrations import MIGRATIONS, SchemaMigration, migrate
+
+NUM_VIDEOS = 2_000
+COMMENTS_PER_VIDEO = 10
+
+
+@fixture
+def seeded():
+    """
+    A few thousand videos over a hundred channels, a tenth of them scraped, each with some comments.
+    """
+    published_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    videos = [
+        Video(
+            id=f"video{i}",
+            title=f"Video {i}",
+            description="",
+            url=f"https://www.youtube.com/watch?v=video{i}",
+            thumbnail_url="example.com/image.png",
+            channel_id=f"channel{i % 100}",
+            channel_name=f"Channel {i % 100}",
+            likes=i,
+            comments=i % 200,
+            favorites=0,
+            views=10 * i,
+            contains_synthetic_media=False,
+            label=[Video.Label.UNLABELLED, Video.Label.HUMAN, Video.Label.AI][i % 3].value,
+            origin=(Video.Origin.SCRAPED if i % 10 == 0 else Video.Origin.APP).value,
+            duration_seconds=i % 600,
+            published_at=published_at + timedelta(hours=i),
+        )
+        for i in range(NUM_VIDEOS)
+    ]
+    Video.upsert_many(videos)
+    Comment.upsert_many(
+        Comment(
+            id=f"{video.id}.{j}",
+            text="So good",
+            video=video.id,
+            author_channel_id="UCxyz",
+            author_display_name="@user",
+            likes=j,
+            is_reply=False,
+            parent_comment_id=None,
+            published_at=published_at,
+        )
+        for video in videos
+        for j in range(COMMENTS_PER_VIDEO)
+    )
+    db.execute_sql("ANALYZE video")
+    db.execute_sql("ANALYZE comment")
+
+
+def plan(query) -> str:
+    sql, params = query.sql()
+    with db.atomic():
+        # Make sequential scans a last resort, so that the plan only has one if no index can serve the query
+        db.execute_sql("SET LOCAL enable_seqscan = off")
+        return "\n".join(row[0] for row in db.execute_sql(f"EXPLAIN {sql}", params).fetchall())
+
+
+HOT_QUERIES = [
+    # Predictions and training load a video's comments
+    lambda: Comment.select().where(Comment.video == "video7"),
+    lambda: Comment.select(Comment.id).where(Comment.video == "video7"),
+    # Feature extraction loads the comments of many videos at once
+    lambda: Comment.select().where(Comment.video.in_(["video1", "video2", "video3"])),
+    # Training and comment scraping select eligible videos...
+    lambda: Video.select().where((Video.duration_seconds > 60) & (Video.origin == Video.Origin.SCRAPED.value)),
+    lambda: Video.select().where(
+        (Video.duration_seconds > 60) & (Video.comments >= 50) & (Video.origin == Video.Origin.SCRAPED.value)
+    ),
+    # ...and count them by label
+    lambda: Video.select().where(
+        (Video.duration_seconds > 60)
+        & (Video.comments >= 50)
+        & (Video.origin == Video.Origin.SCRAPED.value)
+        & (Video.label == Video.Label.HUMAN.value)
+    ),
+    # A channel's uploads, in order
+    lambda: Video.select().where(Video.channel_id == "channel7").order_by(Video.published_at),
+]
+
+
+@mark.use_db
+@mark.parametrize("query", HOT_QUERIES)
+def test_hot_queries_use_an_index(seeded, query):
+    assert "Seq Scan" not in plan(query())
+
+
+@mark.use_db
+def test_migrate_upgrades_an_old_database():
+    # A database from before the (video, id) index, with comments indexed by video on their own
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "comment_video_id" ON "comment" ("video_id")')
+    db.execute_sql('DROP INDEX "comment_video_id_id"')
+    SchemaMigration.delete().execute()
+
+    assert migrate() == [name for name, _ in MIGRATIONS]
+    indexes = {row[0] for row in db.execute_sql("SELECT indexname FROM pg_indexes WHERE tablename = 'comment'")}
+    assert "comment_video_id_id" in indexes
+    assert "comment_video_id" not in indexes
+    # Nothing is left to do the second time
+    assert migrate() == []
+
+
+@mark.use_db
+def test_migrate_renames_the_fingerprint_columns():
+    # A database from before features and predictions were fingerprinted by title and description too
+    for table in ["videofeature", "prediction"]:
+        db.execute_sql(f'ALTER TABLE "{table}" RENAME COLUMN "inputs_fingerprint" TO "comments_fingerprint"')
+    SchemaMigration.delete().where(SchemaMigration.name == "0002_rename_fingerprint_columns").execute()
+
+    assert migrate() == ["0002_rename_fingerprint_columns"]
+    for table in ["videofeature", "prediction"]:
+        columns = {x.name for x in db.get_columns(table)}
+        assert "inputs_fingerprint" in columns
+        assert "comments_fingerprint" not in columns
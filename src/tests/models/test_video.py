@@ -10,3 +10,44 @@ def test_save_and_get(video_from_data):
     video_from_data.save(force_insert=True)
     assert 1 == Video.select().count()
     assert Video.get(id=VIDEO_DATA["id"]) == video_from_data
+
+
+@mark.use_db
+def test_upsert_many_only_updates_chosen_fields(video_from_data):
+    Video.upsert_many([video_from_data])
+    assert 1 == Video.select().count()
+
+    video_from_data.title = "New Title"
+    video_from_data.views = 1
+    Video.upsert_many([video_from_data], update=[Video.title])
+    assert 1 == Video.select().count()
+
+    video = Video.get(id=VIDEO_DATA["id"])
+    assert video.title == "New Title"
+    assert video.views == 9000
+
+
+@mark.use_db
+def test_upsert_many_keeps_the_last_of_each_video(video_from_data):
+    # e.g. a search page that returns the same video twice
+    renamed = Video(**(video_from_data.__data__ | {"title": "New Title"}))
+    Video.upsert_many([video_from_data, renamed])
+    assert 1 == Video.select().count()
+    assert Video.get(id=VIDEO_DATA["id"]).title == "New Title"
+
+
+@mark.use_db
+def test_copy_upsert_many_merges_the_last_of_each_video(video_from_data):
+    Video.upsert_many([video_from_data])
+
+    renamed = Video(**(video_from_data.__data__ | {"title": "New Title", "views": 1}))
+    # Text that has to be escaped for COPY
+    other = Video(**(video_from_data.__data__ | {"id": "other", "description": "Tabs\tnew\nlines \\ and \\N"}))
+    merged = Video.copy_upsert_many([video_from_data, renamed, other], update=[Video.title])
+    assert merged == 2
+    assert 2 == Video.select().count()
+
+    video = Video.get(id=VIDEO_DATA["id"])
+    assert video.title == "New Title"
+    assert video.views == 9000
+    assert Video.get(id="other").description == "Tabs\tnew\nlines \\ and \\N"
@@ -0,0 +1,102 @@
+import json
+import subprocess
+import sys
+from os import environ
+from time import sleep
+
+from isodate import parse_duration
+from playhouse.pool import MaxConnectionsExceeded
+from pytest import fixture, mark
+
+from src import app as app_module
+from src.models import Video
+from src.youtube import OfficialYouTubeService
+from src.youtube.fake_server import FakeYouTubeServer
+from src.youtube.http_cache import ResponseCache
+
+QUERY = "music"
+
+
+def test_importing_the_app_has_no_side_effects():
+    # No API key, and a database address that drops every packet, so that building the service or connecting fails
+    env = environ | {"YOUTUBE_API_KEY": "", "YOUTUBE_API_KEYS": "", "POSTGRES_HOST": "10.255.255.1"}
+    script = "import src.app; print(src.app.youtube, src.app.db.is_closed())"
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "None True"
+
+
+@fixture
+def server(monkeypatch):
+    """
+    The app searching the fake API server, already started, with every video labelled human.
+    """
+    # Responses are cached in memory, so that none of them is served from an earlier run
+    monkeypatch.setattr(ResponseCache, "_default", ResponseCache(""))
+    with FakeYouTubeServer() as server:
+        youtube = OfficialYouTubeService("fake-key", origin=Video.Origin.APP, root_url=server.root_url)
+        monkeypatch.setattr(app_module, "youtube", youtube)
+        monkeypatch.setattr(app_module, "_started", True)
+        monkeypatch.setattr(app_module, "predict_many", lambda videos, **_: [Video.Label.HUMAN] * len(videos))
+        # One page holds every match
+        monkeypatch.setitem(app_module.app.config, "MAX_VIDEOS_SEARCH_RESULTS", 50)
+        yield server
+
+
+def events(query: str) -> list[dict]:
+    response = app_module.app.test_client().get("/search", query_string={"query": query})
+    assert response.mimetype == "text/event-stream"
+    return [json.loads(x.removeprefix("data: ")) for x in response.get_data(as_text=True).split("\n\n") if x]
+
+
+def eligible_video_ids(server: FakeYouTubeServer, query: str) -> list[str]:
+    """
+    The videos matching `query` that the app assesses: long enough and with enough comments.
+    """
+    return [
+        video_id
+        for video_id, video in server.videos.items()
+        if (query in video["snippet"]["title"].lower() or query in video["snippet"]["description"].lower())
+        and int(video["statistics"]["commentCount"]) >= 50
+        and parse_duration(video["contentDetails"]["duration"]).total_seconds() > 60
+    ]
+
+
+@mark.use_db
+def test_search_streams_videos_as_their_comments_are_ready(server, monkeypatch):
+    video_ids = eligible_video_ids(server, QUERY)
+    assert len(video_ids) >= 3
+    slow, *rest = video_ids
+    get_comments = app_module.youtube.get_comments
+
+    def slow_get_comments(video_id: str, **kwargs):
+        if video_id == slow:
+            sleep(0.5)
+        return get_comments(video_id, **kwargs)
+
+    monkeypatch.setattr(app_module.youtube, "get_comments", slow_get_comments)
+
+    streamed = events(QUERY)
+    found = [x["data"]["video_id"] for x in streamed if x["type"] == "video"]
+    # The slowest video is streamed last, after the others that were ready before it
+    assert sorted(found[:-1]) == sorted(rest)
+    assert found[-1] == slow
+    assert streamed[-1] == {"type": "done", "count": len(video_ids), "nextPageToken": None}
+
+
+@mark.use_db
+def test_search_skips_videos_without_a_free_database_connection(server, monkeypatch):
+    video_ids = eligible_video_ids(server, QUERY)
+    busy = video_ids[0]
+
+    def cached_score(video: Video, _):
+        if video.id == busy:
+            raise MaxConnectionsExceeded("Exceeded maximum connections.")
+        return None
+
+    monkeypatch.setattr(app_module, "cached_score", cached_score)
+
+    streamed = events(QUERY)
+    found = [x["data"]["video_id"] for x in streamed if x["type"] == "video"]
+    assert sorted(found) == sorted(video_ids[1:])
+    assert streamed[-1]["type"] == "done"
@@ -1,9 +1,131 @@
-from pytest import mark
+from collections import OrderedDict
+from typing import List
 
-from src.embeddings import VideoDescriptionEmbedding
+from numpy import array, float32
+from pytest import fixture, mark
+from torch.nn import Linear, Module
+
+from src.embeddings import EmbeddingCache, EmbeddingStore, Sentence, VideoDescriptionEmbedding
+
+
+class FakeTransformer(Module):
+
+    # Every text passed to encode(), across all fake models
+    encoded: List[str] = []
+
+    def __init__(self, model_name: str):
+        super().__init__()
+        self.model_name = model_name
+        self.layer = Linear(4, 4)
+
+    def encode(self, texts: List[str], **kwargs):
+        FakeTransformer.encoded.extend(texts)
+        return array([[len(text), len(self.model_name), 0, 1] for text in texts], dtype=float32)
+
+
+@fixture
+def fake_transformers(monkeypatch):
+    """
+    Swap sentence transformers for tiny fakes and start every test with an empty registry.
+    """
+    monkeypatch.setattr("src.embeddings.SentenceTransformer", FakeTransformer)
+    monkeypatch.setattr(Sentence, "_models", OrderedDict())
+    monkeypatch.setattr(Sentence, "_stats", {})
+    monkeypatch.setattr(FakeTransformer, "encoded", [])
+    yield
 
 
 @mark.use_db
 def test_video_description_embedding_returns_expected_dimensions(video_from_data):
     embedding = VideoDescriptionEmbedding(video_from_data).get()
     assert embedding.shape == (768,)
+
+
+def test_sentence_returns_requested_model(fake_transformers):
+    assert Sentence(model_name="a").model_name == "a"  # type: ignore
+    assert Sentence(model_name="b").model_name == "b"  # type: ignore
+    assert Sentence(model_name="a") is Sentence(model_name="a")
+
+
+def test_sentence_evicts_least_recently_used_model(fake_transformers, monkeypatch):
+    monkeypatch.setattr(Sentence, "MAX_RESIDENT_MODELS", 2)
+    a = Sentence(model_name="a")
+    Sentence(model_name="b")
+    # Using "a" again makes "b" the least recently used model
+    Sentence(model_name="a")
+    Sentence(model_name="c")
+    assert list(Sentence._models) == ["a", "c"]
+    assert Sentence(model_name="a") is a
+
+
+def test_sentence_warm_up_reports_load_stats(fake_transformers):
+    stats = Sentence.warm_up("a", "b")
+    assert list(stats) == ["a", "b"]
+    # 4x4 weights and 4 biases, as float32
+    assert stats["a"].bytes == 80
+    assert stats["a"].seconds >= 0
+    assert Sentence.stats() == stats
+
+
+def test_embedding_cache_only_encodes_misses(fake_transformers, tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    first = cache.encode(["a", "bb", "a"], "model")
+    assert first.tolist() == [[1, 5, 0, 1], [2, 5, 0, 1], [1, 5, 0, 1]]
+    assert FakeTransformer.encoded == ["a", "bb"]
+
+    second = cache.encode(["bb", "ccc"], "model")
+    assert second.tolist() == [[2, 5, 0, 1], [3, 5, 0, 1]]
+    assert FakeTransformer.encoded == ["a", "bb", "ccc"]
+    # Counted once per distinct text
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_embedding_cache_is_keyed_by_model(fake_transformers, tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    assert cache.encode(["a"], "model").tolist() == [[1, 5, 0, 1]]
+    assert cache.encode(["a"], "other/model").tolist() == [[1, 11, 0, 1]]
+    assert FakeTransformer.encoded == ["a", "a"]
+
+
+def test_embedding_cache_reads_back_from_disk(fake_transformers, tmp_path):
+    EmbeddingCache(str(tmp_path)).encode(["a", "bb"], "model")
+
+    # A fresh cache has an empty LRU, so these can only come from the on-disk store
+    cache = EmbeddingCache(str(tmp_path), max_memory_entries=1)
+    assert cache.encode(["bb", "a", "bb"], "model").tolist() == [[2, 5, 0, 1], [1, 5, 0, 1], [2, 5, 0, 1]]
+    assert FakeTransformer.encoded == ["a", "bb"]
+
+    # Rows appended after loading are readable too
+    cache.encode(["ccc"], "model")
+    assert cache.encode(["ccc", "a"], "model").tolist() == [[3, 5, 0, 1], [1, 5, 0, 1]]
+    assert FakeTransformer.encoded == ["a", "bb", "ccc"]
+
+
+def test_embedding_store_drops_partially_written_rows(fake_transformers, tmp_path):
+    EmbeddingCache(str(tmp_path)).encode(["a", "bb"], "model")
+
+    # Simulate a crash after writing a vector, but before writing its digest
+    with open(tmp_path / "model" / "vectors.f32", "ab") as file:
+        file.write(array([9, 9, 9, 9], dtype=float32).tobytes())
+
+    cache = EmbeddingCache(str(tmp_path))
+    cache.encode(["ccc"], "model")
+    assert EmbeddingCache(str(tmp_path)).encode(["a", "bb", "ccc"], "model").tolist() == [
+        [1, 5, 0, 1],
+        [2, 5, 0, 1],
+        [3, 5, 0, 1],
+    ]
+
+
+def test_embedding_stores_shared_by_processes_stay_aligned(tmp_path):
+    # Two processes with a store on the same directory, each appending after the other
+    first = EmbeddingStore(tmp_path)
+    second = EmbeddingStore(tmp_path)
+    first.put([(b"a" * 20, array([1] * 4, dtype=float32))])
+    second.put([(b"b" * 20, array([2] * 4, dtype=float32)), (b"a" * 20, array([9] * 4, dtype=float32))])
+    first.put([(b"c" * 20, array([3] * 4, dtype=float32))])
+
+    # Every store picks up the rows the others appended the next time it writes
+    for store in [first, second, EmbeddingStore(tmp_path)]:
+        store.put([])
+        assert [store.get(x * 20).tolist() for x in [b"a", b"b", b"c"]] == [[1] * 4, [2] * 4, [3] * 4]
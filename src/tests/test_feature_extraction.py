@@ -0,0 +1,52 @@
+import json
+from pathlib import Path
+
+from numpy import float32, isnan, triu_indices
+from numpy.random import default_rng
+from pytest import approx, mark
+from sklearn.metrics.pairwise import cosine_similarity
+
+from src.feature_extraction import _CommentStatistics, _similarity_statistics
+
+# Comment texts for a handful of videos, with the statistics the original (list and string-blob based)
+# implementation of `extract()` produced for them.
+CORPUS = json.loads((Path(__file__).parent / "fixtures" / "comment_corpus.json").read_text())
+
+
+@mark.parametrize("video", CORPUS, ids=[x["id"] for x in CORPUS])
+def test_comment_statistics_match_recorded_outputs(video: dict):
+    stats = _CommentStatistics()
+    for text in video["comments"]:
+        stats.add(text)
+
+    # Compared with == on purpose, the outputs must be bit-identical
+    assert {
+        "average_len": stats.average_len,
+        "percent_short": stats.percent_short,
+        "percent_duplicate": stats.percent_duplicate,
+        "emoji_density": stats.emoji_density,
+        "percent_unique_words": stats.percent_unique_words,
+        "generic_praise_ratio": stats.generic_praise_ratio,
+    } == video["expected"]
+
+
+@mark.parametrize("n", [2, 3, 50, 257])
+def test_similarity_statistics_match_full_cosine_similarity_matrix(n: int):
+    embeddings = default_rng(n).normal(size=(n, 384)).astype(float32)
+    similarities = cosine_similarity(embeddings.astype(float)).astype(float)[triu_indices(n, k=1)]
+
+    mean_similarity, similarity_std = _similarity_statistics(embeddings)
+    assert mean_similarity == approx(similarities.mean(), abs=1e-6)
+    assert similarity_std == approx(similarities.std(), abs=1e-6)
+
+
+def test_similarity_statistics_blocked_matches_single_block():
+    embeddings = default_rng(0).normal(size=(300, 384)).astype(float32)
+    # Small enough to only fit a few rows of the similarity matrix at a time
+    blocked = _similarity_statistics(embeddings, memory_cap_bytes=300 * 16 * 7)
+    assert blocked == approx(_similarity_statistics(embeddings), abs=1e-6)
+
+
+def test_similarity_statistics_single_comment_is_nan():
+    mean_similarity, similarity_std = _similarity_statistics(default_rng(0).normal(size=(1, 384)).astype(float32))
+    assert isnan(mean_similarity) and isnan(similarity_std)
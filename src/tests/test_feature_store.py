@@ -0,0 +1,147 @@
+from datetime import datetime, timezone
+
+from numpy import float32, full
+from pytest import fixture, mark
+
+from src import feature_store
+from src.embeddings import MODEL_DIMENSIONS, TEXT_MODEL
+from src.feature_extraction import VideoFeatures
+from src.feature_store import (
+    FEATURE_NAMES,
+    comment_embeddings,
+    embedding,
+    feature_matrix,
+    feature_row,
+    refresh,
+    store_comment_embeddings,
+)
+from src.models import Comment, CommentEmbedding, Video, VideoFeature
+
+
+@fixture
+def encoded(monkeypatch):
+    """
+    Stand-in for the sentence transformer, recording the texts of every call.
+    """
+    calls = []
+
+    def encode(texts, *_, **__):
+        calls.append(list(texts))
+        return full((len(texts), 4), 0.5, dtype=float32)
+
+    monkeypatch.setattr("src.feature_store.encode", encode)
+    yield calls
+
+
+def comment(video: Video, i: int) -> Comment:
+    return Comment(
+        id=f"{video.id}.{i}",
+        text=f"Great song number {i}",
+        video=video.id,
+        author_channel_id="UCxyz",
+        author_display_name="@user",
+        likes=0,
+        is_reply=False,
+        parent_comment_id=None,
+        published_at=datetime(2024, 5, 1, tzinfo=timezone.utc),
+    )
+
+
+def test_feature_row_follows_the_feature_names():
+    description = VideoFeatures.Description(
+        len=1, readability_score=2.0, num_links=3, num_ai_keywords=4, contains_ai_keywords=True
+    )
+    comments = VideoFeatures.Comments(*range(5, 15))
+    assert len(FEATURE_NAMES) == 15
+    assert feature_row(VideoFeatures(description, comments, [])) == [1, 2, 3, 4, 1] + list(range(5, 15))
+
+
+@mark.use_db
+def test_features_are_only_extracted_again_when_comments_change(video_from_data, encoded):
+    other = Video(**(video_from_data.__data__ | {"id": "other"}))
+    Video.upsert_many([video_from_data, other])
+    Comment.upsert_many([comment(video_from_data, i) for i in range(3)])
+
+    first = feature_matrix([video_from_data, other])
+    assert first.shape == (2, 15)
+    assert len(encoded) == 1
+    assert VideoFeature.select().count() == 2
+
+    # Nothing changed, so the stored features are read
+    assert (feature_matrix([other, video_from_data]) == first[::-1]).all()
+    assert len(encoded) == 1
+
+    # Only the video with a new comment is extracted again
+    Comment.upsert_many([comment(other, 0)])
+    refresh([video_from_data, other])
+    assert encoded[1:] == [[comment(other, 0).text]]
+
+
+@mark.use_db
+def test_schema_versions_are_stored_apart(video_from_data, encoded, monkeypatch):
+    Video.upsert_many([video_from_data])
+    Comment.upsert_many([comment(video_from_data, 0)])
+    stored = refresh([video_from_data])[str(video_from_data.id)]
+    assert (embedding(stored) == full(4, 0.5, dtype=float32)).all()
+
+    # The comments aren't embedded again
+    monkeypatch.setattr(feature_store, "SCHEMA_VERSION", feature_store.SCHEMA_VERSION + 1)
+    refresh([video_from_data])
+    assert len(encoded) == 1
+    assert VideoFeature.select().where(VideoFeature.video == video_from_data.id).count() == 2
+
+
+@mark.use_db
+def test_comment_embeddings_are_stored_once_and_read_as_one_array(video_from_data, encoded):
+    other = Video(**(video_from_data.__data__ | {"id": "other"}))
+    Video.upsert_many([video_from_data, other])
+    comments = [comment(video_from_data, i) for i in range(3)] + [comment(other, i) for i in range(2)]
+    Comment.upsert_many(comments)
+
+    assert store_comment_embeddings([video_from_data, other]) == 5
+    assert store_comment_embeddings([video_from_data, other]) == 0
+    assert CommentEmbedding.select().count() == 5
+
+    # Edited comments are embedded again
+    Comment.update(text="Edited").where(Comment.id == comments[0].id).execute()
+    assert store_comment_embeddings([video_from_data]) == 1
+    assert encoded[-1] == ["Edited"]
+
+    stored = comment_embeddings([other, video_from_data, Video(id="none")])
+    assert stored.vectors.shape == (5, 4)
+    assert stored.vectors.flags.c_contiguous
+    assert (stored.vectors == 0.5).all()
+    assert sorted(stored.comment_ids[stored.rows["other"]]) == ["other.0", "other.1"]
+    assert stored.of(str(video_from_data.id)).shape == (3, 4)
+    assert stored.of("none").shape == (0, 4)
+
+    # Even when none of the videos has a stored vector, the width matches the model
+    assert comment_embeddings([Video(id="none")]).of("none").shape == (0, 4)
+    # With nothing stored for the model, its known width is used without loading it
+    assert comment_embeddings([Video(id="none")], TEXT_MODEL).of("none").shape == (0, MODEL_DIMENSIONS[TEXT_MODEL])
+
+
+@mark.use_db
+def test_features_are_extracted_again_when_the_description_changes(video_from_data, encoded):
+    Video.upsert_many([video_from_data])
+    Comment.upsert_many([comment(video_from_data, 0)])
+    first = refresh([video_from_data])[str(video_from_data.id)]
+
+    video_from_data.description = "Made with AI, see https://example.com"
+    Video.upsert_many([video_from_data])
+    second = refresh([video_from_data])[str(video_from_data.id)]
+    assert second.inputs_fingerprint != first.inputs_fingerprint
+    assert second.features != first.features
+    # The comments weren't embedded again
+    assert len(encoded) == 1
+
+
+@mark.use_db
+def test_stale_videos_are_extracted_in_batches(video_from_data, encoded, monkeypatch):
+    monkeypatch.setattr(feature_store, "REFRESH_BATCH_SIZE", 2)
+    videos = [Video(**(video_from_data.__data__ | {"id": f"video{i}"})) for i in range(5)]
+    Video.upsert_many(videos)
+    Comment.upsert_many([comment(video, 0) for video in videos])
+
+    assert feature_matrix(videos).shape == (5, 15)
+    assert [len(x) for x in encoded] == [2, 2, 1]
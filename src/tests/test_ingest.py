@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from pytest import mark, raises
+
+from src.ingest import ingest, read_ndjson, write_ndjson
+from src.models import BaseModel, Comment, Video
+
+
+@mark.parametrize(
+    "value, expected",
+    [
+        (None, "\\N"),
+        ("plain", "plain"),
+        (12, "12"),
+        (True, "True"),
+        # Separators and the escape character itself are escaped
+        ("a\tb\nc\rd\\e", "a\\tb\\nc\\rd\\\\e"),
+        # A literal \N isn't NULL
+        ("\\N", "\\\\N"),
+        # Written as naive UTC, like the timestamp columns hold them
+        (datetime(2024, 5, 1, 12, tzinfo=timezone.utc), "2024-05-01T12:00:00"),
+        (datetime(2024, 5, 1, 12, tzinfo=timezone(timedelta(hours=2))), "2024-05-01T10:00:00"),
+        (datetime(2024, 5, 1, 12), "2024-05-01T12:00:00"),
+        # bytea in hex format, with the backslash escaped for COPY
+        (b"\x00\xff\t", "\\\\x00ff09"),
+    ],
+)
+def test_copy_text(value, expected):
+    assert BaseModel._copy_text(value) == expected
+
+
+def comments_of(video: Video, count: int) -> List[Comment]:
+    return [
+        Comment(
+            id=f"comment{i}",
+            text=f"Comment {i}",
+            video=video.id,
+            author_channel_id="UCxyz",
+            author_display_name="@user",
+            likes=i,
+            is_reply=i % 2 == 1,
+            parent_comment_id="comment0" if i % 2 == 1 else None,
+            published_at=datetime(2024, 5, 1, 12, tzinfo=timezone.utc),
+        )
+        for i in range(count)
+    ]
+
+
+@mark.use_db
+def test_ndjson_dumps_load_in_batches(video_from_data, tmp_path):
+    Video.upsert_many([video_from_data])
+    comments = comments_of(video_from_data, 25)
+    path = str(tmp_path / "comments.ndjson")
+    assert write_ndjson(comments, path) == 25
+
+    stats = ingest(Comment, [read_ndjson(path), read_ndjson(path)], batch_size=10)
+    assert (stats.table, stats.rows, stats.merged) == ("comment", 50, 25)
+    assert stats.rows_per_second > 0
+    loaded = {x.id: x for x in Comment.select()}
+    naive = [{**x.__data__, "published_at": x.published_at.replace(tzinfo=None)} for x in comments]
+    assert [loaded[x.id].__data__ for x in comments] == naive
+
+
+@mark.use_db
+def test_pulls_keep_what_was_committed_when_they_fail(video_from_data):
+    Video.upsert_many([video_from_data])
+    comments = comments_of(video_from_data, 25)
+
+    def pull():
+        yield comments[:10]
+        yield comments[10:20]
+        raise KeyboardInterrupt()
+
+    with raises(KeyboardInterrupt):
+        ingest(Comment, pull(), commit_every=10)
+    assert Comment.select().count() == 20
+
+    stats = ingest(Comment, [comments[:10], comments[10:15], comments[15:]], commit_every=12)
+    assert (stats.rows, stats.merged) == (25, 25)
+    assert Comment.select().count() == 25
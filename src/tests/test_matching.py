@@ -0,0 +1,34 @@
+from pytest import mark
+
+from src.lists import AI_KEYWORDS, GENERIC_PRAISE
+from src.matching import PhraseMatcher
+
+
+@mark.parametrize(
+    "phrases, text",
+    [
+        # No matches
+        (["foo", "bar"], "baz"),
+        # Overlapping phrases are all found
+        (["she", "he", "hers", "his"], "ushers"),
+        # Phrases that are prefixes of each other
+        (["Great", "Great stuff", "stuff"], "Great stuff!"),
+        # Matching is case-sensitive
+        (["Very helpful"], "very helpful"),
+        # Duplicate phrases are each counted
+        (["ai music", "ai music"], "this is ai music"),
+        # Empty phrases are in every text
+        (["", "foo"], ""),
+        # A phrase found many times is counted once
+        (["la"], "la la la"),
+    ],
+)
+def test_count_matches_substring_semantics(phrases: list[str], text: str):
+    assert PhraseMatcher(phrases).count(text) == sum(phrase in text for phrase in phrases)
+
+
+def test_count_matches_substring_semantics_for_phrase_lists():
+    text = "Great stuff, this is well done. Nice drums! ai generated music, made with suno "
+    text += " ".join(GENERIC_PRAISE[::7])
+    for phrases in (GENERIC_PRAISE, AI_KEYWORDS):
+        assert PhraseMatcher(phrases).count(text) == sum(phrase in text for phrase in phrases)
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta, timezone
+
+from numpy import float32, zeros
+from pytest import fixture, mark
+
+from src.models import Comment, Prediction, Video
+from src.feature_store import comments_fingerprint
+from src.predictions import PREDICTION_TTL, cached_score, label_from_score, predict_many
+
+
+class FakeBooster:
+    def __init__(self):
+        # Shape of the feature matrix of every predict() call
+        self.calls = []
+
+    def predict(self, features):
+        self.calls.append(features.shape)
+        return [0.99] * len(features)
+
+
+@fixture
+def fake_booster(monkeypatch):
+    """
+    Stand-ins for the LightGBM model and the sentence transformer.
+    """
+    booster = FakeBooster()
+    monkeypatch.setattr("src.predictions._VideoLabeler", lambda: booster)
+    monkeypatch.setattr("src.predictions.model_hash", lambda: "model")
+    monkeypatch.setattr("src.feature_store.encode", lambda texts, *_, **__: zeros((len(texts), 4), dtype=float32))
+    yield booster
+
+
+def test_comments_fingerprint_ignores_order():
+    assert comments_fingerprint(["a", "b", "c"]) == comments_fingerprint(["c", "a", "b"])
+
+
+def test_comments_fingerprint_changes_with_comment_set():
+    assert comments_fingerprint(["a", "b"]) != comments_fingerprint(["a", "b", "c"])
+
+
+@mark.parametrize(
+    "humanity, threshold, expected",
+    [
+        (0.96, 0.95, Video.Label.HUMAN),
+        # The threshold itself counts as human
+        (0.95, 0.95, Video.Label.HUMAN),
+        (0.94, 0.95, Video.Label.AI),
+    ],
+)
+def test_label_from_score(humanity: float, threshold: float, expected: Video.Label):
+    assert label_from_score(humanity, threshold) == expected
+
+
+@mark.use_db
+def test_predict_many_scores_videos_in_one_call_and_reuses_stored_predictions(video_from_data, fake_booster):
+    other_video = Video(**(video_from_data.__data__ | {"id": "other"}))
+    Video.upsert_many([video_from_data, other_video])
+
+    assert predict_many([video_from_data, other_video], threshold=0.95) == [Video.Label.HUMAN, Video.Label.HUMAN]
+    # One row of 15 features per video
+    assert fake_booster.calls == [(2, 15)]
+
+    assert predict_many([other_video, video_from_data], threshold=0.95) == [Video.Label.HUMAN, Video.Label.HUMAN]
+    assert fake_booster.calls == [(2, 15)]
+
+
+@mark.use_db
+def test_cached_score_is_invalidated_by_a_new_model(video_from_data, fake_booster, monkeypatch):
+    Video.upsert_many([video_from_data])
+    predict_many([video_from_data])
+    assert cached_score(video_from_data) == 0.99
+
+    monkeypatch.setattr("src.predictions.model_hash", lambda: "retrained")
+    assert cached_score(video_from_data) is None
+
+
+@mark.use_db
+def test_cached_score_is_invalidated_by_new_comments(video_from_data, fake_booster):
+    Video.upsert_many([video_from_data])
+    predict_many([video_from_data])
+    assert cached_score(video_from_data) == 0.99
+
+    Comment.upsert_many(
+        [
+            Comment(
+                id="new",
+                text="First!",
+                video=video_from_data.id,
+                author_channel_id="UCxyz",
+                author_display_name="@user",
+                likes=0,
+                is_reply=False,
+                parent_comment_id=None,
+                published_at=datetime(2024, 5, 1, tzinfo=timezone.utc),
+            )
+        ]
+    )
+    assert cached_score(video_from_data) is None
+
+
+@mark.use_db
+def test_cached_score_is_invalidated_by_a_new_description(video_from_data, fake_booster):
+    Video.upsert_many([video_from_data])
+    predict_many([video_from_data])
+    assert cached_score(video_from_data) == 0.99
+
+    video_from_data.description = "Made with AI, see https://example.com"
+    assert cached_score(video_from_data) is None
+
+
+@mark.use_db
+def test_cached_score_expires_after_the_ttl(video_from_data, fake_booster):
+    Video.upsert_many([video_from_data])
+    predict_many([video_from_data])
+
+    created_at = datetime.now() - PREDICTION_TTL - timedelta(minutes=1)
+    Prediction.update(created_at=created_at).where(Prediction.video == video_from_data.id).execute()
+    assert cached_score(video_from_data) is None
+    # Unless the caller allows older predictions
+    assert cached_score(video_from_data, max_age=PREDICTION_TTL * 2) == 0.99
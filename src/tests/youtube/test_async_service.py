@@ -0,0 +1,125 @@
+import asyncio
+
+from pytest import fixture, mark, raises
+
+from src.models import Video
+from src.youtube import OfficialYouTubeService
+from src.youtube.async_service import AsyncOfficialYouTubeService
+from src.youtube.fake_server import FakeYouTubeServer
+from src.youtube.official_service import YouTubeServiceBase
+
+
+@fixture(scope="module")
+def server():
+    with FakeYouTubeServer() as server:
+        yield server
+
+
+def run(server, method: str, *args, **kwargs):
+    """
+    Call a service coroutine on a fresh service and event loop.
+    """
+
+    async def call():
+        async with AsyncOfficialYouTubeService("fake-key", Video.Origin.APP, base_url=server.base_url) as youtube:
+            return await getattr(youtube, method)(*args, **kwargs)
+
+    return asyncio.run(call())
+
+
+def test_search_follows_page_tokens(server):
+    first = run(server, "search", "lofi", max_results=2)
+    second = run(server, "search", "lofi", max_results=2, page_token=first.next_page_token)
+    expected = [
+        x for x, v in server.videos.items() if "lofi" in (v["snippet"]["title"] + v["snippet"]["description"]).lower()
+    ]
+    assert first.video_ids + second.video_ids == expected[:4]
+    assert first.next_page_token is not None
+
+
+def test_videos_parse_like_the_sync_service(server):
+    response = run(server, "videos", "jazz")
+    sync = OfficialYouTubeService("fake-key", Video.Origin.APP)
+    assert len(response.videos) == 2
+    for video in response.videos:
+        assert video.__data__ == sync._video_from_data(server.videos[video.id]).__data__
+
+
+def test_get_channel_videos(server):
+    channel_id = "UCLdqZBVvWa174TnYyLC-IAg"
+    videos = run(server, "get_channel_videos", channel_id, max_videos=3)
+    assert [v.id for v in videos] == server.playlists[server.channels[channel_id]][:3]
+    assert all(v.channel_id == channel_id for v in videos)
+
+
+@mark.parametrize(
+    "channel_id, error",
+    [
+        # Unknown channels have no items
+        ("UCdoesnotexist", AsyncOfficialYouTubeService.ChannelNotFound),
+        # Known channel whose uploads playlist is gone
+        ("UCm1AAvgMlMsUv49S9Qt2EDA", AsyncOfficialYouTubeService.PlaylistNotFound),
+    ],
+)
+def test_get_channel_videos_not_found(server, channel_id, error):
+    with raises(error):
+        run(server, "get_channel_videos", channel_id)
+
+
+def test_get_comments_includes_inline_replies(server):
+    video_id = next(iter(server.comment_threads))
+    threads = server.comment_threads[video_id]
+    comments = run(server, "get_comments", video_id, max_results=100)
+    assert len(comments) == sum(1 + len(t.get("replies", {}).get("comments", [])) for t in threads)
+    assert [c.id for c in comments if not c.is_reply] == [t["id"] for t in threads]
+    assert all(c.video_id == video_id for c in comments)
+
+
+def test_iter_comments_fetches_every_reply(server):
+    async def collect():
+        async with AsyncOfficialYouTubeService("fake-key", Video.Origin.APP, base_url=server.base_url) as youtube:
+            return [
+                c async for c in youtube.iter_comments(video_id, max_comments=1000, fetch_replies=True, page_size=2)
+            ]
+
+    video_id = "L21pffWQJEe"
+    expected = []
+    for thread in server.comment_threads[video_id]:
+        expected.append(thread["id"])
+        expected.extend(x["id"] for x in server.comment_replies.get(thread["id"], []))
+    assert [c.id for c in asyncio.run(collect())] == expected
+
+
+def test_get_comments_returns_empty_when_comments_disabled(server):
+    video_id = next(iter(server.comments_disabled))
+    assert run(server, "get_comments", video_id, max_results=100) == []
+
+
+def test_get_comments_raises_other_errors(server):
+    with raises(AsyncOfficialYouTubeService.ApiError) as e:
+        run(server, "get_comments", "notAVideoId", max_results=100)
+    assert e.value.reason == "videoNotFound"
+
+
+def test_get_comments_concurrently_on_one_client(server):
+    async def fetch_all():
+        async with AsyncOfficialYouTubeService("fake-key", Video.Origin.APP, base_url=server.base_url) as youtube:
+            return await asyncio.gather(*(youtube.get_comments(x, max_results=100) for x in server.comment_threads))
+
+    results = asyncio.run(fetch_all())
+    assert [len(x) for x in results] == [
+        len(run(server, "get_comments", video_id, max_results=100)) for video_id in server.comment_threads
+    ]
+
+
+def test_api_error_carries_reason(server):
+    with raises(AsyncOfficialYouTubeService.ApiError) as e:
+        run(server, "_get", "playlistItems", playlistId="missing")
+    assert e.value.status == 404
+    assert e.value.reason == "playlistNotFound"
+
+
+def test_async_service_is_not_a_sync_service():
+    # It shares the parsing, but its methods are coroutines, so it mustn't pass for a sync service
+    assert issubclass(AsyncOfficialYouTubeService, YouTubeServiceBase)
+    assert not issubclass(AsyncOfficialYouTubeService, OfficialYouTubeService)
@@ -0,0 +1,41 @@
+from pytest import mark
+
+from src.youtube import CompiledTemplate, fill_from, find_none_paths
+
+
+def _leaves(filled: dict, template: dict) -> list:
+    """
+    The values of `filled` at the leaves of `template`, in order.
+    """
+    leaves = []
+    for key, value in template.items():
+        leaves.extend(_leaves(filled[key], value) if isinstance(value, dict) else [filled[key]])
+    return leaves
+
+
+@mark.parametrize(
+    "source",
+    (
+        # Every leaf given
+        {"foo": 1, "foo2": {"bar2": 2, "baz2": 3}, "foo3": {"bar3": {"baz3": 4}}},
+        # Defaults are used for missing leaves
+        {"foo2": {"bar2": 2}, "foo3": {"bar3": {"baz3": 4}}},
+        # Dict and list values are kept as they are
+        {"foo2": {"bar2": [1, 2], "baz2": {"x": 1}}, "foo3": {"bar3": {"baz3": 4}}},
+        # A non-dict where a dict is expected counts as empty
+        {"foo2": "oops", "foo3": {"bar3": {"baz3": 4}}},
+        # Missing required leaves
+        {"foo": 1},
+        # None given for a leaf with a default
+        {"foo": None, "foo2": {"bar2": 2}, "foo3": {"bar3": {"baz3": 4}}},
+        # None nested in a list value
+        {"foo2": {"bar2": [1, None]}, "foo3": {"bar3": {"baz3": 4}}},
+        # None nested in a dict value
+        {"foo2": {"baz2": {"x": None}}, "foo3": {"bar3": {"baz3": 4}}},
+    ),
+)
+def test_compiled_template_agrees_with_fill_from(source: dict):
+    template = {"foo": 0, "foo2": {"bar2": 0, "baz2": "default"}, "foo3": {"bar3": {"baz3": None}}}
+    filled = fill_from(source, template)
+    expected = None if find_none_paths(filled) else _leaves(filled, template)
+    assert CompiledTemplate(template).extract(source) == expected
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+import httpx
+from googleapiclient.discovery import build
+from pytest import fixture
+
+from src.models import Video
+from src.youtube import OfficialYouTubeService
+from src.youtube.fake_server import FakeYouTubeServer, record
+from src.youtube.http_cache import ResponseCache
+from src.youtube.retry import RetryPolicy
+
+
+@fixture(scope="module")
+def server():
+    with FakeYouTubeServer() as server:
+        yield server
+
+
+def videos_request(key="fake-key") -> tuple[str, dict]:
+    return "/youtube/v3/videos", {"key": key, "part": "snippet", "id": "EqV8ib8HDy8"}
+
+
+def test_latency():
+    with FakeYouTubeServer(latency=0.05) as server:
+        start = monotonic()
+        response = httpx.get(server.base_url + "videos", params=videos_request()[1])
+        assert monotonic() - start >= 0.05
+    assert response.status_code == 200
+
+
+def test_injected_errors_fail_the_next_matching_requests():
+    server = FakeYouTubeServer()
+    server.inject_error(503, "backendError", endpoint="search", times=2)
+    # Other endpoints aren't affected
+    assert server.handle(*videos_request())[0] == 200
+    statuses = [server.handle("/youtube/v3/search", {"key": "fake-key", "q": "jazz"})[0] for _ in range(3)]
+    assert statuses == [503, 503, 200]
+
+
+def test_random_errors_are_reproducible():
+    def statuses() -> list[int]:
+        server = FakeYouTubeServer(error_rate=0.5, seed=7)
+        return [server.handle(*videos_request())[0] for _ in range(20)]
+
+    first = statuses()
+    assert set(first) == {200, 503}
+    assert statuses() == first
+
+
+def test_quota_is_charged_per_api_key():
+    server = FakeYouTubeServer(daily_quota=150)
+    search = {"key": "fake-key", "q": "jazz"}
+    assert server.handle("/youtube/v3/search", search)[0] == 200
+    status, body = server.handle("/youtube/v3/search", search)
+    assert status == 403
+    assert body["error"]["errors"][0]["reason"] == "quotaExceeded"
+    # Cheaper requests still fit, and other keys have their own quota
+    assert server.handle(*videos_request())[0] == 200
+    assert server.handle("/youtube/v3/search", search | {"key": "other-key"})[0] == 200
+    assert server.quota_used == {"fake-key": 101, "other-key": 100}
+
+
+def test_service_requests_go_to_the_root_url(server, monkeypatch):
+    monkeypatch.setattr(ResponseCache, "_default", ResponseCache(""))
+    retry = RetryPolicy(base_delay=0.001, max_delay=0.001)
+    server.inject_error(503, "backendError", endpoint="search")
+
+    def search():
+        youtube = OfficialYouTubeService("root-url-key", Video.Origin.APP, retry=retry, root_url=server.root_url)
+        return youtube.search("jazz", max_results=2)
+
+    # On a new thread, so that it gets an http object with the in-memory cache
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        response = pool.submit(search).result()
+    assert (
+        response.video_ids
+        == [
+            x
+            for x, v in server.videos.items()
+            if "jazz" in (v["snippet"]["title"] + v["snippet"]["description"]).lower()
+        ][:2]
+    )
+    assert retry.snapshot()["retried"] == {"backendError": 1}
+    assert [params["key"] for endpoint, params in server.requests if endpoint == "search"][-2:] == ["root-url-key"] * 2
+
+
+def test_recorded_corpus_replays_like_the_original(server, tmp_path):
+    # Record from the fake server standing in for the real API, then serve the recording from another one
+    youtube = build(
+        "youtube",
+        "v3",
+        developerKey="fake-key",
+        static_discovery=True,
+        client_options={"api_endpoint": server.root_url},
+    )
+    record(youtube, ["jazz"], tmp_path, videos_per_query=5)
+    replay = FakeYouTubeServer(tmp_path)
+
+    search = {"key": "fake-key", "q": "jazz", "maxResults": "5"}
+    assert (
+        replay.handle("/youtube/v3/search", search)[1]["items"]
+        == server.handle("/youtube/v3/search", search)[1]["items"]
+    )
+    assert replay.comment_threads
+    for video_id in replay.comment_threads:
+        threads = {"key": "fake-key", "part": "snippet,replies", "videoId": video_id, "maxResults": "100"}
+        assert replay.handle("/youtube/v3/commentThreads", threads) == server.handle(
+            "/youtube/v3/commentThreads", threads
+        )
+        # Replies are only recorded for threads where some aren't inline
+        for thread in replay.comment_threads[video_id]:
+            if thread["snippet"]["totalReplyCount"] > len(thread.get("replies", {}).get("comments", [])):
+                assert replay.comment_replies[thread["id"]] == server.comment_replies[thread["id"]]
+    assert replay.channels.items() <= server.channels.items()
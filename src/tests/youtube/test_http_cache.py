@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+from pytest import fixture, mark, raises
+
+from src.youtube.fake_server import FakeYouTubeServer
+from src.youtube.http_cache import CachingHttp, ResponseCache
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@fixture(scope="module")
+def server():
+    with FakeYouTubeServer() as server:
+        yield server
+
+
+@fixture
+def clock():
+    return Clock()
+
+
+@fixture
+def cache(clock):
+    return ResponseCache("", ttls={"videos": timedelta(hours=1)}, clock=clock)
+
+
+def resource(server: FakeYouTubeServer, cache: ResponseCache, api_key="fake-key"):
+    return build(
+        "youtube",
+        "v3",
+        developerKey=api_key,
+        http=CachingHttp(build_http(), cache),
+        static_discovery=True,
+        client_options={"api_endpoint": server.root_url},
+    )
+
+
+@mark.parametrize(
+    "uri, expected",
+    [
+        # The API key is dropped and the parameters are sorted
+        (
+            "https://www.googleapis.com/youtube/v3/videos?part=snippet&key=abc&id=x",
+            ("https://www.googleapis.com/youtube/v3/videos?id=x&part=snippet", "videos"),
+        ),
+        # No parameters
+        ("http://127.0.0.1:8080/youtube/v3/search", ("http://127.0.0.1:8080/youtube/v3/search", "search")),
+    ],
+)
+def test_key(uri, expected):
+    assert ResponseCache.key(uri) == expected
+
+
+def test_responses_are_served_fresh_then_revalidated(server, cache, clock):
+    video_id = next(iter(server.videos))
+    youtube = resource(server, cache)
+    first = youtube.videos().list(part="snippet", id=video_id).execute()
+    num_requests = len(server.requests)
+
+    # Within the TTL nothing is requested, even with another API key
+    assert resource(server, cache, api_key="other-key").videos().list(part="snippet", id=video_id).execute() == first
+    assert len(server.requests) == num_requests
+    assert cache.stats == ResponseCache.Stats(hits=1, revalidated=0, misses=1)
+
+    # Past the TTL the response is revalidated, and then fresh for another TTL
+    clock.now += timedelta(hours=2).total_seconds()
+    assert youtube.videos().list(part="snippet", id=video_id).execute() == first
+    assert youtube.videos().list(part="snippet", id=video_id).execute() == first
+    assert len(server.requests) == num_requests + 1
+    assert cache.stats == ResponseCache.Stats(hits=2, revalidated=1, misses=1)
+
+
+def test_changed_responses_are_downloaded_again(server, cache, clock):
+    video_id = next(iter(server.videos))
+    youtube = resource(server, cache)
+    youtube.videos().list(part="snippet", id=video_id).execute()
+
+    original = server.videos[video_id]
+    server.videos[video_id] = original | {"snippet": original["snippet"] | {"title": "A new title"}}
+    try:
+        clock.now += timedelta(hours=2).total_seconds()
+        response = youtube.videos().list(part="snippet", id=video_id).execute()
+    finally:
+        server.videos[video_id] = original
+    assert response["items"][0]["snippet"]["title"] == "A new title"
+    assert cache.stats == ResponseCache.Stats(hits=0, revalidated=0, misses=2)
+
+
+def test_endpoints_without_a_ttl_are_always_revalidated(server, cache):
+    youtube = resource(server, cache)
+    first = youtube.search().list(part="snippet", q="jazz").execute()
+    assert youtube.search().list(part="snippet", q="jazz").execute() == first
+    assert cache.stats == ResponseCache.Stats(hits=0, revalidated=1, misses=1)
+
+
+def test_stats_are_counted_across_threads(cache):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: [cache.count("hits") for _ in range(1_000)], range(8)))
+    assert cache.stats == ResponseCache.Stats(hits=8_000, revalidated=0, misses=0)
+
+
+def test_old_entries_are_deleted_when_a_response_is_stored(cache, clock):
+    cache.put("old", "etag", b"{}")
+    clock.now += (cache.max_age - timedelta(hours=1)).total_seconds()
+    cache.put("new", "etag", b"{}")
+    assert cache.get("old") is not None
+
+    clock.now += timedelta(hours=2).total_seconds()
+    cache.put("newer", "etag", b"{}")
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+
+
+def test_errors_are_not_cached(server, cache):
+    youtube = resource(server, cache)
+    for _ in range(2):
+        with raises(HttpError):
+            youtube.commentThreads().list(part="snippet", videoId=next(iter(server.comments_disabled))).execute()
+    assert cache.stats == ResponseCache.Stats(hits=0, revalidated=0, misses=2)
@@ -1,8 +1,17 @@
-from pytest import fail, mark
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from isodate import parse_duration
+from pytest import fail, fixture, mark, raises
 
 from src.models import Video
 from src.tests.conftest import VIDEO_DATA
 from src.youtube import OfficialYouTubeService
+from src.youtube.fake_server import FakeYouTubeServer
+from src.youtube.http_cache import ResponseCache
+from src.youtube.quota import QuotaScheduler
 
 
 @mark.parametrize(
@@ -67,3 +76,199 @@ def test_from_data_raises(data: dict, errors: str):
         fail("Should not be able to make a video with bad data.")
     except OfficialYouTubeService.VideoParseError as e:
         assert errors == e.errors
+
+
+def test_resource_is_built_once_per_api_key_priority_and_root_url():
+    first = OfficialYouTubeService("resource-test-key", origin=Video.Origin.APP)
+    second = OfficialYouTubeService("resource-test-key", origin=Video.Origin.APP)
+    scraper = OfficialYouTubeService("resource-test-key", origin=Video.Origin.SCRAPED)
+    other = OfficialYouTubeService("other-resource-test-key", origin=Video.Origin.APP)
+    local = OfficialYouTubeService("resource-test-key", origin=Video.Origin.APP, root_url="http://127.0.0.1:8089/")
+    assert first.youtube is second.youtube
+    assert first.youtube is not scraper.youtube
+    assert first.youtube is not other.youtube
+    assert first.youtube is not local.youtube
+
+
+def test_requests_use_the_calling_threads_http():
+    youtube = OfficialYouTubeService("resource-test-key", origin=Video.Origin.APP).youtube
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        barrier = Barrier(2)
+
+        def request_http():
+            # Make sure both requests are built on different threads
+            barrier.wait()
+            return youtube.videos().list(part="snippet", id="x").http
+
+        first, second = [f.result() for f in [pool.submit(request_http), pool.submit(request_http)]]
+    assert first is not second
+    assert youtube.videos().list(part="snippet", id="x").http is youtube.videos().list(part="snippet", id="y").http
+
+
+def test_requests_use_the_current_default_scheduler_and_cache(monkeypatch):
+    youtube = OfficialYouTubeService("resource-test-key", origin=Video.Origin.APP).youtube
+    before = youtube.videos().list(part="snippet", id="x").http
+    assert before.http.scheduler is QuotaScheduler.default()
+    assert before.cache is ResponseCache.default()
+
+    monkeypatch.setattr(QuotaScheduler, "_default", None)
+    monkeypatch.setattr(ResponseCache, "_default", None)
+    after = youtube.videos().list(part="snippet", id="x").http
+    assert after is not before
+    assert after.http.scheduler is QuotaScheduler.default()
+    assert after.cache is ResponseCache.default()
+
+
+@fixture(scope="module")
+def fake_youtube():
+    """
+    A service whose requests go to the fake API server.
+    """
+    with FakeYouTubeServer() as server:
+        youtube = OfficialYouTubeService("fake-key", origin=Video.Origin.APP)
+        youtube.youtube = build(
+            "youtube",
+            "v3",
+            developerKey="fake-key",
+            static_discovery=True,
+            client_options={"api_endpoint": server.root_url},
+        )
+        yield server, youtube
+
+
+def expected_comment_ids(server: FakeYouTubeServer, video_id: str, fetch_replies: bool) -> list[str]:
+    ids = []
+    for thread in server.comment_threads[video_id]:
+        ids.append(thread["id"])
+        if fetch_replies:
+            ids.extend(x["id"] for x in server.comment_replies.get(thread["id"], []))
+        else:
+            ids.extend(x["id"] for x in thread.get("replies", {}).get("comments", []))
+    return ids
+
+
+@mark.parametrize(
+    "fetch_replies, page_size",
+    [
+        # Only the replies included with each thread
+        (False, 100),
+        # Every reply, fetched through the comments API
+        (True, 100),
+        # Small pages, so that page tokens are followed for both threads and replies
+        (True, 2),
+    ],
+)
+def test_iter_comments_streams_every_comment(fake_youtube, fetch_replies, page_size):
+    server, youtube = fake_youtube
+    video_id = "nBIKpi99lSi"
+    comments = list(
+        youtube.iter_comments(video_id, max_comments=1000, fetch_replies=fetch_replies, page_size=page_size)
+    )
+    assert [c.id for c in comments] == expected_comment_ids(server, video_id, fetch_replies)
+    assert all(c.is_reply == (c.parent_comment_id is not None) for c in comments)
+    assert all(c.video_id == video_id for c in comments)
+
+
+def test_iter_comments_stops_at_the_comment_budget(fake_youtube):
+    server, youtube = fake_youtube
+    video_id = "nBIKpi99lSi"
+    del server.requests[:]
+    comments = list(youtube.iter_comments(video_id, max_comments=9, fetch_replies=True, page_size=2))
+    assert [c.id for c in comments] == expected_comment_ids(server, video_id, fetch_replies=True)[:9]
+    # 4 pages of threads, then one page with the last thread's first reply
+    assert [(endpoint, params["maxResults"]) for endpoint, params in server.requests] == [
+        ("commentThreads", "2"),
+        ("commentThreads", "2"),
+        ("commentThreads", "2"),
+        ("commentThreads", "2"),
+        ("comments", "1"),
+    ]
+
+
+def test_iter_comments_stops_at_the_deadline(fake_youtube):
+    _, youtube = fake_youtube
+    assert list(youtube.iter_comments("nBIKpi99lSi", max_comments=100, timeout=0)) == []
+
+
+def test_iter_comments_raises_api_errors(fake_youtube):
+    server, youtube = fake_youtube
+    with raises(HttpError):
+        list(youtube.iter_comments(next(iter(server.comments_disabled))))
+
+
+def test_get_comments_pages_up_to_its_budget(fake_youtube):
+    server, youtube = fake_youtube
+    video_id = "nBIKpi99lSi"
+    assert [c.id for c in youtube.get_comments(video_id, max_results=5)] == expected_comment_ids(
+        server, video_id, fetch_replies=False
+    )[:5]
+    assert youtube.get_comments(next(iter(server.comments_disabled)), max_results=100) == []
+
+
+def test_fast_path_parses_like_the_template_path(fake_youtube):
+    server, youtube = fake_youtube
+    for data in list(server.videos.values()) + [VIDEO_DATA]:
+        assert youtube._video_from_data(data).__data__ == youtube._video_from_template(data).__data__
+
+    video = Video(id="EqV8ib8HDy8")
+    for thread in server.comment_threads[video.id]:
+        for data in [thread["snippet"]["topLevelComment"]] + thread.get("replies", {}).get("comments", []):
+            comment = OfficialYouTubeService._comment_from_data(data, video)
+            snippet = data["snippet"]
+            assert (comment.id, comment.text, comment.likes) == (
+                data["id"],
+                snippet["textOriginal"],
+                snippet["likeCount"],
+            )
+            assert (comment.is_reply, comment.parent_comment_id) == ("parentId" in snippet, snippet.get("parentId"))
+
+
+@mark.parametrize(
+    "snippet, errors",
+    [
+        # Missing text and author
+        (
+            {"videoId": "x", "publishedAt": "2024-05-01T12:00:00Z"},
+            [
+                "Path snippet.textOriginal cannot be None!",
+                "Path snippet.authorDisplayName cannot be None!",
+                "Path snippet.authorChannelId.value cannot be None!",
+            ],
+        ),
+        # Explicitly null parent
+        (
+            {
+                "textOriginal": "hi",
+                "authorDisplayName": "@user",
+                "authorChannelId": {"value": "UC1"},
+                "videoId": "x",
+                "publishedAt": "2024-05-01T12:00:00Z",
+                "parentId": None,
+            },
+            ["Path snippet.parentId cannot be None!"],
+        ),
+    ],
+)
+def test_comment_from_data_raises(snippet, errors):
+    with raises(OfficialYouTubeService.ParseError) as e:
+        OfficialYouTubeService._comment_from_data({"id": "c1", "snippet": snippet}, Video(id="x"))
+    assert e.value.errors == errors
+    assert '"id": "c1"' in e.value.raw_data
+
+
+@mark.parametrize(
+    "duration",
+    [
+        "PT4M13S",
+        "PT1H",
+        "PT1H0M5S",
+        "P1DT2H3M4S",
+        "P2D",
+        "PT0S",
+        # Not the usual form, so parsed by isodate
+        "P1W",
+        "PT1.5S",
+    ],
+)
+def test_duration_seconds(duration):
+    assert OfficialYouTubeService._duration_seconds(duration) == int(parse_duration(duration).total_seconds())
@@ -0,0 +1,87 @@
+import json
+from typing import Optional
+
+from pytest import mark, raises
+
+from src.models import Video
+from src.youtube import OfficialYouTubeService
+from src.youtube.fake_server import FakeYouTubeServer, Selection, parse_fields, project
+
+API = OfficialYouTubeService.API
+
+
+def template_paths(template: dict, prefix=()) -> list[tuple[str, ...]]:
+    paths = []
+    for key, value in template.items():
+        paths.extend(template_paths(value, prefix + (key,)) if isinstance(value, dict) else [prefix + (key,)])
+    return paths
+
+
+def covers(selection: Optional[Selection], path: tuple[str, ...]) -> bool:
+    for key in path:
+        if selection is None:
+            return True
+        if key not in selection:
+            return False
+        selection = selection[key]
+    return True
+
+
+@mark.parametrize(
+    "fields, expected",
+    [
+        ("nextPageToken", {"nextPageToken": None}),
+        ("items/id", {"items": {"id": None}}),
+        ("items(id/videoId),nextPageToken", {"items": {"id": {"videoId": None}}, "nextPageToken": None}),
+        ("a(b(c,d/e),f),g", {"a": {"b": {"c": None, "d": {"e": None}}, "f": None}, "g": None}),
+        # Paths with a shared prefix are merged
+        ("a/b,a/c", {"a": {"b": None, "c": None}}),
+    ],
+)
+def test_parse_fields(fields, expected):
+    assert parse_fields(fields) == expected
+
+
+@mark.parametrize("fields", ["", "items(", "items(id", "items)", "a,,b", "a/"])
+def test_parse_fields_rejects_bad_syntax(fields):
+    with raises(ValueError):
+        parse_fields(fields)
+
+
+def test_project():
+    data = {"items": [{"id": 1, "snippet": {"title": "a", "tags": ["x"]}}, {"id": 2}], "etag": "x"}
+    assert project(data, parse_fields("items(snippet/title)")) == {"items": [{"snippet": {"title": "a"}}, {}]}
+
+
+def test_video_projection_covers_the_video_template():
+    items = parse_fields(API.Videos.FIELDS)["items"]
+    for path in template_paths(OfficialYouTubeService.VIDEO_TEMPLATE):
+        # The label is ours, not youtube's
+        if path != ("label",):
+            assert covers(items, path), path
+            assert path[0] == "id" or path[0] in API.Videos.PART.split(","), path
+
+
+def test_comment_projections_cover_the_comment_template():
+    threads = parse_fields(API.CommentThreads.FIELDS)["items"]
+    replies = parse_fields(API.Comments.FIELDS)["items"]
+    assert covers(threads, ("id",))
+    assert covers(threads, ("snippet", "totalReplyCount"))
+    for path in template_paths(OfficialYouTubeService.COMMENT_TEMPLATE):
+        assert covers(threads, ("snippet", "topLevelComment") + path), path
+        assert covers(threads, ("replies", "comments") + path), path
+        assert covers(replies, path), path
+
+
+def test_projected_videos_parse_the_same_and_are_smaller():
+    youtube = OfficialYouTubeService("fake-key", origin=Video.Origin.APP)
+    with FakeYouTubeServer() as server:
+        video_ids = list(server.videos)
+        full = server.handle("/youtube/v3/videos", {"key": "k", "part": API.Videos.PART, "id": ",".join(video_ids)})[1]
+        projected = server.handle(
+            "/youtube/v3/videos",
+            {"key": "k", "part": API.Videos.PART, "id": ",".join(video_ids), "fields": API.Videos.FIELDS},
+        )[1]
+    assert len(json.dumps(projected)) < len(json.dumps(full)) / 2
+    for full_item, projected_item in zip(full["items"], projected["items"]):
+        assert youtube._video_from_data(projected_item).__data__ == youtube._video_from_data(full_item).__data__
@@ -0,0 +1,205 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from googleapiclient.discovery import build
+from googleapiclient.http import build_http
+from pytest import fixture, mark, raises
+
+from src.models import Video
+from src.youtube.async_service import AsyncOfficialYouTubeService
+from src.youtube.fake_server import FakeYouTubeServer
+from src.youtube.quota import QUOTA_TIMEZONE, KeyPool, KeyPoolHttp, QuotaHttp, QuotaScheduler
+
+INTERACTIVE = QuotaScheduler.Priority.INTERACTIVE
+BACKGROUND = QuotaScheduler.Priority.BACKGROUND
+
+
+class Clock:
+
+    def __init__(self, now: datetime):
+        self.now = now.timestamp()
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@fixture
+def clock():
+    return Clock(datetime(2025, 6, 1, 12, tzinfo=QUOTA_TIMEZONE))
+
+
+def scheduler(clock, daily_budget=1_000, interactive_reserve=200, rate=10.0, burst=300.0) -> QuotaScheduler:
+    return QuotaScheduler(daily_budget, interactive_reserve, rate, burst, clock=clock)
+
+
+@mark.parametrize(
+    "uri, endpoint, cost",
+    [
+        ("https://www.googleapis.com/youtube/v3/search?q=lofi&key=abc", "search", 100),
+        ("https://www.googleapis.com/youtube/v3/videos?id=x", "videos", 1),
+        ("http://127.0.0.1:8080/youtube/v3/commentThreads", "commentThreads", 1),
+    ],
+)
+def test_cost(uri, endpoint, cost):
+    assert QuotaScheduler.endpoint(uri) == endpoint
+    assert QuotaScheduler.cost(endpoint) == cost
+
+
+def test_background_requests_leave_the_interactive_reserve(clock):
+    quota = scheduler(clock, rate=1_000.0, burst=1_000.0)
+    for _ in range(8):
+        quota.acquire("search", BACKGROUND)
+        clock.now += 1
+    with raises(QuotaScheduler.QuotaExhausted) as e:
+        quota.acquire("videos", BACKGROUND)
+    assert e.value.remaining == 0
+
+    # Interactive requests can still spend the reserve
+    quota.acquire("search", INTERACTIVE)
+    quota.acquire("search", INTERACTIVE)
+    with raises(QuotaScheduler.QuotaExhausted):
+        quota.acquire("videos", INTERACTIVE)
+
+    snapshot = quota.snapshot()
+    assert (snapshot.used, snapshot.remaining) == (1_000, 0)
+    assert snapshot.used_by_priority == {"background": 800, "interactive": 200}
+    assert snapshot.rejected_by_priority == {"background": 1, "interactive": 1}
+
+
+def test_budget_resets_at_pacific_midnight(clock):
+    clock.now = datetime(2025, 6, 1, 23, 59, tzinfo=QUOTA_TIMEZONE).timestamp()
+    quota = scheduler(clock, daily_budget=200, burst=300.0)
+    quota.acquire("search", INTERACTIVE)
+    quota.acquire("search", INTERACTIVE)
+    with raises(QuotaScheduler.QuotaExhausted):
+        quota.acquire("search", INTERACTIVE)
+
+    clock.now = datetime(2025, 6, 2, 0, 1, tzinfo=QUOTA_TIMEZONE).timestamp()
+    quota.acquire("search", INTERACTIVE)
+    assert quota.snapshot().day == datetime(2025, 6, 2).date()
+    assert quota.snapshot().used == 100
+
+
+def test_usage_is_shared_between_processes_and_restarts(clock, tmp_path):
+    path = str(tmp_path / "usage.sqlite3")
+    app = QuotaScheduler(1_000, 200, 1_000.0, 1_000.0, clock=clock, path=path)
+    scraper = QuotaScheduler(1_000, 200, 1_000.0, 1_000.0, clock=clock, path=path)
+    for _ in range(3):
+        app.acquire("search", INTERACTIVE)
+    for _ in range(5):
+        scraper.acquire("search", BACKGROUND)
+
+    # The scraper can't spend the reserve that the app's searches didn't leave
+    with raises(QuotaScheduler.QuotaExhausted):
+        scraper.acquire("videos", BACKGROUND)
+
+    # A restarted app doesn't get the full budget back
+    restarted = QuotaScheduler(1_000, 200, 1_000.0, 1_000.0, clock=clock, path=path)
+    restarted.acquire("search", INTERACTIVE)
+    restarted.acquire("search", INTERACTIVE)
+    with raises(QuotaScheduler.QuotaExhausted):
+        restarted.acquire("search", INTERACTIVE)
+    snapshot = restarted.snapshot()
+    assert (snapshot.used, snapshot.remaining) == (1_000, 0)
+    assert snapshot.used_by_priority == {"interactive": 500, "background": 500}
+    assert snapshot.rejected_by_priority == {"background": 1, "interactive": 1}
+
+
+def test_token_bucket_prefers_interactive_requests(clock):
+    quota = scheduler(clock, rate=10.0, burst=300.0)
+    assert quota._try_acquire("search", INTERACTIVE) == 0
+    assert quota._try_acquire("search", INTERACTIVE) == 0
+
+    # 100 tokens are left: enough for an interactive search, but background requests must leave that much spare
+    assert quota._try_acquire("videos", BACKGROUND) == 0.1
+    assert quota._try_acquire("search", INTERACTIVE) == 0
+    assert quota._try_acquire("search", INTERACTIVE) == 10
+
+    # The bucket refills at 10 units per second
+    clock.now += 20
+    assert quota._try_acquire("videos", BACKGROUND) == 0
+    assert quota.snapshot().tokens == 199
+
+
+def test_quota_http_acquires_before_each_request(clock):
+    quota = scheduler(clock)
+    with FakeYouTubeServer() as server:
+        youtube = build(
+            "youtube",
+            "v3",
+            developerKey="fake-key",
+            http=QuotaHttp(build_http(), quota, BACKGROUND),
+            static_discovery=True,
+            client_options={"api_endpoint": server.root_url},
+        )
+        youtube.search().list(part="snippet", q="jazz").execute()
+        youtube.videos().list(part="snippet", id=next(iter(server.videos))).execute()
+    assert quota.snapshot().used_by_priority == {"background": 101}
+
+
+def remaining(pool: KeyPool) -> list[int]:
+    return [usage.remaining for usage in pool.snapshot()]
+
+
+def test_key_pool_spreads_requests_by_remaining_quota(clock):
+    pool = KeyPool(["a", "b", "c"], "", daily_quota=300, clock=clock)
+    assert [pool.acquire("search") for _ in range(3)] == ["a", "b", "c"]
+    assert pool.acquire("videos") == "a"
+    assert pool.acquire("search") == "b"
+    assert remaining(pool) == [199, 100, 200]
+    assert pool.acquire("search", exclude=["c"]) == "a"
+    assert pool.acquire("search", exclude=["c"]) == "b"
+    with raises(QuotaScheduler.QuotaExhausted):
+        pool.acquire("search", exclude=["c"])
+
+
+def test_key_pool_usage_persists_by_key_hash(clock, tmp_path):
+    path = str(tmp_path / "keys.sqlite3")
+    pool = KeyPool(["secret-a", "secret-b"], path, daily_quota=1_000, clock=clock)
+    pool.acquire("search")
+    pool.exhausted("secret-b")
+    assert remaining(KeyPool(["secret-a", "secret-b"], path, daily_quota=1_000, clock=clock)) == [900, 0]
+    assert b"secret" not in (tmp_path / "keys.sqlite3").read_bytes()
+
+    # Every key's quota is back the next day, Pacific Time
+    clock.now += timedelta(hours=12).total_seconds()
+    assert remaining(KeyPool(["secret-a", "secret-b"], path, daily_quota=1_000, clock=clock)) == [1_000, 1_000]
+
+
+def test_key_pool_http_fails_over_when_the_api_says_quota_is_exceeded(clock):
+    # The API has less quota left for the first key than the pool knows of, e.g. because of usage from elsewhere
+    pool = KeyPool(["a", "b"], "", daily_quota=1_000, clock=clock)
+    with FakeYouTubeServer(daily_quota=250) as server:
+        server.quota_used["a"] = 200
+        youtube = build(
+            "youtube",
+            "v3",
+            developerKey="unused-key",
+            http=KeyPoolHttp(build_http(), pool),
+            static_discovery=True,
+            client_options={"api_endpoint": server.root_url},
+        )
+        for _ in range(2):
+            youtube.search().list(part="snippet", q="jazz").execute()
+        assert server.quota_used == {"a": 200, "b": 200}
+        assert [usage.exhausted for usage in pool.snapshot()] == [True, False]
+
+        # Once every key is out of quota, nothing is sent
+        with raises(QuotaScheduler.QuotaExhausted):
+            youtube.search().list(part="snippet", q="jazz").execute()
+    assert [usage.exhausted for usage in pool.snapshot()] == [True, True]
+
+
+def test_async_service_fails_over_to_other_keys(clock):
+    pool = KeyPool(["a", "b"], "", daily_quota=1_000, clock=clock)
+
+    async def search(server):
+        async with AsyncOfficialYouTubeService(pool, Video.Origin.APP, base_url=server.base_url) as youtube:
+            for _ in range(2):
+                await youtube.search("jazz")
+
+    with FakeYouTubeServer(daily_quota=250) as server:
+        server.quota_used["a"] = 200
+        asyncio.run(search(server))
+    assert server.quota_used == {"a": 200, "b": 200}
+    assert [usage.exhausted for usage in pool.snapshot()] == [True, False]
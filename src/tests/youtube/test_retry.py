@@ -0,0 +1,124 @@
+import asyncio
+import json
+from random import Random
+
+import httplib2
+from googleapiclient.errors import HttpError
+from pytest import mark, raises
+
+from src.youtube.async_service import AsyncOfficialYouTubeService
+from src.youtube.retry import RetryPolicy
+
+
+def http_error(status: int, reason=None) -> HttpError:
+    if reason is None:
+        content = b"<html>Bad Gateway</html>"
+    else:
+        content = json.dumps({"error": {"code": status, "message": reason, "errors": [{"reason": reason}]}}).encode()
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+class Flaky:
+    """
+    Raises each of `errors` in turn, then returns "ok".
+    """
+
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self) -> str:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def policy(max_attempts=5) -> tuple[RetryPolicy, list[float]]:
+    """
+    A retry policy that records its sleeps instead of sleeping.
+    """
+    sleeps: list[float] = []
+    retry = RetryPolicy(max_attempts=max_attempts, base_delay=1.0, max_delay=4.0, rng=Random(0), sleep=sleeps.append)
+    return retry, sleeps
+
+
+@mark.parametrize(
+    "error, expected",
+    [
+        # Transient googleapi reasons
+        (http_error(500, "backendError"), ("backendError", True)),
+        (http_error(403, "rateLimitExceeded"), ("rateLimitExceeded", True)),
+        # Permanent googleapi reasons, even though some are 403s like rate limits
+        (http_error(403, "quotaExceeded"), ("quotaExceeded", False)),
+        (http_error(403, "commentsDisabled"), ("commentsDisabled", False)),
+        (http_error(404, "videoNotFound"), ("videoNotFound", False)),
+        # Without a reason, the status decides
+        (http_error(502), ("http502", True)),
+        (http_error(400), ("http400", False)),
+        (http_error(503, "someNewReason"), ("someNewReason", True)),
+        # Errors from the async client
+        (AsyncOfficialYouTubeService.ApiError(503, "backendError", ""), ("backendError", True)),
+        (AsyncOfficialYouTubeService.ApiError(403, "forbidden", ""), ("forbidden", False)),
+        # Network errors
+        (httplib2.ServerNotFoundError("Unable to find the server"), ("transport", True)),
+        (ConnectionResetError(), ("transport", True)),
+        # Anything else isn't an API error
+        (ValueError("bug"), None),
+    ],
+)
+def test_classify(error, expected):
+    assert RetryPolicy.classify(error) == expected
+
+
+def test_transient_errors_are_retried_with_capped_jittered_backoff():
+    retry, sleeps = policy()
+    flaky = Flaky(http_error(503, "backendError"), http_error(500), http_error(503, "backendError"), http_error(502))
+    assert retry.call(flaky) == "ok"
+    assert flaky.calls == 5
+    # Uniformly random up to 1, 2, 4, then capped at 4 seconds
+    rng = Random(0)
+    assert sleeps == [rng.uniform(0, cap) for cap in [1.0, 2.0, 4.0, 4.0]]
+    assert retry.snapshot() == {
+        "retried": {"backendError": 2, "http500": 1, "http502": 1},
+        "exhausted": {},
+        "permanent": {},
+    }
+
+
+def test_permanent_errors_are_raised_at_once():
+    retry, sleeps = policy()
+    flaky = Flaky(http_error(403, "quotaExceeded"))
+    with raises(HttpError):
+        retry.call(flaky)
+    assert flaky.calls == 1
+    assert sleeps == []
+    assert retry.snapshot()["permanent"] == {"quotaExceeded": 1}
+
+
+def test_other_errors_are_raised_uncounted():
+    retry, sleeps = policy()
+    with raises(ValueError):
+        retry.call(Flaky(ValueError("bug")))
+    assert retry.snapshot() == {"retried": {}, "exhausted": {}, "permanent": {}}
+
+
+def test_gives_up_after_max_attempts():
+    retry, _ = policy(max_attempts=3)
+    flaky = Flaky(*[http_error(503, "backendError")] * 5)
+    with raises(HttpError):
+        retry.call(flaky)
+    assert flaky.calls == 3
+    assert retry.snapshot() == {"retried": {"backendError": 2}, "exhausted": {"backendError": 1}, "permanent": {}}
+
+
+def test_call_async_retries_coroutines():
+    retry = RetryPolicy(base_delay=0.001, max_delay=0.001)
+    flaky = Flaky(AsyncOfficialYouTubeService.ApiError(503, "backendError", ""))
+
+    async def call():
+        return flaky()
+
+    assert asyncio.run(retry.call_async(call)) == "ok"
+    assert flaky.calls == 2
+    assert retry.snapshot()["retried"] == {"backendError": 1}
@@ -1,12 +1,11 @@
-from dataclasses import asdict
 from logging import getLogger
 from time import perf_counter
-from typing import Callable
+from typing import Callable, Optional
 
 import pandas as pd
 from lightgbm import Dataset, plot_importance, train
 from matplotlib import pyplot
-from numpy import array, int8
+from numpy import array, float16, int8, savez_compressed
 from pandas import DataFrame, read_csv
 from sklearn.metrics import (
     accuracy_score,
@@ -17,31 +16,39 @@ from sklearn.metrics import (
 from sklearn.model_selection import train_test_split
 
 from src.embeddings import VideoDescriptionEmbedding
-from src.feature_extraction import extract
-from src.models import Comment, Video
+from src.feature_store import FEATURE_NAMES, comment_embeddings, refresh, store_comment_embeddings
+from src.models import Video
 
 logger = getLogger(__name__)
 
 
-def process_videos(videos: list[Video], filename: str) -> None:
+def process_videos(videos: list[Video], filename: str, embeddings_filename: Optional[str] = None) -> None:
+    """
+    Write the features of each video to a CSV file. Comment embeddings are only exported when `embeddings_filename`
+    is given, as a .npz archive holding one float16 (num_comments, dim) array per video ID.
+    """
 
-    processed_videos = []
+    # Only videos whose comments changed since their features were stored are extracted again
+    features = refresh(videos)
+    processed_videos = [
+        dict(zip(FEATURE_NAMES, features[str(video.id)].features)) | {"label": video.label, "video_id": str(video.id)}
+        for video in videos
+    ]
 
-    for i, video in enumerate(videos):
-        print(f"Processing video {i} of {len(videos)}...")
-        comments = Comment.select().where(Comment.video == video.id)
-        features = extract(video, comments)
-        video_data = (
-            asdict(features.description)
-            | asdict(features.comments)
-            | {"label": video.label, "video_id": str(video.id)}
-        )
-        processed_videos.append(video_data)
+    embeddings = {}
+    if embeddings_filename is not None:
+        # Only comments without a stored embedding are embedded, and the rest are read as raw bytes
+        store_comment_embeddings(videos)
+        stored = comment_embeddings(videos)
+        embeddings = {str(video.id): stored.of(str(video.id)).astype(float16) for video in videos}
 
     df = DataFrame(processed_videos)
     with open(filename, "w") as file:
         file.write(df.to_csv())
 
+    if embeddings_filename is not None:
+        savez_compressed(embeddings_filename, **embeddings)
+
 
 def train_model():
     DATA_PATH = "joey_data.csv"
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Any, List, Optional, Tuple
 
 
 def fill_from(source: dict, template: dict) -> dict:
@@ -44,4 +44,50 @@ def find_none_paths(obj: dict, _path: str = "") -> List[str]:
     return paths
 
 
+# Stands in for a dict that is missing from the data, so that its leaves get their template defaults
+_EMPTY: dict = {}
+
+
+class CompiledTemplate:
+    """
+    A template for `fill_from`, compiled into a tree of (key, default, subtree) nodes, so that the leaf values can be
+    read straight out of data. `extract` gives the same values as `fill_from` followed by `find_none_paths`, without
+    building the filled copy, and only says whether any value is None. Use the slow path to find out which.
+    """
+
+    Node = List[Tuple[str, Any, Optional[list]]]
+
+    def __init__(self, template: dict):
+        self.template = template
+        self.tree = self._compile(template)
+
+    @classmethod
+    def _compile(cls, template: dict) -> Node:
+        return [
+            (key, None, cls._compile(value)) if isinstance(value, dict) else (key, value, None)
+            for key, value in template.items()
+        ]
+
+    @classmethod
+    def _extract(cls, tree: Node, data: dict, values: List[Any]) -> bool:
+        for key, default, subtree in tree:
+            if subtree is None:
+                value = data.get(key, default)
+                if value is None or (isinstance(value, (dict, list)) and find_none_paths(value)):
+                    return False
+                values.append(value)
+            else:
+                node = data.get(key, _EMPTY)
+                if not cls._extract(subtree, node if isinstance(node, dict) else _EMPTY, values):
+                    return False
+        return True
+
+    def extract(self, data: dict) -> Optional[List[Any]]:
+        """
+        The value of each leaf in template order, or None if any of them is (or contains) None.
+        """
+        values: List[Any] = []
+        return values if self._extract(self.tree, data, values) else None
+
+
 from src.youtube.official_service import OfficialYouTubeService
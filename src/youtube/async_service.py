@@ -0,0 +1,234 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+from urllib.parse import urljoin
+
+import httpx
+
+from src.models import Comment, Video
+from src.settings import YOUTUBE_API_ROOT_URL
+
+from .official_service import YouTubeServiceBase
+from .quota import KeyPool, QuotaScheduler
+from .retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncOfficialYouTubeService(YouTubeServiceBase):
+    """
+    The same surface as `OfficialYouTubeService`, as coroutine methods that share one pooled HTTP/2 client, so that
+    many requests (e.g., comment fetches for a whole page of search results) can run on one event loop. It shares
+    the templates and parsing of `YouTubeServiceBase`, not the sync methods, so it can't be passed where a sync
+    service is expected. Close it with `aclose()`, or use it as an async context manager.
+    """
+
+    DEFAULT_BASE_URL = urljoin(YOUTUBE_API_ROOT_URL or "https://www.googleapis.com/", "youtube/v3/")
+
+    class ApiError(YouTubeServiceBase.YoutubeError):
+        """
+        The API responded with an error status.
+        """
+
+        def __init__(self, status: int, reason: Optional[str], message: str):
+            self.status = status
+            self.reason = reason
+            self.message = message
+            super().__init__(f"{status} {reason}: {message}")
+
+        @classmethod
+        def from_response(cls, response: httpx.Response) -> "AsyncOfficialYouTubeService.ApiError":
+            try:
+                error = response.json()["error"]
+                reason = error["errors"][0]["reason"] if error.get("errors") else None
+                return cls(response.status_code, reason, error.get("message", ""))
+            except (ValueError, KeyError, TypeError):
+                return cls(response.status_code, None, response.text)
+
+    def __init__(
+        self,
+        api_key: Union[str, KeyPool],
+        origin: Video.Origin,
+        base_url: str = DEFAULT_BASE_URL,
+        max_connections: int = 20,
+        timeout: float = 30.0,
+        scheduler: Optional[QuotaScheduler] = None,
+        retry: Optional[RetryPolicy] = None,
+    ):
+        self.api_key = api_key
+        self.origin = origin
+        self.scheduler = QuotaScheduler.default() if scheduler is None else scheduler
+        self.retry = RetryPolicy.default() if retry is None else retry
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self) -> "AsyncOfficialYouTubeService":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def _request(self, endpoint: str, query: Dict[str, Any]) -> dict:
+        await self.scheduler.acquire_async(endpoint, self.priority(self.origin))
+        if not isinstance(self.api_key, KeyPool):
+            response = await self.client.get(endpoint, params=query | {"key": self.api_key})
+        else:
+            # Send the request with another key while the API says they're out of quota
+            tried: List[str] = []
+            while True:
+                key = self.api_key.acquire(endpoint, exclude=tried)
+                response = await self.client.get(endpoint, params=query | {"key": key})
+                if not self.api_key.is_quota_exceeded(response.status_code, response.content):
+                    break
+                self.api_key.exhausted(key)
+                tried.append(key)
+                if len(tried) == len(self.api_key.keys):
+                    break
+        if response.is_error:
+            raise self.ApiError.from_response(response)
+        return response.json()
+
+    async def _get(self, endpoint: str, **params: Any) -> dict:
+        """
+        GET an API endpoint, dropping any None parameters. Transient errors are retried, and `ApiError` is raised on
+        any other error response.
+        """
+        query: Dict[str, Any] = {k: v for k, v in params.items() if v is not None}
+        return await self.retry.call_async(self._request, endpoint, query)
+
+    async def search(
+        self,
+        query: str,
+        max_results=20,
+        page_token: Optional[str] = None,
+    ) -> YouTubeServiceBase.API.Search.Response:
+        """
+        Search youtube and get a paginated list of video IDs.
+        """
+        if max_results > 50 or max_results < 0:
+            raise ValueError(f"max_results must be in [0, 50]")
+
+        response = await self._get(
+            "search",
+            q=query,
+            type="video",
+            part=self.API.Search.PART,
+            maxResults=max_results,
+            fields=self.API.Search.FIELDS,
+            pageToken=page_token,
+        )
+        video_ids = [item["id"]["videoId"] for item in response.get("items", []) if "videoId" in item.get("id", {})]
+        return self.API.Search.Response(video_ids, response.get("nextPageToken"))
+
+    async def _video_details(self, video_ids: List[str]) -> List[Video]:
+        """
+        Fetch full video details, requesting every batch of 50 IDs at once.
+        """
+        batches = [video_ids[i : i + 50] for i in range(0, len(video_ids), 50)]
+        responses = await asyncio.gather(
+            *(
+                self._get("videos", part=self.API.Videos.PART, id=",".join(b), fields=self.API.Videos.FIELDS)
+                for b in batches
+            )
+        )
+        return [video for response in responses for video in self._videos_from_videos_response(response)]
+
+    async def videos(
+        self,
+        query: str,
+        max_results: int = 20,
+        page_token: Optional[str] = None,
+    ) -> YouTubeServiceBase.API.Videos.Response:
+        """
+        Search youtube and get a paginated list of videos.
+        """
+        search_response = await self.search(query, max_results, page_token)
+        videos = await self._video_details(search_response.video_ids)
+        return self.API.Videos.Response(videos, search_response.next_page_token)
+
+    async def get_channel_videos(self, channel_id: str, max_videos: int = 10) -> List[Video]:
+        """
+        Get any uploaded videos from a channel.
+        """
+
+        # 1. Get uploads playlist
+        response = await self._get(
+            "channels", part=self.API.Channels.PART, id=channel_id, fields=self.API.Channels.FIELDS
+        )
+        if "items" not in response:
+            raise self.ChannelNotFound()
+        uploads_playlist_id = response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+
+        # 2. Collect video IDs from the playlist
+        video_ids: List[str] = []
+        next_page_token = None
+        while len(video_ids) < max_videos:
+            try:
+                response = await self._get(
+                    "playlistItems",
+                    part=self.API.PlaylistItems.PART,
+                    playlistId=uploads_playlist_id,
+                    maxResults=min(max_videos, 50),  # playlistItems max is 50 per page
+                    pageToken=next_page_token,
+                    fields=self.API.PlaylistItems.FIELDS,
+                )
+            except self.ApiError as e:
+                if e.reason == "playlistNotFound":
+                    raise self.PlaylistNotFound() from e
+                raise e
+
+            video_ids.extend(item["snippet"]["resourceId"]["videoId"] for item in response.get("items", []))
+            next_page_token = response.get("nextPageToken")
+            if not next_page_token:
+                break
+
+        # 3. Fetch full video details
+        videos = await self._video_details(video_ids[:max_videos])
+        return videos[:max_videos]
+
+    async def iter_comments(
+        self,
+        video_id: str,
+        max_comments: int = 100,
+        timeout: Optional[float] = None,
+        fetch_replies: bool = False,
+        page_size: int = 100,
+    ) -> AsyncIterator[Comment]:
+        """
+        Stream comments from a video page by page, like `OfficialYouTubeService.iter_comments`.
+        """
+        pages = self._comment_pages(video_id, max_comments, timeout, fetch_replies, page_size)
+        step = next(pages, None)
+        while step is not None:
+            if isinstance(step, Comment):
+                yield step
+                step = next(pages, None)
+            else:
+                endpoint, params = step
+                response = await self._get(endpoint, **params)
+                try:
+                    step = pages.send(response)
+                except StopIteration:
+                    step = None
+
+    async def get_comments(self, video_id: str, max_results: int, timeout: Optional[float] = None) -> List[Comment]:
+        """
+        Get up to `max_results` comments from a video, like `OfficialYouTubeService.get_comments`.
+        """
+        try:
+            return [
+                comment async for comment in self.iter_comments(video_id, max_comments=max_results, timeout=timeout)
+            ]
+        except self.ApiError as e:
+            if e.reason == "commentsDisabled":
+                # It's expected that we will sometimes hit videos with comments disabled...
+                logger.info(f"Could not fetch comments for video {video_id}, the video has comments disabled.")
+                return []
+            raise e
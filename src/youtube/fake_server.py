@@ -0,0 +1,498 @@
+"""
+A local stand-in for the YouTube Data API v3, so that the youtube services can be exercised without network access.
+It serves a fixture corpus from JSON files, and mimics the parts of the real API that our services depend on:
+page tokens, `maxResults`, `part` and `fields` projections, ETags with `If-None-Match`, and googleapi-style
+error responses. Latency, transient errors and a daily quota per API key can be configured, for load tests and
+benchmarks of code that calls the API.
+
+A corpus can be recorded from the real API, and served from the command line:
+
+    python -m src.youtube.fake_server record --query "lofi jazz" --out .cache/fixtures
+    python -m src.youtube.fake_server serve --fixtures .cache/fixtures --port 8089 --latency 0.1
+
+Then set `YOUTUBE_API_ROOT_URL=http://127.0.0.1:8089/` to point the app and the scrapers at it.
+"""
+
+import argparse
+import json
+import logging
+import re
+import time
+from collections import Counter
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from random import Random
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from googleapiclient.errors import HttpError
+
+from src.models import Video
+
+from .official_service import OfficialYouTubeService
+from .retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "youtube"
+API_PREFIX = "/youtube/v3/"
+
+_FIELD_NAME_REGEX = re.compile(r"[A-Za-z0-9_*]+")
+
+# A parsed `fields` parameter: the selected keys, and what is selected under each of them (None for everything)
+Selection = Dict[str, Optional["Selection"]]
+
+
+def parse_fields(fields: str) -> Selection:
+    """
+    Parse the googleapi `fields` parameter, e.g. "items(id,snippet/title),nextPageToken".
+    """
+    selection, end = _parse_selection(fields, 0)
+    if end != len(fields):
+        raise ValueError(f"Unexpected {fields[end]!r} at {end} in fields {fields!r}.")
+    return selection
+
+
+def _parse_selection(fields: str, i: int) -> Tuple[Selection, int]:
+    selection: Selection = {}
+    while True:
+        # A path of names separated by slashes...
+        names = []
+        while True:
+            match = _FIELD_NAME_REGEX.match(fields, i)
+            if match is None:
+                raise ValueError(f"Expected a field name at {i} in fields {fields!r}.")
+            names.append(match.group())
+            i = match.end()
+            if not fields.startswith("/", i):
+                break
+            i += 1
+
+        # ...optionally followed by a parenthesized sub-selection
+        sub_selection: Optional[Selection] = None
+        if fields.startswith("(", i):
+            sub_selection, i = _parse_selection(fields, i + 1)
+            if not fields.startswith(")", i):
+                raise ValueError(f"Expected ')' at {i} in fields {fields!r}.")
+            i += 1
+
+        node = selection
+        for name in names[:-1]:
+            if node.get(name, {}) is None:
+                # Everything under this name is selected already
+                break
+            node = node.setdefault(name, {})  # type: ignore
+        else:
+            node[names[-1]] = sub_selection
+
+        if not fields.startswith(",", i):
+            return selection, i
+        i += 1
+
+
+def project(data: Any, selection: Optional[Selection]) -> Any:
+    """
+    The parts of `data` selected by a parsed `fields` parameter. Selections apply to every item of a list.
+    """
+    if selection is None:
+        return data
+    if isinstance(data, list):
+        return [project(x, selection) for x in data]
+    if not isinstance(data, dict):
+        return data
+    return {key: project(data[key], sub_selection) for key, sub_selection in selection.items() if key in data}
+
+
+class FakeYouTubeServer:
+    """
+    Serves the fixture corpus in `fixtures_dir` on a background thread. Usage:
+
+        with FakeYouTubeServer() as server:
+            youtube = AsyncOfficialYouTubeService(api_key="fake", origin=..., base_url=server.base_url)
+
+    Every response is delayed by `latency` seconds, and a random `error_rate` fraction of requests fail with a
+    transient 503. With a `daily_quota`, each API key can spend that many units before requests are refused with
+    `quotaExceeded`, like the real API. Requests are charged before they are served, so failed ones cost quota too.
+    """
+
+    # Quota cost of each endpoint's list method, everything else costs 1
+    COSTS: Dict[str, int] = {"search": 100}
+
+    class ApiError(Exception):
+        """
+        Rendered as a googleapi error response, e.g. {"error": {"code": 403, "errors": [{"reason": ...}]}}.
+        """
+
+        def __init__(self, status: int, reason: str, message: str):
+            self.status = status
+            self.reason = reason
+            self.message = message
+            super().__init__(message)
+
+        def body(self) -> dict:
+            return {
+                "error": {
+                    "code": self.status,
+                    "message": self.message,
+                    "errors": [{"message": self.message, "domain": "youtube", "reason": self.reason}],
+                }
+            }
+
+    def __init__(
+        self,
+        fixtures_dir: Path = FIXTURES_DIR,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        daily_quota: Optional[int] = None,
+        seed: Optional[int] = None,
+    ):
+        self.videos: Dict[str, dict] = {v["id"]: v for v in self._load(fixtures_dir, "videos")}
+        self.comment_threads: Dict[str, List[dict]] = self._load(fixtures_dir, "comment_threads")
+        self.comment_replies: Dict[str, List[dict]] = self._load(fixtures_dir, "comment_replies")
+        self.channels: Dict[str, str] = self._load(fixtures_dir, "channels")
+        self.playlists: Dict[str, List[str]] = self._load(fixtures_dir, "playlists")
+        self.comments_disabled = set(self._load(fixtures_dir, "comments_disabled"))
+
+        self.latency = latency
+        self.error_rate = error_rate
+        self.daily_quota = daily_quota
+        # Quota units spent by each API key
+        self.quota_used: Counter[str] = Counter()
+        # Errors to fail the next requests with, as (endpoint or None for any, status, reason)
+        self._injected: List[Tuple[Optional[str], int, str]] = []
+        self._rng = Random(seed)
+
+        # Every request served, as (endpoint, params), for tests to make assertions about
+        self.requests: List[Tuple[str, Dict[str, str]]] = []
+        self._lock = Lock()
+
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[Thread] = None
+
+    @staticmethod
+    def _load(fixtures_dir: Path, name: str) -> Any:
+        with open(fixtures_dir / f"{name}.json", encoding="utf-8") as f:
+            return json.load(f)
+
+    @property
+    def root_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def base_url(self) -> str:
+        return self.root_url + API_PREFIX.lstrip("/")
+
+    def start(self) -> "FakeYouTubeServer":
+        self._thread = Thread(target=self._httpd.serve_forever, name="fake-youtube", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeYouTubeServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def inject_error(self, status: int, reason: str, endpoint: Optional[str] = None, times: int = 1) -> None:
+        """
+        Fail the next `times` requests (to `endpoint`, or to any endpoint) with a googleapi error.
+        """
+        with self._lock:
+            self._injected.extend([(endpoint, status, reason)] * times)
+
+    def _charge(self, api_key: str, endpoint: str) -> None:
+        cost = self.COSTS.get(endpoint, 1)
+        with self._lock:
+            if self.daily_quota is not None and self.quota_used[api_key] + cost > self.daily_quota:
+                raise self.ApiError(
+                    403,
+                    "quotaExceeded",
+                    "The request cannot be completed because you have exceeded your quota.",
+                )
+            self.quota_used[api_key] += cost
+
+    def _fail_if_injected(self, endpoint: str) -> None:
+        with self._lock:
+            for i, (injected_endpoint, status, reason) in enumerate(self._injected):
+                if injected_endpoint in (None, endpoint):
+                    del self._injected[i]
+                    raise self.ApiError(status, reason, f"Injected {reason} error.")
+            if self.error_rate and self._rng.random() < self.error_rate:
+                raise self.ApiError(503, "backendError", "Injected backendError error.")
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                if server.latency:
+                    time.sleep(server.latency)
+                status, body = server.handle(url.path, params)
+                payload = json.dumps(body).encode("utf-8")
+                etag = f'"{sha1(payload).hexdigest()}"'
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                self.send_header("Content-Length", str(len(payload)))
+                if status == 200:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    def handle(self, path: str, params: Dict[str, str]) -> Tuple[int, dict]:
+        """
+        Serve one request, returning the response status and JSON body.
+        """
+        endpoint = path[len(API_PREFIX) :] if path.startswith(API_PREFIX) else path
+        with self._lock:
+            self.requests.append((endpoint, params))
+
+        handlers = {
+            "search": self._search,
+            "videos": self._videos,
+            "channels": self._channels,
+            "playlistItems": self._playlist_items,
+            "commentThreads": self._comment_threads,
+            "comments": self._comments,
+        }
+        try:
+            if not params.get("key"):
+                raise self.ApiError(403, "forbidden", "The request is missing a valid API key.")
+            if endpoint not in handlers:
+                raise self.ApiError(404, "notFound", f"Unknown endpoint {endpoint}.")
+            self._charge(params["key"], endpoint)
+            self._fail_if_injected(endpoint)
+            try:
+                selection = parse_fields(params["fields"]) if "fields" in params else None
+            except ValueError as e:
+                raise self.ApiError(400, "invalidParameter", str(e))
+            return 200, project(handlers[endpoint](params), selection)
+        except self.ApiError as e:
+            return e.status, e.body()
+
+    @classmethod
+    def _page(cls, items: list, params: Dict[str, str], default_max=5, max_allowed=50) -> dict:
+        """
+        Paginate `items`, using the item offset as the page token.
+        """
+        max_results = int(params.get("maxResults", default_max))
+        if not 0 <= max_results <= max_allowed:
+            raise cls.ApiError(400, "invalidParameter", f"maxResults must be in [0, {max_allowed}].")
+        try:
+            offset = int(params.get("pageToken") or 0)
+        except ValueError:
+            raise cls.ApiError(400, "invalidPageToken", "The request specifies an invalid page token.")
+
+        page = {"pageInfo": {"totalResults": len(items), "resultsPerPage": max_results}}
+        if items[offset : offset + max_results]:
+            page["items"] = items[offset : offset + max_results]
+        if offset + max_results < len(items):
+            page["nextPageToken"] = str(offset + max_results)
+        return page
+
+    def _search(self, params: Dict[str, str]) -> dict:
+        query = params.get("q", "").lower()
+        matches = [
+            {"kind": "youtube#searchResult", "id": {"kind": "youtube#video", "videoId": video_id}}
+            for video_id, video in self.videos.items()
+            if query in video["snippet"]["title"].lower() or query in video["snippet"]["description"].lower()
+        ]
+        return {"kind": "youtube#searchListResponse"} | self._page(matches, params)
+
+    def _videos(self, params: Dict[str, str]) -> dict:
+        video_ids = [x for x in params.get("id", "").split(",") if x]
+        if len(video_ids) > 50:
+            raise self.ApiError(400, "invalidParameter", "Too many video IDs, the maximum is 50.")
+        # Only the requested parts of each video
+        parts = {"kind", "etag", "id"} | set(params.get("part", "").split(","))
+        items = [{k: v for k, v in self.videos[x].items() if k in parts} for x in video_ids if x in self.videos]
+        return {"kind": "youtube#videoListResponse", "items": items, "pageInfo": {"totalResults": len(items)}}
+
+    def _channels(self, params: Dict[str, str]) -> dict:
+        channel_id = params.get("id", "")
+        response: Dict[str, Any] = {"kind": "youtube#channelListResponse", "pageInfo": {"totalResults": 0}}
+        if channel_id in self.channels:
+            # Like the real API, unknown channels have no "items" at all
+            uploads = {"relatedPlaylists": {"uploads": self.channels[channel_id]}}
+            response["items"] = [{"kind": "youtube#channel", "id": channel_id, "contentDetails": uploads}]
+            response["pageInfo"]["totalResults"] = 1
+        return response
+
+    def _playlist_items(self, params: Dict[str, str]) -> dict:
+        playlist_id = params.get("playlistId", "")
+        if playlist_id not in self.playlists:
+            raise self.ApiError(
+                404, "playlistNotFound", "The playlist identified with the request's playlistId cannot be found."
+            )
+        items = [
+            {"kind": "youtube#playlistItem", "snippet": {"resourceId": {"kind": "youtube#video", "videoId": x}}}
+            for x in self.playlists[playlist_id]
+        ]
+        return {"kind": "youtube#playlistItemListResponse"} | self._page(items, params)
+
+    def _comment_threads(self, params: Dict[str, str]) -> dict:
+        video_id = params.get("videoId", "")
+        if video_id in self.comments_disabled:
+            raise self.ApiError(
+                403, "commentsDisabled", "The video identified by the videoId parameter has disabled comments."
+            )
+        if video_id not in self.videos:
+            raise self.ApiError(
+                404, "videoNotFound", "The video identified by the videoId parameter could not be found."
+            )
+
+        threads = self.comment_threads.get(video_id, [])
+        if "replies" not in params.get("part", "").split(","):
+            threads = [{k: v for k, v in thread.items() if k != "replies"} for thread in threads]
+        return {"kind": "youtube#commentThreadListResponse"} | self._page(
+            threads, params, default_max=20, max_allowed=100
+        )
+
+    def _comments(self, params: Dict[str, str]) -> dict:
+        parent_id = params.get("parentId", "")
+        if parent_id not in self.comment_replies and not any(
+            thread["id"] == parent_id for threads in self.comment_threads.values() for thread in threads
+        ):
+            raise self.ApiError(404, "commentNotFound", "One or more of the requested comments cannot be found.")
+        replies = self.comment_replies.get(parent_id, [])
+        return {"kind": "youtube#commentListResponse"} | self._page(replies, params, default_max=20, max_allowed=100)
+
+
+def record(youtube: Any, queries: List[str], fixtures_dir: Path, videos_per_query: int = 25) -> None:
+    """
+    Record a fixture corpus for `FakeYouTubeServer` from the real API, given a googleapiclient resource: the videos
+    found for each query with a page of their comment threads (and the replies that aren't inline), and the first
+    page of uploads of each of their channels.
+    """
+    API = OfficialYouTubeService.API
+    search_ids: List[str] = []
+    for query in queries:
+        response = youtube.search().list(part="id", q=query, type="video", maxResults=videos_per_query).execute()
+        search_ids.extend(item["id"]["videoId"] for item in response.get("items", []) if "videoId" in item["id"])
+    search_ids = list(dict.fromkeys(search_ids))
+
+    def list_videos(video_ids: List[str]) -> List[dict]:
+        items = []
+        for i in range(0, len(video_ids), 50):
+            batch = video_ids[i : i + 50]
+            items.extend(youtube.videos().list(part=API.Videos.PART, id=",".join(batch)).execute().get("items", []))
+        return items
+
+    videos = {video["id"]: video for video in list_videos(search_ids)}
+
+    channels: Dict[str, str] = {}
+    playlists: Dict[str, List[str]] = {}
+    for channel_id in dict.fromkeys(video["snippet"]["channelId"] for video in videos.values()):
+        items = youtube.channels().list(part=API.Channels.PART, id=channel_id).execute().get("items", [])
+        if not items:
+            continue
+        uploads = items[0]["contentDetails"]["relatedPlaylists"]["uploads"]
+        channels[channel_id] = uploads
+        try:
+            response = youtube.playlistItems().list(part=API.PlaylistItems.PART, playlistId=uploads, maxResults=50)
+            playlists[uploads] = [x["snippet"]["resourceId"]["videoId"] for x in response.execute().get("items", [])]
+        except HttpError as e:
+            logger.warning(f"Could not record the uploads of channel {channel_id}: {e}")
+    uploaded_ids = [x for video_ids in playlists.values() for x in video_ids if x not in videos]
+    videos |= {video["id"]: video for video in list_videos(list(dict.fromkeys(uploaded_ids)))}
+
+    comment_threads: Dict[str, List[dict]] = {}
+    comment_replies: Dict[str, List[dict]] = {}
+    comments_disabled: List[str] = []
+    for video_id in search_ids:
+        try:
+            response = youtube.commentThreads().list(
+                part=API.CommentThreads.PART, videoId=video_id, maxResults=100, textFormat="plainText"
+            )
+            threads = response.execute().get("items", [])
+        except HttpError as e:
+            if RetryPolicy.classify(e) == ("commentsDisabled", False):
+                comments_disabled.append(video_id)
+            else:
+                logger.warning(f"Could not record the comments of video {video_id}: {e}")
+            continue
+        comment_threads[video_id] = threads
+        for thread in threads:
+            if thread["snippet"]["totalReplyCount"] > len(thread.get("replies", {}).get("comments", [])):
+                response = youtube.comments().list(
+                    part=API.Comments.PART, parentId=thread["id"], maxResults=100, textFormat="plainText"
+                )
+                comment_replies[thread["id"]] = response.execute().get("items", [])
+
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+    corpus = {
+        "videos": list(videos.values()),
+        "comment_threads": comment_threads,
+        "comment_replies": comment_replies,
+        "channels": channels,
+        "playlists": playlists,
+        "comments_disabled": comments_disabled,
+    }
+    for name, data in corpus.items():
+        with open(fixtures_dir / f"{name}.json", "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+    logger.info(f"Recorded {len(videos)} videos and {len(comment_threads)} comment sections to {fixtures_dir}.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Serve a fixture corpus.")
+    serve.add_argument("--fixtures", type=Path, default=FIXTURES_DIR)
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8089)
+    serve.add_argument("--latency", type=float, default=0.0, help="Seconds to delay every response by.")
+    serve.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests to fail with a 503.")
+    serve.add_argument("--daily-quota", type=int, default=None, help="Quota units per API key.")
+    serve.add_argument("--seed", type=int, default=None)
+
+    record_parser = commands.add_parser("record", help="Record a fixture corpus from the real API.")
+    record_parser.add_argument("--query", action="append", required=True, help="A search query, may be repeated.")
+    record_parser.add_argument("--out", type=Path, required=True)
+    record_parser.add_argument("--videos-per-query", type=int, default=25)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        youtube = OfficialYouTubeService.build_from_env(origin=Video.Origin.SCRAPED)
+        record(youtube.youtube, args.query, args.out, args.videos_per_query)
+        return
+
+    server = FakeYouTubeServer(
+        args.fixtures, args.host, args.port, args.latency, args.error_rate, args.daily_quota, args.seed
+    )
+    print(f"Serving {len(server.videos)} videos at {server.root_url}, press Ctrl+C to stop.")
+    with server:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+A conditional-request cache for YouTube Data API responses, beneath googleapiclient.
+"""
+
+import logging
+import sqlite3
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httplib2
+
+from src.settings import YOUTUBE_HTTP_CACHE
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    API response bodies and their ETags in a SQLite file, keyed by request URI without the API key. Entries younger
+    than their endpoint's TTL are served without a request, and older ones are revalidated with `If-None-Match`.
+    Entries that were neither stored nor revalidated for `max_age` are deleted whenever a response is stored.
+    """
+
+    # How long a response is served without asking the API whether it changed. Anything else is always revalidated.
+    DEFAULT_TTLS: Dict[str, timedelta] = {
+        "search": timedelta(hours=1),
+        "videos": timedelta(hours=6),
+        "channels": timedelta(days=1),
+        "playlistItems": timedelta(hours=1),
+        "commentThreads": timedelta(hours=6),
+        "comments": timedelta(hours=6),
+    }
+    # Well past every TTL, so that entries are still revalidated for a while before they are dropped
+    DEFAULT_MAX_AGE = timedelta(days=7)
+
+    @dataclass
+    class Stats:
+        # Served from the cache without a request
+        hits: int = 0
+        # Revalidated with the API, which answered 304 Not Modified
+        revalidated: int = 0
+        # Downloaded from the API
+        misses: int = 0
+
+    @dataclass
+    class Entry:
+        etag: Optional[str]
+        body: bytes
+        stored_at: float
+
+    _default: Optional["ResponseCache"] = None
+    _default_lock = Lock()
+
+    def __init__(
+        self,
+        path: Optional[str],
+        ttls: Optional[Dict[str, timedelta]] = None,
+        clock: Callable[[], float] = time,
+        max_age: timedelta = DEFAULT_MAX_AGE,
+    ):
+        self.ttls = self.DEFAULT_TTLS if ttls is None else ttls
+        self.max_age = max_age
+        self.clock = clock
+        self.stats = self.Stats()
+        self._lock = Lock()
+
+        # An empty path keeps the cache in memory
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, etag TEXT, body BLOB, stored_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_stored_at ON responses (stored_at)")
+        self._db.commit()
+
+    @classmethod
+    def default(cls) -> "ResponseCache":
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls(YOUTUBE_HTTP_CACHE)
+            return cls._default
+
+    @staticmethod
+    def key(uri: str) -> Tuple[str, str]:
+        """
+        The cache key and API endpoint of a request URI. The API key is left out, so that every key shares entries.
+        """
+        url = urlsplit(uri)
+        query = urlencode(sorted((k, v) for k, v in parse_qsl(url.query, keep_blank_values=True) if k != "key"))
+        return urlunsplit(url._replace(query=query)), url.path.rstrip("/").rsplit("/", 1)[-1]
+
+    def ttl(self, endpoint: str) -> timedelta:
+        return self.ttls.get(endpoint, timedelta(0))
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            row = self._db.execute("SELECT etag, body, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+        return None if row is None else self.Entry(*row)
+
+    def put(self, key: str, etag: Optional[str], body: bytes) -> None:
+        now = self.clock()
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE stored_at < ?", (now - self.max_age.total_seconds(),))
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, etag, body, stored_at) VALUES (?, ?, ?, ?)",
+                (key, etag, body, now),
+            )
+            self._db.commit()
+
+    def touch(self, key: str) -> None:
+        """
+        Mark an entry as fresh again, after the API confirmed that it is unchanged.
+        """
+        with self._lock:
+            self._db.execute("UPDATE responses SET stored_at = ? WHERE key = ?", (self.clock(), key))
+            self._db.commit()
+
+    def is_fresh(self, entry: Entry, endpoint: str) -> bool:
+        return self.clock() - entry.stored_at < self.ttl(endpoint).total_seconds()
+
+    def count(self, outcome: str) -> None:
+        """
+        Add one to a field of `stats`, e.g. "hits". Requests from several threads share the cache.
+        """
+        with self._lock:
+            setattr(self.stats, outcome, getattr(self.stats, outcome) + 1)
+
+
+class CachingHttp:
+    """
+    Wraps an `httplib2.Http` so that GET requests go through a `ResponseCache`. Anything else is passed through.
+    """
+
+    def __init__(self, http: Any, cache: ResponseCache):
+        self.http = http
+        self.cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        # googleapiclient reads and sets a few attributes on its http object (e.g. timeout, redirect_codes)
+        return getattr(self.http, name)
+
+    @staticmethod
+    def _cached_response(entry: ResponseCache.Entry) -> Tuple[httplib2.Response, bytes]:
+        headers = {"status": "200", "content-type": "application/json; charset=UTF-8"}
+        if entry.etag is not None:
+            headers["etag"] = entry.etag
+        return httplib2.Response(headers), entry.body
+
+    def request(self, uri: str, method: str = "GET", body=None, headers=None, **kwargs) -> Tuple[Any, bytes]:
+        if method != "GET":
+            return self.http.request(uri, method, body=body, headers=headers, **kwargs)
+
+        key, endpoint = self.cache.key(uri)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry, endpoint):
+            self.cache.count("hits")
+            return self._cached_response(entry)
+
+        headers = dict(headers or {})
+        if entry is not None and entry.etag is not None:
+            headers["if-none-match"] = entry.etag
+        response, content = self.http.request(uri, method, body=body, headers=headers, **kwargs)
+
+        if response.status == 304 and entry is not None:
+            self.cache.count("revalidated")
+            self.cache.touch(key)
+            return self._cached_response(entry)
+
+        self.cache.count("misses")
+        if response.status == 200:
+            self.cache.put(key, response.get("etag"), content)
+        return response, content
@@ -1,23 +1,75 @@
 import json
 import logging
+import re
+import threading
 from dataclasses import dataclass
 from datetime import datetime
-from os import getenv
-from typing import Any, List, Optional
+from time import monotonic
+from typing import Any, Callable, Dict, Generator, Iterator, List, Optional, Tuple, Union
 
-from dotenv import load_dotenv
+import httplib2
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest, build_http
 from isodate import parse_duration
 
 from src.models import Comment, Video
+from src.settings import YOUTUBE_API_KEYS, YOUTUBE_API_ROOT_URL
 
-from . import fill_from, find_none_paths
+from . import CompiledTemplate, fill_from, find_none_paths
+from .http_cache import CachingHttp, ResponseCache
+from .quota import KeyPool, KeyPoolHttp, QuotaHttp, QuotaScheduler
+from .retry import RetryPolicy
 
 logger = logging.getLogger(__name__)
 
+# The durations youtube gives videos, e.g. PT1H2M3S or P1DT2H
+_DURATION_REGEX = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?")
 
-class OfficialYouTubeService:
+# The parts of a comment that `_comment_from_data` reads, as a `fields=` projection
+_COMMENT_PROJECTION = (
+    "id,snippet(textOriginal,authorDisplayName,authorChannelId/value,videoId,publishedAt,parentId,likeCount)"
+)
+
+_thread_state = threading.local()
+
+
+def _thread_http(priority: QuotaScheduler.Priority, pool: Optional[KeyPool] = None) -> CachingHttp:
+    """
+    The calling thread's http object for requests of `priority`: the shared response cache, in front of the shared
+    quota scheduler, in front of `pool`'s keys if there is one. httplib2 isn't thread-safe, so threads can't share one.
+    The shared cache and scheduler are looked up on every request, and the http object is rebuilt if either changed.
+    """
+    if not hasattr(_thread_state, "http"):
+        _thread_state.http = {}
+    scheduler, cache = QuotaScheduler.default(), ResponseCache.default()
+    caching_http = _thread_state.http.get((priority, pool))
+    if caching_http is None or caching_http.cache is not cache or caching_http.http.scheduler is not scheduler:
+        http = build_http() if pool is None else KeyPoolHttp(build_http(), pool)
+        caching_http = CachingHttp(QuotaHttp(http, scheduler, priority), cache)
+        _thread_state.http[(priority, pool)] = caching_http
+    return caching_http
+
+
+def _request_builder(priority: QuotaScheduler.Priority, pool: Optional[KeyPool] = None) -> Callable[..., HttpRequest]:
+    """
+    Send every request through the calling thread's http object, instead of the one the resource was built with.
+    """
+
+    def build_request(http: httplib2.Http, *args, **kwargs) -> HttpRequest:
+        return HttpRequest(_thread_http(priority, pool), *args, **kwargs)
+
+    return build_request
+
+
+class YouTubeServiceBase:
+    """
+    What the sync and async services share: the errors, the parts and fields of each API query, and the parsing of
+    responses (including the paging of comments, which yields its requests instead of making them). Subclasses make
+    the requests, and set `origin`.
+    """
+
+    origin: Video.Origin
 
     class YoutubeError(Exception): ...
 
@@ -28,11 +80,18 @@ class OfficialYouTubeService:
         Something went wrong while parsing raw data from youtube.
         """
 
-        def __init__(self, raw_data: str, errors: list[str]):
-            self.raw_data = raw_data
+        def __init__(self, raw_data: Any, errors: list[str]):
+            # Rendered only when needed, because it can be big (e.g., a whole video description)
+            self._raw_data = raw_data
             self.errors = errors
             super().__init__()
 
+        @property
+        def raw_data(self) -> str:
+            if not isinstance(self._raw_data, str):
+                self._raw_data = json.dumps(self._raw_data, indent=2)
+            return self._raw_data
+
         def __str__(self):
             return f"{self.raw_data}, with errors: {self.errors}."
 
@@ -44,24 +103,30 @@ class OfficialYouTubeService:
 
     class CommentParseError(ParseError): ...
 
+    QuotaExhausted = QuotaScheduler.QuotaExhausted
+
     class API:
         """
-        Each subclass here represents a different youtube API query.
+        Each subclass here represents a different youtube API query, with the parts and fields it requests. The
+        fields are exactly the ones that get read, so that responses are as small as possible.
         """
 
         class Search:
 
-            @staticmethod
-            def execute(youtube: Any, query: str, max_results=20, page_token: Optional[str] = None) -> dict:
+            PART = "snippet"
+            FIELDS = "items(id/videoId),nextPageToken"
+
+            @classmethod
+            def execute(cls, youtube: Any, query: str, max_results=20, page_token: Optional[str] = None) -> dict:
                 if max_results > 50 or max_results < 0:
                     raise ValueError(f"max_results must be in [0, 50]")
                 return (
                     youtube.search().list(
                         q=query,
                         type="video",
-                        part="snippet",
+                        part=cls.PART,
                         maxResults=max_results,
-                        fields=("items(id/videoId),nextPageToken"),
+                        fields=cls.FIELDS,
                         pageToken=page_token,
                         # "videoCategoryId": "10",  # Music
                     )
@@ -74,19 +139,16 @@ class OfficialYouTubeService:
 
         class Videos:
 
-            @staticmethod
-            def execute(youtube: Any, video_ids: List[str]) -> dict:
-                return (
-                    youtube.videos()
-                    .list(
-                        part="contentDetails,statistics,snippet",
-                        id=",".join(video_ids),
-                        # fields=(
-                        #     "items(id,contentDetails/duration,statistics(viewCount,likeCount,favoriteCount,commentCount),snippet(publishedAt,channelId,channelTitle,title,description,thumbnails/medium/url)))"
-                        # ),
-                    )
-                    .execute()
-                )
+            PART = "snippet,contentDetails,statistics,liveStreamingDetails,status"
+            FIELDS = (
+                "items(id,snippet(title,description,thumbnails/medium/url,channelId,channelTitle,publishedAt),"
+                "statistics(viewCount,likeCount,favoriteCount,commentCount),contentDetails/duration,"
+                "liveStreamingDetails,status/containsSyntheticMedia)"
+            )
+
+            @classmethod
+            def execute(cls, youtube: Any, video_ids: List[str]) -> dict:
+                return youtube.videos().list(part=cls.PART, id=",".join(video_ids), fields=cls.FIELDS).execute()
 
             @dataclass
             class Response:
@@ -95,6 +157,9 @@ class OfficialYouTubeService:
 
         class PlaylistItems:
 
+            PART = "snippet"
+            FIELDS = "items/snippet/resourceId/videoId,nextPageToken"
+
             @dataclass
             class Response:
                 video_ids: List[str]
@@ -102,159 +167,361 @@ class OfficialYouTubeService:
 
         class Channels:
 
+            PART = "contentDetails"
+            FIELDS = "items/contentDetails/relatedPlaylists/uploads"
+
             @dataclass
             class Response: ...
 
         class CommentThreads:
 
+            PART = "snippet,replies"
+            FIELDS = (
+                f"items(id,snippet(totalReplyCount,topLevelComment({_COMMENT_PROJECTION})),"
+                f"replies/comments({_COMMENT_PROJECTION})),nextPageToken"
+            )
+
             @dataclass
             class Response: ...
 
-    @classmethod
-    def build_from_env(cls, origin: Video.Origin) -> "OfficialYouTubeService":
+        class Comments:
 
-        # Get API key from env
-        load_dotenv()
-        KEY_NAME = "YOUTUBE_API_KEY"
-        key = getenv(KEY_NAME)
-        if key is None:
-            raise ValueError(f"Expected {KEY_NAME} to exist in the environment!")
+            PART = "snippet"
+            FIELDS = f"items({_COMMENT_PROJECTION}),nextPageToken"
 
-        return cls(api_key=key, origin=origin)
-
-    def __init__(self, api_key: str, origin: Video.Origin):
-        self.youtube = build("youtube", "v3", developerKey=api_key)
-        self.origin = origin
-
-    def _video_from_data(self, data: dict) -> Video:
-
-        # What the video data should look like. The None values are required, and any other value is a default.
-        data_template = {
-            "id": None,
-            "snippet": {
-                "title": None,
-                "description": None,
-                "thumbnails": {
-                    "medium": {
-                        "url": None,
-                    },
+    @staticmethod
+    def priority(origin: Video.Origin) -> QuotaScheduler.Priority:
+        """
+        The app's requests are made while a user waits, so they take priority over scraping.
+        """
+        if origin == Video.Origin.APP:
+            return QuotaScheduler.Priority.INTERACTIVE
+        return QuotaScheduler.Priority.BACKGROUND
+
+    # What the video data should look like. The None values are required, and any other value is a default.
+    VIDEO_TEMPLATE = {
+        "id": None,
+        "snippet": {
+            "title": None,
+            "description": None,
+            "thumbnails": {
+                "medium": {
+                    "url": None,
                 },
-                "channelId": None,
-                "channelTitle": None,
-                "publishedAt": None,
             },
-            "statistics": {
-                "viewCount": 0,
-                "likeCount": 0,
-                "favoriteCount": 0,
-                "commentCount": 0,
-            },
-            "contentDetails": {
-                "duration": None,
-            },
-            # True if the video is a live-stream
-            "liveStreamingDetails": False,
-            "status": {
-                # True if video is self-reported as AI
-                "containsSyntheticMedia": False,
-            },
-            # Whether we have labelled this video as human-made, or AI, for ML-model training purposes.
-            "label": Video.Label.UNLABELLED.value,
-        }
-
-        # Fill the data template and raise on any leftover None(s)
-        data = fill_from(data, data_template)
-        none_paths = find_none_paths(data)
-        if len(none_paths) > 0:
-            raise self.VideoParseError(
-                json.dumps(data, indent=2), [f"Path {p} cannot be None!" for p in none_paths]
-            )
-
-        video_id = None
-        if isinstance(data["id"], str):
+            "channelId": None,
+            "channelTitle": None,
+            "publishedAt": None,
+        },
+        "statistics": {
+            "viewCount": 0,
+            "likeCount": 0,
+            "favoriteCount": 0,
+            "commentCount": 0,
+        },
+        "contentDetails": {
+            "duration": None,
+        },
+        # True if the video is a live-stream
+        "liveStreamingDetails": False,
+        "status": {
+            # True if video is self-reported as AI
+            "containsSyntheticMedia": False,
+        },
+        # Whether we have labelled this video as human-made, or AI, for ML-model training purposes.
+        "label": Video.Label.UNLABELLED.value,
+    }
+    _VIDEO_FIELDS = CompiledTemplate(VIDEO_TEMPLATE)
+
+    NO_PARENT = "NO_PARENT"
+
+    # What the comment data should look like. The None values are required, and any other value is a default.
+    COMMENT_TEMPLATE = {
+        "id": None,
+        "snippet": {
+            "textOriginal": None,
+            "authorDisplayName": None,
+            "authorChannelId": {"value": None},
+            "videoId": None,
+            "publishedAt": None,
+            "parentId": NO_PARENT,
+            "likeCount": 0,
+        },
+    }
+    _COMMENT_FIELDS = CompiledTemplate(COMMENT_TEMPLATE)
+
+    @staticmethod
+    def _duration_seconds(duration: str) -> int:
+        match = _DURATION_REGEX.fullmatch(duration)
+        if match is None:
+            # Anything else ISO 8601 allows (e.g. weeks or fractions)
+            return int(parse_duration(duration).total_seconds())
+        days, hours, minutes, seconds = (int(x) if x else 0 for x in match.groups())
+        return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+    @staticmethod
+    def _video_id(id_data: Any) -> Optional[str]:
+        if isinstance(id_data, str):
             # Youtube's Videos API returns video IDs as a string.
-            video_id = data["id"]
-        elif isinstance(data["id"], dict) and "videoId" in data["id"]:
+            return id_data
+        if isinstance(id_data, dict) and "videoId" in id_data:
             # Youtube's Search API returns video IDs in a second nested dictionary.
-            video_id = data["id"]["videoId"]
-        else:
-            raise self.VideoParseError(json.dumps(data, indent=2), ["Could not parse video_id from data!"])
+            return str(id_data["videoId"])
+        return None
 
+    def _video_from_data(self, data: dict) -> Video:
+        fields = self._VIDEO_FIELDS.extract(data)
+        video_id = None if fields is None else self._video_id(fields[0])
+        if fields is None or video_id is None:
+            # Fill the data template to find out what's wrong with the data
+            return self._video_from_template(data)
+
+        # Leaves of VIDEO_TEMPLATE, in order
+        (
+            _,
+            title,
+            description,
+            thumbnail_url,
+            channel_id,
+            channel_name,
+            published_at,
+            views,
+            likes,
+            favorites,
+            comments,
+            duration,
+            _,
+            contains_synthetic_media,
+            label,
+        ) = fields
         return Video(
-            id=str(video_id),
-            title=str(data["snippet"]["title"]),
-            description=str(data["snippet"]["description"]),
+            id=video_id,
+            title=str(title),
+            description=str(description),
             url=f"https://www.youtube.com/watch?v={video_id}",
-            thumbnail_url=str(data["snippet"]["thumbnails"]["medium"]["url"]),
-            channel_id=str(data["snippet"]["channelId"]),
-            channel_name=str(data["snippet"]["channelTitle"]),
-            views=int(data["statistics"]["viewCount"]),
-            likes=int(data["statistics"]["likeCount"]),
-            favorites=int(data["statistics"]["favoriteCount"]),
-            comments=int(data["statistics"]["commentCount"]),
-            is_livestream=bool("liveStreamingDetails" in data),
-            contains_synthetic_media=data["status"]["containsSyntheticMedia"],
-            label=data["label"],
-            duration_seconds=int(parse_duration(data["contentDetails"]["duration"]).total_seconds()),
-            published_at=datetime.fromisoformat(data["snippet"]["publishedAt"].replace("Z", "+00:00")),
+            thumbnail_url=str(thumbnail_url),
+            channel_id=str(channel_id),
+            channel_name=str(channel_name),
+            views=int(views),
+            likes=int(likes),
+            favorites=int(favorites),
+            comments=int(comments),
+            is_livestream="liveStreamingDetails" in data,
+            contains_synthetic_media=contains_synthetic_media,
+            label=label,
+            duration_seconds=self._duration_seconds(duration),
+            published_at=datetime.fromisoformat(published_at.replace("Z", "+00:00")),
             origin=self.origin.value,
         )
 
-    @classmethod
-    def _comment_from_data(cls, data: dict, video: Video) -> Comment:
-
-        NO_PARENT = "NO_PARENT"
-
-        # What the comment data should look like. The None values are required, and any other value is a default.
-        data_template = {
-            "id": None,
-            "snippet": {
-                "textOriginal": None,
-                "authorDisplayName": None,
-                "authorChannelId": {"value": None},
-                "videoId": None,
-                "publishedAt": None,
-                "parentId": NO_PARENT,
-                "likeCount": 0,
-            },
-        }
+    def _video_from_template(self, data: dict) -> Video:
+        """
+        The slow path of `_video_from_data`, which fills in the whole data template to report every error.
+        """
 
         # Fill the data template and raise on any leftover None(s)
-        data = fill_from(data, data_template)
+        data = fill_from(data, self.VIDEO_TEMPLATE)
         none_paths = find_none_paths(data)
         if len(none_paths) > 0:
-            raise cls.VideoParseError(json.dumps(data, indent=2), [f"Path {p} cannot be None!" for p in none_paths])
-
-        # Set isReply based on whether the comment has a parent
-        if data["snippet"]["parentId"] == NO_PARENT:
-            data["snippet"]["parentId"] = None
-            data["snippet"]["isReply"] = False
-        else:
-            data["snippet"]["isReply"] = True
+            raise self.VideoParseError(data, [f"Path {p} cannot be None!" for p in none_paths])
+        if self._video_id(data["id"]) is None:
+            raise self.VideoParseError(data, ["Could not parse video_id from data!"])
+        return self._video_from_data(data)
 
+    @classmethod
+    def _comment_from_data(cls, data: dict, video: Video) -> Comment:
+        fields = cls._COMMENT_FIELDS.extract(data)
+        if fields is None:
+            # Fill the data template to find out what's wrong with the data
+            data = fill_from(data, cls.COMMENT_TEMPLATE)
+            raise cls.VideoParseError(data, [f"Path {p} cannot be None!" for p in find_none_paths(data)])
+
+        # Leaves of COMMENT_TEMPLATE, in order
+        comment_id, text, author_display_name, author_channel_id, _, published_at, parent_id, likes = fields
+        is_reply = parent_id != cls.NO_PARENT
         return Comment(
-            id=str(data["id"]),
-            text=str(data["snippet"]["textOriginal"]),
+            id=str(comment_id),
+            text=str(text),
             video=video,
-            author_channel_id=str(data["snippet"]["authorChannelId"]["value"]),
-            author_display_name=str(data["snippet"]["authorDisplayName"]),
-            likes=int(data["snippet"]["likeCount"]),
-            is_reply=bool(data["snippet"]["isReply"]),
-            parent_comment_id=data["snippet"]["parentId"],  # No str conversion because it may be None
-            published_at=datetime.fromisoformat(data["snippet"]["publishedAt"].replace("Z", "+00:00")),
+            author_channel_id=str(author_channel_id),
+            author_display_name=str(author_display_name),
+            likes=int(likes),
+            is_reply=is_reply,
+            parent_comment_id=parent_id if is_reply else None,  # No str conversion because it may be None
+            published_at=datetime.fromisoformat(published_at.replace("Z", "+00:00")),
         )
 
+    def _videos_from_videos_response(self, response: dict) -> List[Video]:
+
+        videos: List[Video] = []
+        if "items" in response:
+            for item in response["items"]:
+                try:
+                    video = self._video_from_data(item)
+                    videos.append(video)
+                except self.VideoParseError as e:
+                    logger.error(f"Failed to parse video data!", exc_info=e)
+
+        return videos
+
+    @classmethod
+    def _thread_comments(cls, item: dict, video: Video, include_replies: bool = True) -> List[Comment]:
+        """
+        The top-level comment of a comment thread, followed by the replies included with it (at most 5).
+        """
+        comments = [cls._comment_from_data(item["snippet"]["topLevelComment"], video)]
+        if include_replies and "replies" in item:
+            # Grab replies that are 1 "layer" deep as well...
+            for reply in item["replies"]["comments"]:
+                comments.append(cls._comment_from_data(reply, video))
+        return comments
+
+    @staticmethod
+    def _missing_replies(item: dict) -> bool:
+        """
+        True if a comment thread has more replies than were included with it.
+        """
+        included = len(item.get("replies", {}).get("comments", []))
+        return int(item["snippet"].get("totalReplyCount", included)) > included
+
+    @classmethod
+    def _comment_pages(
+        cls,
+        video_id: str,
+        max_comments: int,
+        timeout: Optional[float],
+        fetch_replies: bool,
+        page_size: int,
+    ) -> Generator[Union[Comment, Tuple[str, Dict[str, Any]]], dict, None]:
+        """
+        The paging of `iter_comments` without any I/O, so that the sync and async services share it. Yields each
+        request to make as an (endpoint, parameters) pair, which must be sent its response, and each comment in turn.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        # Only the ID is needed to link the comments
+        video = Video(id=video_id)
+        remaining = max_comments
+
+        def in_time() -> bool:
+            return deadline is None or monotonic() < deadline
+
+        page_token = None
+        while remaining > 0 and in_time():
+            response = yield (
+                "commentThreads",
+                {
+                    "videoId": video_id,
+                    "part": cls.API.CommentThreads.PART,
+                    "fields": cls.API.CommentThreads.FIELDS,
+                    "maxResults": min(remaining, page_size),
+                    "order": "relevance",
+                    "pageToken": page_token,
+                },
+            )
+            for item in response.get("items", []):
+                fetch_thread_replies = fetch_replies and cls._missing_replies(item)
+                for comment in cls._thread_comments(item, video, include_replies=not fetch_thread_replies):
+                    yield comment
+                    remaining -= 1
+                    if remaining == 0:
+                        return
+
+                # Page through all of the thread's replies instead
+                reply_page_token = None
+                while fetch_thread_replies and in_time():
+                    replies_response = yield (
+                        "comments",
+                        {
+                            "parentId": item["id"],
+                            "part": cls.API.Comments.PART,
+                            "fields": cls.API.Comments.FIELDS,
+                            "maxResults": min(remaining, page_size),
+                            "pageToken": reply_page_token,
+                        },
+                    )
+                    for reply in replies_response.get("items", []):
+                        yield cls._comment_from_data(reply, video)
+                        remaining -= 1
+                        if remaining == 0:
+                            return
+                    reply_page_token = replies_response.get("nextPageToken")
+                    if not reply_page_token:
+                        break
+
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return
+
+
+class OfficialYouTubeService(YouTubeServiceBase):
+
+    @classmethod
+    def build_from_env(cls, origin: Video.Origin) -> "OfficialYouTubeService":
+        """
+        A service that spreads its requests across the pool of API keys in `YOUTUBE_API_KEYS` (or `YOUTUBE_API_KEY`).
+        """
+        if not YOUTUBE_API_KEYS:
+            raise ValueError("Expected YOUTUBE_API_KEYS or YOUTUBE_API_KEY to exist in the environment!")
+        return cls(api_key=KeyPool.default(), origin=origin)
+
+    # Built googleapiclient resources, by API key (or key pool), quota priority and root URL
+    _resources: Dict[Tuple[Union[str, KeyPool], QuotaScheduler.Priority, Optional[str]], Any] = {}
+    _resources_lock = threading.Lock()
+
+    @classmethod
+    def resource(
+        cls, api_key: Union[str, KeyPool], priority: QuotaScheduler.Priority, root_url: Optional[str] = None
+    ) -> Any:
+        """
+        The googleapiclient resource for `api_key`, built once per process from the discovery document bundled
+        with googleapiclient, so that no network request is made. It's safe to share between threads. Requests go
+        to `root_url` (e.g. a `FakeYouTubeServer`) instead of Google's API if it's given. Given a `KeyPool`, each
+        request is sent with one of its keys.
+        """
+        key = (api_key, priority, root_url)
+        pool = api_key if isinstance(api_key, KeyPool) else None
+        with cls._resources_lock:
+            if key not in cls._resources:
+                cls._resources[key] = build(
+                    "youtube",
+                    "v3",
+                    developerKey=api_key if pool is None else pool.keys[0],
+                    static_discovery=True,
+                    cache_discovery=False,
+                    requestBuilder=_request_builder(priority, pool),
+                    client_options={"api_endpoint": root_url} if root_url else None,
+                )
+            return cls._resources[key]
+
+    def __init__(
+        self,
+        api_key: Union[str, KeyPool],
+        origin: Video.Origin,
+        retry: Optional[RetryPolicy] = None,
+        root_url: Optional[str] = YOUTUBE_API_ROOT_URL or None,
+    ):
+        self.youtube = self.resource(api_key, self.priority(origin), root_url)
+        self.origin = origin
+        self.retry = RetryPolicy.default() if retry is None else retry
+
+    def _execute(self, request: HttpRequest) -> dict:
+        """
+        Execute a request, retrying transient errors.
+        """
+        return self.retry.call(request.execute)
+
     def search(
         self,
         query: str,
         max_results=20,
         page_token: Optional[str] = None,
-    ) -> API.Search.Response:
+    ) -> YouTubeServiceBase.API.Search.Response:
         """
         Search youtube and get a paginated list of video IDs.
         """
 
-        response = self.API.Search.execute(
+        response = self.retry.call(
+            self.API.Search.execute,
             self.youtube,
             query,
             max_results,
@@ -276,30 +543,17 @@ class OfficialYouTubeService:
 
         return self.API.Search.Response(video_ids, next_page_token)
 
-    def _videos_from_videos_response(self, response: dict) -> List[Video]:
-
-        videos: List[Video] = []
-        if "items" in response:
-            for item in response["items"]:
-                try:
-                    video = self._video_from_data(item)
-                    videos.append(video)
-                except self.VideoParseError as e:
-                    logger.error(f"Failed to parse video data!", exc_info=e)
-
-        return videos
-
     def videos(
         self,
         query: str,
         max_results: int = 20,
         page_token: Optional[str] = None,
-    ) -> API.Videos.Response:
+    ) -> YouTubeServiceBase.API.Videos.Response:
         """
         Search youtube and get a paginated list of videos.
         """
         search_response = self.search(query, max_results, page_token)
-        videos_response = self.API.Videos.execute(self.youtube, search_response.video_ids)
+        videos_response = self.retry.call(self.API.Videos.execute, self.youtube, search_response.video_ids)
         videos = self._videos_from_videos_response(videos_response)
         return self.API.Videos.Response(videos, search_response.next_page_token)
 
@@ -309,8 +563,10 @@ class OfficialYouTubeService:
         """
 
         # 1. Get uploads playlist
-        request = self.youtube.channels().list(part="contentDetails", id=channel_id)
-        response = request.execute()
+        request = self.youtube.channels().list(
+            part=self.API.Channels.PART, id=channel_id, fields=self.API.Channels.FIELDS
+        )
+        response = self._execute(request)
         if "items" not in response:
             raise self.ChannelNotFound()
         uploads_playlist_id = response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
@@ -321,15 +577,15 @@ class OfficialYouTubeService:
         # 2. Collect video IDs from the playlist
         while True:
             request_params = {
-                "part": "snippet",
+                "part": self.API.PlaylistItems.PART,
                 "playlistId": uploads_playlist_id,
                 "maxResults": min(max_videos, 50),  # playlistItems max is 50 per page
                 "pageToken": next_page_token,
-                "fields": "items/snippet/resourceId/videoId,nextPageToken",
+                "fields": self.API.PlaylistItems.FIELDS,
             }
             try:
                 request = self.youtube.playlistItems().list(**request_params)
-                response = request.execute()
+                response = self._execute(request)
             except HttpError as e:
                 if hasattr(e, "error_details") and isinstance(e.error_details, list):
                     if e.error_details[0]["reason"] == "playlistNotFound":
@@ -353,10 +609,7 @@ class OfficialYouTubeService:
         # 3. Fetch full video details in batches of 50
         for i in range(0, len(video_ids), 50):
             batch_ids = video_ids[i : i + 50]
-            request = self.youtube.videos().list(
-                part="snippet,contentDetails,statistics,liveStreamingDetails,status", id=",".join(batch_ids)
-            )
-            response = request.execute()
+            response = self.retry.call(self.API.Videos.execute, self.youtube, batch_ids)
 
             for item in response.get("items", []):
                 try:
@@ -367,34 +620,46 @@ class OfficialYouTubeService:
 
         return videos[:max_videos]
 
-    def get_comments(self, video_id: str, max_results: int) -> List[Comment]:
+    def iter_comments(
+        self,
+        video_id: str,
+        max_comments: int = 100,
+        timeout: Optional[float] = None,
+        fetch_replies: bool = False,
+        page_size: int = 100,
+    ) -> Iterator[Comment]:
         """
-        Get comments from a video, specifying the maximum number of top-level comments to be returned.
+        Stream comments from a video page by page, most relevant threads first, each top-level comment followed by
+        its replies. Stops after `max_comments` comments (replies included), or when the next page would be
+        requested more than `timeout` seconds after the first. Threads only come with a few of their replies, so
+        `fetch_replies` fetches the rest through the comments API. Each request asks for at most `page_size` (max 100)
+        threads or replies. API errors are raised.
         """
-        try:
-            video = Video.get(id=video_id)
-            comments_response = (
-                self.youtube.commentThreads()
-                .list(videoId=video_id, part="snippet,replies", maxResults=max_results, order="relevance")
-                .execute()
-            )
-            comments = []
-            for item in comments_response.get("items", []):
-
-                comment = self._comment_from_data(item["snippet"]["topLevelComment"], video)
-                comments.append(comment)
-
-                if "replies" in item:
-                    # Grab replies that are 1 "layer" deep as well...
-                    for reply in item["replies"]["comments"]:
-                        comment = self._comment_from_data(reply, video)
-                        comments.append(comment)
+        pages = self._comment_pages(video_id, max_comments, timeout, fetch_replies, page_size)
+        step = next(pages, None)
+        while step is not None:
+            if isinstance(step, Comment):
+                yield step
+                step = next(pages, None)
+            else:
+                endpoint, params = step
+                response = self._execute(getattr(self.youtube, endpoint)().list(**params))
+                try:
+                    step = pages.send(response)
+                except StopIteration:
+                    step = None
 
-            return comments
-        except Exception as e:
-            if "error_details" in e.__dict__ and e.__dict__["error_details"][0]["reason"] == "commentsDisabled":
+    def get_comments(self, video_id: str, max_results: int, timeout: Optional[float] = None) -> List[Comment]:
+        """
+        Get up to `max_results` comments from a video (replies included), most relevant threads first, paging until
+        `timeout` seconds have passed if one is given. Returns no comments if the video has comments disabled, and
+        raises any other error once retries are exhausted.
+        """
+        try:
+            return list(self.iter_comments(video_id, max_comments=max_results, timeout=timeout))
+        except HttpError as e:
+            if RetryPolicy.classify(e) == ("commentsDisabled", False):
                 # It's expected that we will sometimes hit videos with comments disabled...
                 logger.info(f"Could not fetch comments for video {video_id}, the video has comments disabled.")
                 return []
-            logger.error(f"Could not fetch comments for video {video_id}.", exc_info=e)
-            return []
+            raise e
@@ -0,0 +1,380 @@
+"""
+Scheduling of YouTube Data API requests against the project's daily quota.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from enum import Enum
+from hashlib import sha256
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from zoneinfo import ZoneInfo
+
+from src.settings import (
+    YOUTUBE_API_KEYS,
+    YOUTUBE_DAILY_QUOTA,
+    YOUTUBE_INTERACTIVE_RESERVE,
+    YOUTUBE_KEY_USAGE,
+    YOUTUBE_QUOTA_BURST,
+    YOUTUBE_QUOTA_RATE,
+)
+
+logger = logging.getLogger(__name__)
+
+# The daily quota resets at midnight Pacific Time
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+
+class QuotaScheduler:
+    """
+    Every API request acquires its cost in quota units here first. Requests are refused once the day's budget is
+    spent, and are rate limited by a token bucket refilled at `rate` units per second (up to `burst` units).
+
+    Interactive requests (from the app) are preferred over background ones (from the scrapers): background requests
+    can't spend the last `interactive_reserve` units of the budget, and only proceed while the bucket has room for
+    an interactive search on top of their own cost.
+
+    The day's usage is kept in a SQLite file shared by every process (the app and the scrapers), so that the budget
+    and the reserve hold across them and across restarts. The token bucket is per process.
+    """
+
+    # Quota cost of each endpoint's list method, everything else costs 1
+    COSTS: Dict[str, int] = {"search": 100}
+
+    class Priority(Enum):
+        INTERACTIVE = "interactive"
+        BACKGROUND = "background"
+
+    class QuotaExhausted(Exception):
+        """
+        There isn't enough of today's quota left for a request.
+        """
+
+        def __init__(self, endpoint: str, cost: int, remaining: int):
+            self.endpoint = endpoint
+            self.cost = cost
+            self.remaining = remaining
+            super().__init__(
+                f"The YouTube API quota is used up for today ({remaining} units left, {endpoint} needs {cost})."
+            )
+
+    @dataclass
+    class Snapshot:
+        day: date
+        budget: int
+        used: int
+        remaining: int
+        interactive_reserve: int
+        tokens: float
+        used_by_priority: Dict[str, int]
+        rejected_by_priority: Dict[str, int]
+
+    _default: Optional["QuotaScheduler"] = None
+    _default_lock = Lock()
+
+    def __init__(
+        self,
+        daily_budget: int = YOUTUBE_DAILY_QUOTA,
+        interactive_reserve: int = YOUTUBE_INTERACTIVE_RESERVE,
+        rate: float = YOUTUBE_QUOTA_RATE,
+        burst: float = YOUTUBE_QUOTA_BURST,
+        clock: Callable[[], float] = time.time,
+        path: Optional[str] = None,
+    ):
+        if burst < 2 * self.cost("search"):
+            raise ValueError("burst must leave room for a search on top of a background search")
+        self.daily_budget = daily_budget
+        self.interactive_reserve = interactive_reserve
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._lock = Lock()
+        self._tokens = float(burst)
+        self._refilled_at = clock()
+
+        # An empty path keeps the usage in memory, for this process only. Transactions are explicit, so that checking
+        # the budget and charging it happen under one database lock.
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS priority_usage "
+            "(day TEXT, priority TEXT, used INTEGER, rejected INTEGER, PRIMARY KEY (day, priority))"
+        )
+
+    @classmethod
+    def default(cls) -> "QuotaScheduler":
+        with cls._default_lock:
+            if cls._default is None:
+                # Every key in the pool brings its own daily quota
+                cls._default = cls(
+                    daily_budget=YOUTUBE_DAILY_QUOTA * max(1, len(YOUTUBE_API_KEYS)), path=YOUTUBE_KEY_USAGE
+                )
+            return cls._default
+
+    @classmethod
+    def cost(cls, endpoint: str) -> int:
+        return cls.COSTS.get(endpoint, 1)
+
+    @staticmethod
+    def endpoint(uri: str) -> str:
+        return urlsplit(uri).path.rstrip("/").rsplit("/", 1)[-1]
+
+    def _today(self) -> date:
+        return datetime.fromtimestamp(self.clock(), QUOTA_TIMEZONE).date()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _used(self, day: date) -> int:
+        return self._db.execute(
+            "SELECT COALESCE(SUM(used), 0) FROM priority_usage WHERE day = ?", (day.isoformat(),)
+        ).fetchone()[0]
+
+    def _add(self, day: date, priority: Priority, used: int = 0, rejected: int = 0) -> None:
+        self._db.execute(
+            "INSERT INTO priority_usage (day, priority, used, rejected) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (day, priority) DO UPDATE SET used = used + excluded.used, "
+            "rejected = rejected + excluded.rejected",
+            (day.isoformat(), priority.value, used, rejected),
+        )
+
+    def _try_acquire(self, endpoint: str, priority: Priority) -> float:
+        """
+        Take the quota for one request, returning 0, or else the number of seconds to wait before trying again.
+        """
+        cost = self.cost(endpoint)
+        with self._lock:
+            self._refill()
+            day = self._today()
+
+            # Background traffic leaves the reserve, and room in the bucket, for interactive traffic
+            interactive = priority == self.Priority.INTERACTIVE
+            budget = self.daily_budget if interactive else self.daily_budget - self.interactive_reserve
+            headroom = 0 if interactive else self.cost("search")
+
+            # Other processes wait for the write lock, so nobody charges between the check and the charge
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                used = self._used(day)
+                if used + cost > budget:
+                    self._add(day, priority, rejected=1)
+                    exhausted: Optional[QuotaScheduler.QuotaExhausted] = self.QuotaExhausted(
+                        endpoint, cost, max(0, budget - used)
+                    )
+                else:
+                    exhausted = None
+                    if self._tokens < cost + headroom:
+                        return (cost + headroom - self._tokens) / self.rate
+                    self._add(day, priority, used=cost)
+                    self._tokens -= cost
+            finally:
+                self._db.execute("COMMIT")
+            if exhausted is not None:
+                raise exhausted
+            return 0
+
+    def acquire(self, endpoint: str, priority: Priority) -> None:
+        """
+        Wait until the rate limit allows a request to `endpoint`, and take its cost out of today's budget.
+        """
+        while (wait := self._try_acquire(endpoint, priority)) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, endpoint: str, priority: Priority) -> None:
+        """
+        Like `acquire`, but waits without blocking the event loop.
+        """
+        while (wait := self._try_acquire(endpoint, priority)) > 0:
+            await asyncio.sleep(wait)
+
+    def snapshot(self) -> Snapshot:
+        with self._lock:
+            self._refill()
+            day = self._today()
+            rows = self._db.execute(
+                "SELECT priority, used, rejected FROM priority_usage WHERE day = ?", (day.isoformat(),)
+            ).fetchall()
+            used = sum(x[1] for x in rows)
+            return self.Snapshot(
+                day=day,
+                budget=self.daily_budget,
+                used=used,
+                remaining=max(0, self.daily_budget - used),
+                interactive_reserve=self.interactive_reserve,
+                tokens=self._tokens,
+                used_by_priority={priority: x for priority, x, _ in rows if x > 0},
+                rejected_by_priority={priority: x for priority, _, x in rows if x > 0},
+            )
+
+
+class QuotaHttp:
+    """
+    Wraps an `httplib2.Http` so that every request first acquires its quota from a `QuotaScheduler`.
+    """
+
+    def __init__(self, http: Any, scheduler: QuotaScheduler, priority: QuotaScheduler.Priority):
+        self.http = http
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.http, name)
+
+    def request(self, uri: str, method: str = "GET", *args, **kwargs) -> Tuple[Any, bytes]:
+        self.scheduler.acquire(self.scheduler.endpoint(uri), self.priority)
+        return self.http.request(uri, method, *args, **kwargs)
+
+
+class KeyPool:
+    """
+    A pool of API keys, each with its own daily quota. Every request is sent with whichever key has the most quota
+    left today, and a key is left out for the rest of the day once the API says its quota is exceeded. Usage is
+    stored in a SQLite file by a hash of each key (never the key itself), so that it survives restarts.
+    """
+
+    @dataclass
+    class Usage:
+        key_id: str
+        used: int
+        remaining: int
+        exhausted: bool
+
+    _default: Optional["KeyPool"] = None
+    _default_lock = Lock()
+
+    def __init__(
+        self,
+        keys: Sequence[str],
+        path: Optional[str],
+        daily_quota: int = YOUTUBE_DAILY_QUOTA,
+        clock: Callable[[], float] = time.time,
+    ):
+        if not keys:
+            raise ValueError("A key pool needs at least one API key")
+        self.keys: List[str] = list(dict.fromkeys(keys))
+        self.daily_quota = daily_quota
+        self.clock = clock
+        self._lock = Lock()
+
+        # An empty path keeps the usage in memory
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS key_usage "
+            "(key_id TEXT, day TEXT, used INTEGER, exhausted INTEGER, PRIMARY KEY (key_id, day))"
+        )
+        self._db.commit()
+
+    @classmethod
+    def default(cls) -> "KeyPool":
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls(YOUTUBE_API_KEYS, YOUTUBE_KEY_USAGE)
+            return cls._default
+
+    @staticmethod
+    def key_id(key: str) -> str:
+        return sha256(key.encode()).hexdigest()[:16]
+
+    def _today(self) -> str:
+        return datetime.fromtimestamp(self.clock(), QUOTA_TIMEZONE).date().isoformat()
+
+    def _usage(self, key: str) -> Usage:
+        row = self._db.execute(
+            "SELECT used, exhausted FROM key_usage WHERE key_id = ? AND day = ?", (self.key_id(key), self._today())
+        ).fetchone()
+        used, exhausted = (0, False) if row is None else (row[0], bool(row[1]))
+        remaining = 0 if exhausted else max(0, self.daily_quota - used)
+        return self.Usage(self.key_id(key), used, remaining, exhausted)
+
+    def _add(self, key: str, cost: int, exhausted: bool) -> None:
+        self._db.execute(
+            "INSERT INTO key_usage (key_id, day, used, exhausted) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key_id, day) DO UPDATE SET used = used + excluded.used, "
+            "exhausted = MAX(exhausted, excluded.exhausted)",
+            (self.key_id(key), self._today(), cost, int(exhausted)),
+        )
+        self._db.commit()
+
+    def acquire(self, endpoint: str, exclude: Sequence[str] = ()) -> str:
+        """
+        Charge a request to `endpoint` to the key with the most quota left today (other than those in `exclude`), and
+        return that key. Raises `QuotaScheduler.QuotaExhausted` if no key has enough quota left.
+        """
+        cost = QuotaScheduler.cost(endpoint)
+        with self._lock:
+            usages = [(self._usage(key).remaining, key) for key in self.keys if key not in exclude]
+            remaining, key = max(usages, default=(0, ""), key=lambda x: x[0])
+            if remaining < cost:
+                raise QuotaScheduler.QuotaExhausted(endpoint, cost, remaining)
+            self._add(key, cost, exhausted=False)
+            return key
+
+    def exhausted(self, key: str) -> None:
+        """
+        Leave a key out until tomorrow, after the API refused a request because its quota is exceeded.
+        """
+        with self._lock:
+            self._add(key, 0, exhausted=True)
+        logger.warning(f"API key {self.key_id(key)} is out of quota for today, failing over to the other keys.")
+
+    def snapshot(self) -> List[Usage]:
+        with self._lock:
+            return [self._usage(key) for key in self.keys]
+
+    @staticmethod
+    def with_key(uri: str, key: str) -> str:
+        """
+        `uri` with its `key` query parameter replaced.
+        """
+        url = urlsplit(uri)
+        query = [(k, v) for k, v in parse_qsl(url.query, keep_blank_values=True) if k != "key"] + [("key", key)]
+        return urlunsplit(url._replace(query=urlencode(query)))
+
+    @staticmethod
+    def is_quota_exceeded(status: int, content: bytes) -> bool:
+        if status != 403:
+            return False
+        try:
+            errors = json.loads(content)["error"].get("errors") or []
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return False
+        return any(isinstance(x, dict) and x.get("reason") in ("quotaExceeded", "dailyLimitExceeded") for x in errors)
+
+
+class KeyPoolHttp:
+    """
+    Wraps an `httplib2.Http` so that every request is sent with a key from a `KeyPool`, and sent again with another
+    key if the API says the first one is out of quota.
+    """
+
+    def __init__(self, http: Any, pool: KeyPool):
+        self.http = http
+        self.pool = pool
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.http, name)
+
+    def request(self, uri: str, method: str = "GET", *args, **kwargs) -> Tuple[Any, bytes]:
+        endpoint = QuotaScheduler.endpoint(uri)
+        tried: List[str] = []
+        while True:
+            key = self.pool.acquire(endpoint, exclude=tried)
+            response, content = self.http.request(self.pool.with_key(uri, key), method, *args, **kwargs)
+            if not self.pool.is_quota_exceeded(response.status, content):
+                return response, content
+            self.pool.exhausted(key)
+            tried.append(key)
+            if len(tried) == len(self.pool.keys):
+                return response, content
@@ -0,0 +1,174 @@
+"""
+Retrying of YouTube Data API requests that failed for transient reasons.
+"""
+
+import asyncio
+import logging
+import socket
+import time
+from collections import Counter
+from random import Random
+from threading import Lock
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import httplib2
+import httpx
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RetryPolicy:
+    """
+    Retries requests that failed with a transient error, waiting a random time (full jitter) up to an exponentially
+    growing, capped delay between attempts. Errors are classified by their googleapi reason, falling back to the
+    HTTP status, and the outcome of every failure is counted per reason.
+    """
+
+    # Reasons that are worth retrying, and reasons that will fail the same way every time
+    RETRYABLE_REASONS = {
+        "backendError",
+        "internalError",
+        "rateLimitExceeded",
+        "userRateLimitExceeded",
+        "serviceUnavailable",
+        "transport",
+    }
+    PERMANENT_REASONS = {
+        "quotaExceeded",
+        "dailyLimitExceeded",
+        "commentsDisabled",
+        "forbidden",
+        "keyInvalid",
+        "badRequest",
+        "invalidParameter",
+        "notFound",
+        "videoNotFound",
+        "channelNotFound",
+        "playlistNotFound",
+        "commentNotFound",
+    }
+    RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+    # Network errors raised before any response was received
+    TRANSPORT_ERRORS = (httplib2.HttpLib2Error, socket.timeout, ConnectionError, httpx.TransportError)
+
+    _default: Optional["RetryPolicy"] = None
+    _default_lock = Lock()
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        rng: Optional[Random] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = Random() if rng is None else rng
+        self.sleep = sleep
+        # Failures per reason that were retried, that ran out of attempts, and that weren't worth retrying
+        self.retried: Counter[str] = Counter()
+        self.exhausted: Counter[str] = Counter()
+        self.permanent: Counter[str] = Counter()
+        self._lock = Lock()
+
+    @classmethod
+    def default(cls) -> "RetryPolicy":
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @classmethod
+    def classify(cls, error: Exception) -> Optional[Tuple[str, bool]]:
+        """
+        The reason for a request failure and whether it's worth retrying, or None if `error` isn't an API error.
+        """
+        if isinstance(error, cls.TRANSPORT_ERRORS):
+            return "transport", True
+
+        if isinstance(error, HttpError):
+            status = error.resp.status
+            details = error.error_details if isinstance(error.error_details, list) else []
+            reason = details[0].get("reason") if details and isinstance(details[0], dict) else None
+        elif hasattr(error, "status") and hasattr(error, "reason"):
+            # AsyncOfficialYouTubeService.ApiError
+            status, reason = error.status, error.reason
+        else:
+            return None
+
+        if reason in cls.RETRYABLE_REASONS:
+            return reason, True
+        if reason in cls.PERMANENT_REASONS:
+            return reason, False
+        return reason or f"http{status}", status in cls.RETRYABLE_STATUSES
+
+    def delay(self, attempt: int) -> float:
+        """
+        Seconds to wait after the `attempt`-th (from 1) failed attempt.
+        """
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _on_failure(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Count a failed attempt, returning how long to wait before the next attempt, or None to give up.
+        """
+        classified = self.classify(error)
+        if classified is None:
+            return None
+        reason, retryable = classified
+        with self._lock:
+            if not retryable:
+                self.permanent[reason] += 1
+                return None
+            if attempt >= self.max_attempts:
+                self.exhausted[reason] += 1
+                logger.warning(f"Giving up after {attempt} attempts ({reason}).")
+                return None
+            self.retried[reason] += 1
+        delay = self.delay(attempt)
+        logger.info(f"Request failed ({reason}), retrying in {delay:.2f}s (attempt {attempt}/{self.max_attempts}).")
+        return delay
+
+    def call(self, function: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Call `function` until it succeeds, fails permanently, or runs out of attempts.
+        """
+        attempt = 1
+        while True:
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_failure(e, attempt)
+                if delay is None:
+                    raise e
+            self.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, function: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """
+        Like `call`, for a coroutine function.
+        """
+        attempt = 1
+        while True:
+            try:
+                return await function(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_failure(e, attempt)
+                if delay is None:
+                    raise e
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                "retried": dict(self.retried),
+                "exhausted": dict(self.exhausted),
+                "permanent": dict(self.permanent),
+            }